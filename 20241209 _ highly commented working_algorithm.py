@@ -19,26 +19,23 @@ def calculate_issue_score(
     
     total_distance = 0
     
-    # Create reverse mapping of categories to issues
-    category_to_issues = {}
-    #Unpack the issue_categories dictionary's issue and category key:value pairs
-    for issue, category in issue_categories.items():
-        #If the category is not in the empty dictionary initialized before,
-        if category not in category_to_issues:
-            #Created a dictionary where the category is the key
-            #And the empty list is the value
-            #Will look something like
-            # category_to_issues = {"category":[]}
-            category_to_issues[category] = []
-        # For the category added to the dictionary, 
-        # append the issue key to the list
-        # Will look something like 
-        # category_to_issues = {category: [issue-key, issue-key]
-
-        #This essentially reverses the original dictionary,
-        # mapping issues as keys to categories as values
-        category_to_issues[category].append(issue)
-    
+    # We used to create a reverse mapping of categories to issues here,
+    # category_to_issues = {category: [issue-key, issue-key]}
+    # on every single call, and then never use it.
+    # That reverse mapping is now built once, outside of the function,
+    # by matching.CategoryIndex. A CategoryIndex can be passed in place of
+    # the issue_categories dictionary and is read exactly the same way.
+
+    # Unpack the user_rankings dictionary's issue and rank key:value pairs
+    # and look up the category of each user issue ONCE, here,
+    # instead of once for every org issue in the loop below.
+    # Will look something like
+    # user_issue_categories = [(rank, "category"), (rank, "category")]
+    user_issue_categories = [
+        (user_rank, issue_categories.get(user_issue))
+        for user_issue, user_rank in user_rankings.items()
+    ]
+
     #Now we loop through the org_rankings dictionary we created,
     #which looks like org_rankings = {"issue": rank, "issue":rank}
     #For each org_issue (used as a key in the dictionary)
@@ -97,18 +94,18 @@ def calculate_issue_score(
             #Assume that the best_category_distance is the user_max_rank (which is the worst scenario)
             best_category_distance = user_max_rank
 
-            # Open a for loop that pulls the key "user_issue" from the user_rankings dictionary.
-            for user_issue in user_rankings:
+            # Open a for loop that pulls each "user_rank" and "user_category"
+            # from the user_issue_categories list we built before the loop.
+            for user_rank, user_category in user_issue_categories:
 
-                # Using the issue_categories dictionary created at the start
-                # Look for the user_issue from user_rankings in the issue_categories dictionary
-                # And see if it is equal to the org_category, which was previously assigned a "rank" from the org_rankings dictionary
-                if issue_categories.get(user_issue) == org_category:
-                    # Assign the variable "curent_distance" the absolute value of the value of the 
+                # The category of the user issue was already looked up in issue_categories
+                # See if it is equal to the org_category, which was previously assigned a "rank" from the org_rankings dictionary
+                if user_category == org_category:
+                    # Assign the variable "curent_distance" the absolute value of the value of the
                     # user_issue's rank from the user_rankings dictionary
                     # Minus the org_issue rank from the scaled_org_rankings dictionary
-                   
-                    current_distance = abs(user_rankings[user_issue] - scaled_org_rankings[org_issue])
+
+                    current_distance = abs(user_rank - scaled_org_rankings[org_issue])
 
                     # Compare the "best_category_distance from before to the current_distance
                     # Before, "best_category_distance" was assigned the worst possible scenario
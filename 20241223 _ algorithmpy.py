@@ -65,7 +65,12 @@ def calculate_match_score( #should this be a class instead?
 ) -> float:
     """
     Calculate match score with optimized category matching.
+
+    category_to_issues can also be a matching.CategoryIndex, which carries
+    the precomputed category -> issues mapping.
     """
+    category_to_issues = getattr(category_to_issues, 'category_to_issues', category_to_issues)
+
     def calculate_issue_score():
         scale_factor = user["max_rank"] / organization["max_rank"]
         total_issue_distance = 0
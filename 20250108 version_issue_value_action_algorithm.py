@@ -23,7 +23,7 @@ def calculate_total_score(
         Dictionary of user's issue rankings
     org_rankings : dict
         Dictionary of organization's issue rankings
-    issue_categories : dict
+    issue_categories : dict or matching.CategoryIndex
         Dictionary mapping issues to their categories
     user_actions : list
         List of user's preferred actions
@@ -53,12 +53,14 @@ def calculate_total_score(
     }
     
     total_distance = 0
-    category_to_issues = {}
-    
-    for issue, category in issue_categories.items():
-        if category not in category_to_issues:
-            category_to_issues[category] = []
-        category_to_issues[category].append(issue)
+
+    # Look up each user issue's category once per call instead of once per org issue.
+    # issue_categories can be the raw dict or a prebuilt matching.CategoryIndex,
+    # so the taxonomy no longer has to be re-processed for every user-org pair.
+    user_issue_categories = [
+        (user_rank, issue_categories.get(user_issue))
+        for user_issue, user_rank in user_rankings.items()
+    ]
 
 ##_______________________________________________________________
     # ISSUE AND CATEGORY CALCULATIONS (unchanged)
@@ -75,9 +77,9 @@ def calculate_total_score(
         
         if org_category:
             best_category_distance = user_max_rank
-            for user_issue in user_rankings:
-                if issue_categories.get(user_issue) == org_category:
-                    current_distance = abs(user_rankings[user_issue] - scaled_org_rankings[org_issue])
+            for user_rank, user_category in user_issue_categories:
+                if user_category == org_category:
+                    current_distance = abs(user_rank - scaled_org_rankings[org_issue])
                     best_category_distance = min(best_category_distance, current_distance)
             category_distance = best_category_distance
         
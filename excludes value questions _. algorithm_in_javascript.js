@@ -1,3 +1,5 @@
+// Legacy on-device scorer (issues and actions only); the client renders
+// precomputed matches with loadMatchResults / userMatches below instead.
 function calculateTotalScore(
     userRankings, 
     orgRankings, 
@@ -74,59 +76,169 @@ function calculateTotalScore(
     };
 }
 
-// Test with our example data
-const new_user = {
-    "Gun Control": 1,
-    "Mental Health": 2,
-    "LGBTQ Rights": 3
-};
-
-const new_org = {
-    "Gun Violence Prevention": 1,
-    "Depression Awareness": 2,
-    "Marriage Equality": 3,
-    "Gender Identity": 4
-};
-
-const new_user_actions = ["volunteer", "donate", "social media"];
-const new_org_actions = ["volunteer", "lobby", "campaign", "social media"];
-
-const new_issue_categories = {
-    "Gun Control": "Public Safety",
-    "Gun Violence Prevention": "Public Safety",
-    "Mental Health": "Healthcare",
-    "Depression Awareness": "Healthcare",
-    "LGBTQ Rights": "Civil Rights",
-    "Marriage Equality": "Civil Rights",
-    "Gender Identity": "Civil Rights"
-};
-
-// Calculate scores
-const results = calculateTotalScore(
-    new_user,
-    new_org,
-    new_issue_categories,
-    new_user_actions,
-    new_org_actions
-);
-
-console.log("Results:", results);
-
-// Test with custom weights
-const customWeights = {
-    exactMatch: 0.8,
-    categoryMatch: 0.2,
-    issueWeight: 0.6,
-    actionWeight: 0.4
-};
-
-const resultsWithCustomWeights = calculateTotalScore(
-    new_user,
-    new_org,
-    new_issue_categories,
-    new_user_actions,
-    new_org_actions,
-    customWeights
-);
-
-console.log("\nResults with custom weights:", resultsWithCustomWeights);
+// Columnar match results (matching/columnar.py, format version 2).
+// The Python side precomputes every user's top-N matches; the client only
+// loads them into typed arrays and renders, it never scores.
+
+const MATCH_RESULTS_MAGIC = 'MRES';
+const MATCH_RESULTS_VERSION = 2;
+const MATCH_RESULTS_SECTIONS = [
+    'match_counts', 'org_indices', 'total_scores', 'issue_scores', 'action_scores', 'value_scores',
+    'user_id_offsets', 'user_id_encodings', 'user_ids', 'org_id_offsets', 'org_id_encodings', 'org_ids'
+];
+const FLAG_COMPONENTS = 1;
+const ID_JSON = 1;
+// Org index of an unused slot (its scores are NaN)
+const NO_MATCH = 0xFFFFFFFF;
+
+function loadMatchResults(buffer) {
+    const headerWords = 6 + 2 * MATCH_RESULTS_SECTIONS.length;
+    if (buffer.byteLength < headerWords * 4) {
+        throw new Error('not a columnar match results file: file too short');
+    }
+    if (String.fromCharCode(...new Uint8Array(buffer, 0, 4)) !== MATCH_RESULTS_MAGIC) {
+        throw new Error('not a columnar match results file: bad magic number');
+    }
+    // Sections are little-endian, like every platform typed arrays run on
+    const words = new Uint32Array(buffer, 0, headerWords);
+    const [, version, numUsers, top, flags, numOrgs] = words;
+    if (version !== MATCH_RESULTS_VERSION) {
+        throw new Error(`unsupported columnar match results version ${version}`);
+    }
+
+    const section = (index, Type) => {
+        const offset = words[6 + 2 * index];
+        const length = words[7 + 2 * index];
+        if (offset + length > buffer.byteLength) {
+            throw new Error(`columnar match results section '${MATCH_RESULTS_SECTIONS[index]}' is truncated`);
+        }
+        return new Type(buffer, offset, length / Type.BYTES_PER_ELEMENT);
+    };
+
+    // Ids are UTF-8 strings, or UTF-8 JSON for ids that were not strings
+    const decoder = new TextDecoder('utf-8');
+    const decodeIds = (firstSection, count) => {
+        const offsets = section(firstSection, Uint32Array);
+        const encodings = section(firstSection + 1, Uint8Array);
+        const bytes = section(firstSection + 2, Uint8Array);
+        const ids = new Array(count);
+        for (let item = 0; item < count; item++) {
+            const text = decoder.decode(bytes.subarray(offsets[item], offsets[item + 1]));
+            ids[item] = encodings[item] === ID_JSON ? JSON.parse(text) : text;
+        }
+        return ids;
+    };
+
+    return {
+        userIds: decodeIds(6, numUsers),
+        orgIds: decodeIds(9, numOrgs),
+        top,
+        counts: section(0, Uint32Array),
+        orgIndices: section(1, Uint32Array),
+        totals: section(2, Float32Array),
+        components: flags & FLAG_COMPONENTS ? {
+            issue: section(3, Float32Array),
+            action: section(4, Float32Array),
+            value: section(5, Float32Array)
+        } : null
+    };
+}
+
+// Matches of the user in row userIndex, best first. Scores are float32:
+// render them with toFixed(2).
+function userMatches(results, userIndex) {
+    const { top, counts, orgIndices, totals, components, orgIds } = results;
+    const matches = [];
+    const start = userIndex * top;
+    for (let slot = start; slot < start + counts[userIndex]; slot++) {
+        const match = { org: orgIds[orgIndices[slot]], totalScore: totals[slot] };
+        if (components) {
+            match.issueScore = components.issue[slot];
+            match.actionScore = components.action[slot];
+            match.valueScore = components.value[slot];
+        }
+        matches.push(match);
+    }
+    return matches;
+}
+
+// The client's match path: fetch the export once and render a user's matches
+async function fetchMatches(url, userId) {
+    const response = await fetch(url);
+    const results = loadMatchResults(await response.arrayBuffer());
+    const userIndex = results.userIds.indexOf(userId);
+    return userIndex < 0 ? [] : userMatches(results, userIndex);
+}
+
+if (typeof module !== 'undefined') {
+    module.exports = { calculateTotalScore, loadMatchResults, userMatches, fetchMatches, NO_MATCH };
+}
+
+// Example, when run directly under node: `node <this file> results.mres [userId]`
+// renders precomputed matches; without arguments it scores the example data
+if (typeof require !== 'undefined' && typeof module !== 'undefined' && require.main === module) {
+    if (process.argv.length > 2) {
+        const data = require('fs').readFileSync(process.argv[2]);
+        const results = loadMatchResults(data.buffer.slice(data.byteOffset, data.byteOffset + data.byteLength));
+        const userIndex = process.argv.length > 3 ? results.userIds.indexOf(process.argv[3]) : 0;
+        console.log(userIndex < 0 ? [] : userMatches(results, userIndex));
+        process.exit(0);
+    }
+
+    // Test with our example data
+    const new_user = {
+        "Gun Control": 1,
+        "Mental Health": 2,
+        "LGBTQ Rights": 3
+    };
+
+    const new_org = {
+        "Gun Violence Prevention": 1,
+        "Depression Awareness": 2,
+        "Marriage Equality": 3,
+        "Gender Identity": 4
+    };
+
+    const new_user_actions = ["volunteer", "donate", "social media"];
+    const new_org_actions = ["volunteer", "lobby", "campaign", "social media"];
+
+    const new_issue_categories = {
+        "Gun Control": "Public Safety",
+        "Gun Violence Prevention": "Public Safety",
+        "Mental Health": "Healthcare",
+        "Depression Awareness": "Healthcare",
+        "LGBTQ Rights": "Civil Rights",
+        "Marriage Equality": "Civil Rights",
+        "Gender Identity": "Civil Rights"
+    };
+
+    // Calculate scores
+    const results = calculateTotalScore(
+        new_user,
+        new_org,
+        new_issue_categories,
+        new_user_actions,
+        new_org_actions
+    );
+
+    console.log("Results:", results);
+
+    // Test with custom weights
+    const customWeights = {
+        exactMatch: 0.8,
+        categoryMatch: 0.2,
+        issueWeight: 0.6,
+        actionWeight: 0.4
+    };
+
+    const resultsWithCustomWeights = calculateTotalScore(
+        new_user,
+        new_org,
+        new_issue_categories,
+        new_user_actions,
+        new_org_actions,
+        customWeights
+    );
+
+    console.log("\nResults with custom weights:", resultsWithCustomWeights);
+}
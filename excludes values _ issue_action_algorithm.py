@@ -22,7 +22,7 @@ def calculate_total_score(
         Dictionary of user's issue rankings
     org_rankings : dict
         Dictionary of organization's issue rankings
-    issue_categories : dict
+    issue_categories : dict or matching.CategoryIndex
         Dictionary mapping issues to their categories
     user_actions : list
         List of user's preferred actions
@@ -50,19 +50,18 @@ def calculate_total_score(
     # this will be incremented later to keep track of scores for each comparison
     total_distance = 0
 
-    # assign the category_to_issues dictionary outside of the loops.
-    # this dictionary will be filled with the issues and categories reversed
-    category_to_issues = {}
-    
-    # This takes the issue keys and category values we define outside the function and unpacks them.
-    # This takes the issue_categories and turns then into a new dictionary that looks like
-    # {category: [issue1, issue2, issue3]}
-    # // THIS WILL NOT BE EFFICIENT IF DONE EVERY TIME.
-    # // THIS LOOP WILL NEED TO BE PRE-CALCULATED OUTSIDE OF THE FUNCTION.
-    for issue, category in issue_categories.items():
-        if category not in category_to_issues:
-            category_to_issues[category] = []
-        category_to_issues[category].append(issue)
+    # The category_to_issues dictionary ({category: [issue1, issue2, issue3]})
+    # used to be rebuilt here on every call, and was never used.
+    # It is now pre-calculated outside of the function: build a matching.CategoryIndex
+    # once and pass it in place of the issue_categories dictionary.
+
+    # What the loops below do need is the category of every user issue.
+    # We look each one up once here, instead of once for every org issue.
+    # This looks like [(user_rank, user_category), (user_rank, user_category)]
+    user_issue_categories = [
+        (user_rank, issue_categories.get(user_issue))
+        for user_issue, user_rank in user_rankings.items()
+    ]
 
 # _______________________________________________________________________
     # ISSUE AND CATEGORY CALCULATIONS
@@ -105,23 +104,21 @@ def calculate_total_score(
             # but will use "user_max_rank" if needed.
             best_category_distance = user_max_rank
 
-            # Initialize a loop looking for each key in the "user_rankings" dictionary
-            # "user_issue" represents a temporary variable representing the key in the dictionary
-            for user_issue in user_rankings:
-                
-                # Using the issue key in the "issue_categories" dictionary,
-                # Search for the "user_issue" key and it's associated category value
-                # Then compare that category value to the category value found previously
-                # and stored in "org_category"
+            # Initialize a loop over the "user_issue_categories" list built before the loops
+            # "user_rank" and "user_category" are temporary variables for each user issue
+            for user_rank, user_category in user_issue_categories:
+
+                # Compare the user issue's category value to the category value
+                # found previously and stored in "org_category"
                 # If these values are identical, move forward
-                if issue_categories.get(user_issue) == org_category:
+                if user_category == org_category:
 
                     # Once you have confirmed that the org_category and user_category are identical
-                    # Use the "user_issue" to pull the value from "user_rankings" and
+                    # Use the "user_rank" of the user issue and
                     # Use the "org_issue" to pull the value from "scaled_org_ranks" and
                     # Subtract the "org_issue" from the "user_issue"
                     # And save the absolute value of that calculation to "current_distance"
-                    current_distance = abs(user_rankings[user_issue] - scaled_org_rankings[org_issue])
+                    current_distance = abs(user_rank - scaled_org_rankings[org_issue])
 
                     # Find the minimum value between the "current_distance" and "best_category_distance"
                     # Reassign the smallest of the two values into "best_category_distance"
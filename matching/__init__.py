@@ -0,0 +1,65 @@
+"""
+Precompiled data structures and scoring engines for user / organization matching.
+
+The dated scripts in the repository root hold the reference scorers
+(``calculate_total_score`` and friends). This package holds the pieces that
+are built once and reused across many scoring calls.
+"""
+from .batch import score_users, score_users_against_catalog
+from .cache import CachedMatcher, ScoreCache
+from .catalog import OrgCatalog, score_user_against_catalog
+from .columnar import read_match_results, write_match_results
+from .fused import FusedScorer, PairComponent
+from .grouped import GroupedOrg, GroupedUser, group_by_category, grouped_match_score
+from .instrumentation import MatchProfiler, profiling
+from .mapped import MappedCatalog, write_mapped_catalog
+from .matrix import score_matrix
+from .overlap import OverlapIndex
+from .profiles import OrgProfile, UserProfile
+from .ranking import top_k_matches
+from .reverse import UserStore
+from .session import MatchSession
+from .sharded import ShardedMatcher
+from .snapshots import CatalogSnapshot, CatalogStore
+from .scoring import DEFAULT_WEIGHTS, score_pair
+from .sweep import raw_components, sweep_weights
+from .taxonomy import NO_CATEGORY, CategoryIndex
+from .vocabulary import Vocabulary
+
+__all__ = [
+    'DEFAULT_WEIGHTS',
+    'NO_CATEGORY',
+    'CachedMatcher',
+    'CatalogSnapshot',
+    'CatalogStore',
+    'CategoryIndex',
+    'FusedScorer',
+    'GroupedOrg',
+    'GroupedUser',
+    'MappedCatalog',
+    'MatchProfiler',
+    'MatchSession',
+    'OrgCatalog',
+    'OrgProfile',
+    'OverlapIndex',
+    'PairComponent',
+    'ScoreCache',
+    'ShardedMatcher',
+    'UserProfile',
+    'UserStore',
+    'Vocabulary',
+    'group_by_category',
+    'grouped_match_score',
+    'profiling',
+    'raw_components',
+    'read_match_results',
+    'score_matrix',
+    'score_pair',
+    'score_user_against_catalog',
+    'score_users',
+    'score_users_against_catalog',
+    'sweep_weights',
+    'top_k_matches',
+    'write_mapped_catalog',
+    'write_match_results',
+]
@@ -0,0 +1,117 @@
+"""
+Action sets as bitmasks.
+
+Bit ``i`` of a mask is set when the profile lists the action with Vocabulary
+id ``i``, so the Jaccard similarity of two action sets is two popcounts
+instead of two new sets per pair. For a whole catalog the masks are packed
+into ``uint64`` words (one row per org) and scored in one NumPy pass.
+
+The action dissimilarity is ``(1 - jaccard) * len(user_set)``, or
+``len(user_set)`` when either side has no actions, as in
+``calculate_total_score``. ``len(user_set)`` includes the user's actions the
+vocabulary does not know; they have no bit, so they are passed separately as
+``num_user_actions``.
+"""
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+
+
+WORD_BITS = 64
+WORD_MASK = (1 << WORD_BITS) - 1
+
+
+def action_mask(action_ids) -> int:
+    """Bitmask of the non-negative (known) action ids"""
+    mask = 0
+    for action_id in action_ids:
+        if action_id >= 0:
+            mask |= 1 << action_id
+    return mask
+
+
+def mask_action_ids(mask: int) -> tuple:
+    """Action ids set in a bitmask, in increasing order"""
+    action_ids = []
+    action_id = 0
+    while mask:
+        if mask & 1:
+            action_ids.append(action_id)
+        mask >>= 1
+        action_id += 1
+    return tuple(action_ids)
+
+
+def mask_action_component(user_mask: int, num_user_actions: int, org_mask: int) -> float:
+    """``scoring.action_component`` on bitmasks"""
+    if num_user_actions and org_mask:
+        action_intersection = (user_mask & org_mask).bit_count()
+        action_union = num_user_actions + org_mask.bit_count() - action_intersection
+        action_similarity = action_intersection / action_union
+        return (1 - action_similarity) * num_user_actions
+    return num_user_actions
+
+##_______________________________________________________________
+# Packed masks for many orgs at once (NumPy)
+
+def num_words(num_actions: int) -> int:
+    """uint64 words needed for ``num_actions`` bits (at least one)"""
+    return max(1, -(-num_actions // WORD_BITS))
+
+
+def pack_mask(mask: int, words: int):
+    """One bitmask as ``words`` little-endian uint64 words"""
+    return np.array([(mask >> (WORD_BITS * word)) & WORD_MASK for word in range(words)],
+                    dtype=np.uint64)
+
+
+def pack_masks(masks, num_actions: int):
+    """Bitmasks as an N x words uint64 array"""
+    masks = list(masks)
+    words = num_words(num_actions)
+    packed = np.empty((len(masks), words), dtype=np.uint64)
+    for word in range(words):
+        shift = WORD_BITS * word
+        packed[:, word] = np.fromiter(((mask >> shift) & WORD_MASK for mask in masks),
+                                      dtype=np.uint64, count=len(masks))
+    return packed
+
+
+def popcount(words):
+    """Set bits per row of an N x words uint64 array"""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words).sum(axis=1, dtype=np.int64)
+    # NumPy < 2.0: count the bits of each byte
+    return np.unpackbits(words.view(np.uint8), axis=1).sum(axis=1, dtype=np.int64)
+
+
+def batch_action_components(user_mask: int, num_user_actions: int, org_words, org_counts=None):
+    """
+    ``mask_action_component`` of one user against every row of ``org_words``
+
+    Parameters:
+    -----------
+    user_mask : int
+        User's action bitmask
+    num_user_actions : int
+        Number of user actions, known to the vocabulary or not
+    org_words : numpy.ndarray
+        N x words uint64 array from ``pack_masks``
+    org_counts : numpy.ndarray, optional
+        ``popcount(org_words)``, if already known
+
+    Returns:
+    --------
+    numpy.ndarray
+        Unweighted action dissimilarity per org
+    """
+    if org_counts is None:
+        org_counts = popcount(org_words)
+    user_words = pack_mask(user_mask, org_words.shape[1])
+    action_intersection = popcount(org_words & user_words)
+    action_union = num_user_actions + org_counts - action_intersection
+    has_actions = (num_user_actions > 0) & (org_counts > 0)
+    action_similarity = np.divide(action_intersection, action_union,
+                                  out=np.zeros(len(org_words)), where=has_actions)
+    return np.where(has_actions, (1 - action_similarity) * num_user_actions, float(num_user_actions))
@@ -0,0 +1,111 @@
+"""
+Batch scoring of many users, grouped by how many issues they ranked.
+
+The scale factor of a pair is ``len(user_rankings) / len(org_rankings)``, so
+every user ranking the same number of issues sees the same scaled org ranks.
+``score_users`` and ``score_users_against_catalog`` group the users by
+``max_rank``, scale every org's ranks once per group and score the group's
+users against them. With most users ranking between 3 and 10 issues, a batch
+has only a handful of groups, so the scaling work all but disappears.
+
+Results are the same as ``score_pair`` / ``score_user_against_catalog`` user
+by user, returned in input order.
+"""
+from . import instrumentation
+from .actions import mask_action_component
+from .catalog import OrgCatalog, _require_numpy, scaled_ranks, score_user_against_catalog
+from .scoring import DEFAULT_WEIGHTS, check_vocabulary, combine_components, fused_components, score_pair
+
+
+def group_by_max_rank(users) -> dict:
+    """``{max_rank: [index, ...]}`` of compiled users, indices in input order"""
+    groups = {}
+    for index, user in enumerate(users):
+        groups.setdefault(user.max_rank, []).append(index)
+    return groups
+
+
+def score_users(users: list, orgs: list, weights: dict = DEFAULT_WEIGHTS) -> list:
+    """
+    Score every user against every OrgProfile, one max_rank group at a time
+
+    Parameters:
+    -----------
+    users : list
+        UserProfiles built with the orgs' Vocabulary
+    orgs : list
+        OrgProfiles (e.g. ``list(catalog.values())``)
+    weights : dict, optional
+        Dictionary of weights for different score components, as for ``score_pair``
+
+    Returns:
+    --------
+    list
+        One list per user, in input order, of ``score_pair`` result dicts in org order
+    """
+    users = list(users)
+    orgs = list(orgs)
+    if orgs:
+        # One shared vocabulary: each user and each org is checked once
+        vocabulary = orgs[0].vocabulary
+        if any(org.vocabulary is not vocabulary for org in orgs):
+            raise ValueError("OrgProfiles were built with different vocabularies")
+        for user in users:
+            check_vocabulary(user, orgs[0])
+    if instrumentation.active is not None:
+        # Per-pair scoring is what records phases and counters
+        return [[score_pair(user, org, weights=weights) for org in orgs] for user in users]
+
+    results = [None] * len(users)
+    for user_max_rank, indices in group_by_max_rank(users).items():
+        # Same products as org_rank * scale_factor in the per-pair loop
+        scaled = []
+        for org in orgs:
+            scale_factor = user_max_rank / len(org)
+            scaled.append([org_rank * scale_factor for org_rank in org.ranks])
+        for index in indices:
+            user = users[index]
+            user_mask = user.action_mask
+            num_user_actions = len(user.action_ids)
+            scores = []
+            for org, scaled_org_ranks in zip(orgs, scaled):
+                issue_distance, value_distance = fused_components(user, org, weights, scaled_org_ranks)
+                scores.append(combine_components(
+                    issue_distance,
+                    mask_action_component(user_mask, num_user_actions, org.action_mask),
+                    value_distance,
+                    weights,
+                ))
+            results[index] = scores
+    return results
+
+
+def score_users_against_catalog(users: list, catalog: OrgCatalog, weights: dict = DEFAULT_WEIGHTS) -> list:
+    """
+    ``score_user_against_catalog`` for many users, with the catalog's scaled
+    rank matrix computed once per max_rank group
+
+    Parameters:
+    -----------
+    users : list
+        UserProfiles built with ``catalog.vocabulary``
+    catalog : OrgCatalog
+        Organizations to score against
+    weights : dict, optional
+        Dictionary of weights for different score components, as for ``score_pair``
+
+    Returns:
+    --------
+    list
+        One ``score_user_against_catalog`` result dict per user, in input order
+    """
+    _require_numpy()
+    users = list(users)
+    for user in users:
+        check_vocabulary(user, catalog)
+    results = [None] * len(users)
+    for user_max_rank, indices in group_by_max_rank(users).items():
+        scaled_org_ranks = scaled_ranks(catalog, user_max_rank)
+        for index in indices:
+            results[index] = score_user_against_catalog(users[index], catalog, weights, scaled_org_ranks)
+    return results
@@ -0,0 +1,644 @@
+"""
+Benchmarks of every scorer on seeded synthetic data.
+
+``generate_dataset`` builds a taxonomy, users and orgs from a seed and a size
+preset (issue count, category count, rank-list length, action vocabulary
+size, value coverage), so the same numbers come out on every machine and every
+version. ``run_benchmarks`` times each registered variant on each size and
+reports pairs scored per second and peak traced memory.
+
+The reference scripts in the repository root are loaded from their files
+(function definitions only, their example code is not run). New engines are
+added with the ``variant`` decorator.
+
+Command line:
+
+    python -m matching.benchmark [--sizes small medium] [--variants ...] \
+        [--repeat 3] [--seed 0] [--output results.json] [--compare baseline.json]
+"""
+import argparse
+import ast
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+
+from .batch import score_users
+from .cache import CachedMatcher
+from .catalog import OrgCatalog, score_user_against_catalog
+from .grouped import GroupedOrg, GroupedUser, group_by_category, grouped_match_scores
+from .mapped import MappedCatalog, write_mapped_catalog
+from .matrix import score_matrix
+from .overlap import OverlapIndex
+from .profiles import OrgProfile, UserProfile
+from .ranking import top_k_matches
+from .reverse import UserStore
+from .scoring import DEFAULT_WEIGHTS, score_pair
+from .session import MatchSession
+from .sharded import ShardedMatcher
+from .taxonomy import CategoryIndex
+from .vocabulary import Vocabulary
+
+
+# Size presets for generate_dataset. rank_length is the longest rank list;
+# each profile ranks between half of it and all of it.
+SIZES = {
+    'small': {
+        'num_issues': 100, 'num_categories': 8, 'rank_length': 8, 'num_actions': 10,
+        'value_coverage': 0.5, 'num_users': 20, 'num_orgs': 200,
+    },
+    'medium': {
+        'num_issues': 500, 'num_categories': 25, 'rank_length': 20, 'num_actions': 25,
+        'value_coverage': 0.7, 'num_users': 20, 'num_orgs': 1000,
+    },
+    # The reference scorers only read q1 and q2 of these
+    'many-questions': {
+        'num_issues': 500, 'num_categories': 25, 'rank_length': 20, 'num_actions': 25,
+        'value_coverage': 0.9, 'num_questions': 16, 'num_users': 20, 'num_orgs': 1000,
+    },
+    'large': {
+        'num_issues': 2000, 'num_categories': 60, 'rank_length': 50, 'num_actions': 50,
+        'value_coverage': 0.9, 'num_users': 10, 'num_orgs': 5000,
+    },
+}
+
+# Share of issues left without a category
+UNCATEGORIZED_SHARE = 0.05
+
+REPOSITORY_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+REFERENCE_SCRIPTS = {
+    '20241209': '20241209 _ highly commented working_algorithm.py',
+    '20241223': '20241223 _ algorithmpy.py',
+    'excludes-values': 'excludes values _ issue_action_algorithm.py',
+    '20250108': '20250108 version_issue_value_action_algorithm.py',
+}
+
+##_______________________________________________________________
+# Synthetic data
+
+def _profile(rng, issues, rank_length, actions, max_actions, value_coverage, questions) -> dict:
+    ranked = rng.sample(issues, rng.randint(max(1, rank_length // 2), rank_length))
+    values = {}
+    for issue in ranked:
+        if rng.random() < value_coverage:
+            values[issue] = {question: rng.randint(0, 9) for question in questions
+                             if rng.random() < 0.9}
+    return {
+        'rankings': {issue: rank for rank, issue in enumerate(ranked, 1)},
+        'actions': rng.sample(actions, rng.randint(1, min(max_actions, len(actions)))),
+        'values': values,
+    }
+
+
+def generate_dataset(seed=0, num_issues: int = 100, num_categories: int = 8, rank_length: int = 8,
+                     num_actions: int = 10, value_coverage: float = 0.5, num_questions: int = 2,
+                     num_users: int = 20, num_orgs: int = 200) -> dict:
+    """
+    Seeded synthetic taxonomy, users and orgs
+
+    Parameters:
+    -----------
+    seed : int or str
+        Same seed and sizes, same dataset
+    num_issues, num_categories : int
+        Taxonomy size; a few issues are left uncategorized
+    rank_length : int
+        Longest rank list of a user or org
+    num_actions : int
+        Size of the action vocabulary
+    value_coverage : float
+        Share of ranked issues with value answers
+    num_questions : int
+        Value questions per issue, named q1, q2, ...
+    num_users, num_orgs : int
+        Number of profiles
+
+    Returns:
+    --------
+    dict
+        'taxonomy' (issue -> category), 'value_questions', 'users' (list of
+        user dicts) and 'orgs' ({org_id: org dict}), in the dict format of
+        ``calculate_total_score``
+    """
+    if not 1 <= rank_length <= num_issues:
+        raise ValueError("rank_length must be between 1 and num_issues")
+    rng = random.Random(seed)
+    issues = [f'issue-{number}' for number in range(num_issues)]
+    categories = [f'category-{number}' for number in range(num_categories)]
+    actions = [f'action-{number}' for number in range(num_actions)]
+    questions = tuple(f'q{number}' for number in range(1, num_questions + 1))
+    taxonomy = {
+        issue: None if rng.random() < UNCATEGORIZED_SHARE else rng.choice(categories)
+        for issue in issues
+    }
+    users = [_profile(rng, issues, rank_length, actions, 5, value_coverage, questions)
+             for _ in range(num_users)]
+    orgs = {f'org-{number}': _profile(rng, issues, rank_length, actions, 8, value_coverage, questions)
+            for number in range(num_orgs)}
+    return {'taxonomy': taxonomy, 'value_questions': questions, 'users': users, 'orgs': orgs}
+
+
+def load_reference(name: str) -> dict:
+    """
+    Functions defined by one of the reference scripts (see REFERENCE_SCRIPTS),
+    without running the script's example code
+    """
+    path = os.path.join(REPOSITORY_ROOT, REFERENCE_SCRIPTS[name])
+    with open(path, encoding='utf-8') as script:
+        tree = ast.parse(script.read(), filename=path)
+    tree.body = [node for node in tree.body
+                 if isinstance(node, (ast.FunctionDef, ast.Import, ast.ImportFrom))]
+    namespace = {'__name__': f'reference_{name}'}
+    exec(compile(tree, path, 'exec'), namespace)
+    return namespace
+
+##_______________________________________________________________
+# Variants
+#
+# A variant takes (dataset, options) and does its one-off setup (compiling
+# the taxonomy, the orgs...). It returns a function that scores every user
+# against every org and returns the number of pairs it scored. A variant
+# that holds resources (worker processes, mappings) returns a (run, teardown)
+# pair instead; measure calls teardown once it is done with run.
+
+VARIANTS = {}
+
+
+def variant(name: str, requires_numpy: bool = False):
+    """Register a benchmark variant under ``name``"""
+    def register(setup):
+        setup.requires_numpy = requires_numpy
+        VARIANTS[name] = setup
+        return setup
+    return register
+
+
+def _prepare(setup, dataset: dict, options: dict):
+    """(run, teardown) for one variant; teardown does nothing unless the variant returned one"""
+    prepared = setup(dataset, options)
+    if isinstance(prepared, tuple):
+        return prepared
+    return prepared, lambda: None
+
+
+def available_variants() -> list:
+    return [name for name, setup in VARIANTS.items()
+            if np is not None or not setup.requires_numpy]
+
+
+@variant('reference-20241209')
+def _reference_20241209(dataset, options):
+    reference = load_reference('20241209')
+    calculate_issue_score = reference['calculate_issue_score']
+    calculate_action_score = reference['calculate_action_score']
+    index = CategoryIndex(dataset['taxonomy'])
+    users, orgs = dataset['users'], list(dataset['orgs'].values())
+
+    def run():
+        for user in users:
+            for org in orgs:
+                calculate_issue_score(user['rankings'], org['rankings'], index)
+                calculate_action_score(user['actions'], org['actions'])
+        return len(users) * len(orgs)
+    return run
+
+
+@variant('reference-20241223')
+def _reference_20241223(dataset, options):
+    calculate_match_score = load_reference('20241223')['calculate_match_score']
+    index = CategoryIndex(dataset['taxonomy'])
+    # That scorer takes profiles grouped by category; converting them is setup
+    users = [group_by_category(user, index) for user in dataset['users']]
+    orgs = [group_by_category(org, index) for org in dataset['orgs'].values()]
+
+    def run():
+        for user in users:
+            for org in orgs:
+                calculate_match_score(user, org, index)
+        return len(users) * len(orgs)
+    return run
+
+
+def _reference_total_score(name: str, with_values: bool):
+    def setup(dataset, options):
+        calculate_total_score = load_reference(name)['calculate_total_score']
+        index = CategoryIndex(dataset['taxonomy'])
+        users, orgs = dataset['users'], list(dataset['orgs'].values())
+
+        def run():
+            for user in users:
+                for org in orgs:
+                    if with_values:
+                        calculate_total_score(user['rankings'], org['rankings'], index, user['actions'],
+                                              org['actions'], user['values'], org['values'])
+                    else:
+                        calculate_total_score(user['rankings'], org['rankings'], index, user['actions'],
+                                              org['actions'])
+            return len(users) * len(orgs)
+        return run
+    return setup
+
+
+variant('reference-excludes-values')(_reference_total_score('excludes-values', with_values=False))
+variant('reference-20250108')(_reference_total_score('20250108', with_values=True))
+
+
+def _vocabulary(dataset) -> Vocabulary:
+    return Vocabulary(dataset['taxonomy'], value_questions=dataset['value_questions'])
+
+
+def _user_profiles(users, vocabulary):
+    return [UserProfile(user['rankings'], vocabulary, user['actions'], user['values']) for user in users]
+
+
+@variant('score_pair')
+def _score_pair(dataset, options):
+    vocabulary = _vocabulary(dataset)
+    users, orgs = dataset['users'], list(dataset['orgs'].values())
+
+    def run():
+        for user in _user_profiles(users, vocabulary):
+            for org in orgs:
+                score_pair(user, org['rankings'], org['actions'], org['values'], options['weights'])
+        return len(users) * len(orgs)
+    return run
+
+
+@variant('score_pair-compiled')
+def _score_pair_compiled(dataset, options):
+    vocabulary = _vocabulary(dataset)
+    users = dataset['users']
+    orgs = [OrgProfile.from_dict(org, vocabulary) for org in dataset['orgs'].values()]
+
+    def run():
+        for user in _user_profiles(users, vocabulary):
+            for org in orgs:
+                score_pair(user, org, weights=options['weights'])
+        return len(users) * len(orgs)
+    return run
+
+
+@variant('score_users')
+def _score_users(dataset, options):
+    vocabulary = _vocabulary(dataset)
+    users = dataset['users']
+    orgs = [OrgProfile.from_dict(org, vocabulary) for org in dataset['orgs'].values()]
+
+    def run():
+        score_users(_user_profiles(users, vocabulary), orgs, options['weights'])
+        return len(users) * len(orgs)
+    return run
+
+
+@variant('grouped')
+def _grouped(dataset, options):
+    index = CategoryIndex(dataset['taxonomy'])
+    users = [GroupedUser(group_by_category(user, index)) for user in dataset['users']]
+    orgs = [GroupedOrg(group_by_category(org, index), index) for org in dataset['orgs'].values()]
+
+    def run():
+        for user in users:
+            grouped_match_scores(user, orgs)
+        return len(users) * len(orgs)
+    return run
+
+
+@variant('top_k_matches')
+def _top_k_matches(dataset, options):
+    vocabulary = _vocabulary(dataset)
+    users = dataset['users']
+    catalog = {org_id: OrgProfile.from_dict(org, vocabulary) for org_id, org in dataset['orgs'].items()}
+
+    def run():
+        for user in _user_profiles(users, vocabulary):
+            top_k_matches(user, catalog, options['top'], options['weights'])
+        return len(users) * len(catalog)
+    return run
+
+
+@variant('overlap_index')
+def _overlap_index(dataset, options):
+    vocabulary = _vocabulary(dataset)
+    users = dataset['users']
+    catalog = {org_id: OrgProfile.from_dict(org, vocabulary) for org_id, org in dataset['orgs'].items()}
+    index = OverlapIndex(catalog, vocabulary)
+
+    def run():
+        for user in _user_profiles(users, vocabulary):
+            index.top_k(user, options['top'], options['weights'])
+        return len(users) * len(catalog)
+    return run
+
+
+@variant('sharded')
+def _sharded(dataset, options):
+    users = dataset['users']
+    matcher = ShardedMatcher(dataset['orgs'], _vocabulary(dataset), num_shards=options['workers'])
+
+    def run():
+        for user in users:
+            matcher.top_k(user, options['top'], options['weights'])
+        return len(users) * matcher.num_orgs
+    return run, matcher.close
+
+
+@variant('reverse_top_k', requires_numpy=True)
+def _reverse_top_k(dataset, options):
+    vocabulary = _vocabulary(dataset)
+    store = UserStore(dict(enumerate(dataset['users'])), vocabulary)
+    orgs = [OrgProfile.from_dict(org, vocabulary) for org in dataset['orgs'].values()]
+
+    def run():
+        for org in orgs:
+            store.top_k_users(org, options['top'], options['weights'])
+        return len(orgs) * len(store)
+    return run
+
+
+@variant('top_k_matches-mapped')
+def _top_k_matches_mapped(dataset, options):
+    users = dataset['users']
+    descriptor, path = tempfile.mkstemp(suffix='.mcat')
+    os.close(descriptor)
+    try:
+        write_mapped_catalog(path, dataset['orgs'], _vocabulary(dataset))
+        catalog = MappedCatalog(path)
+    finally:
+        try:
+            # The mapping outlives the directory entry (except on Windows)
+            os.remove(path)
+        except OSError:
+            pass
+
+    def run():
+        for user in _user_profiles(users, catalog.vocabulary):
+            top_k_matches(user, catalog, options['top'], options['weights'])
+        return len(users) * len(catalog)
+    return run
+
+
+@variant('match_session')
+def _match_session(dataset, options):
+    vocabulary = _vocabulary(dataset)
+    users = dataset['users']
+    catalog = {org_id: OrgProfile.from_dict(org, vocabulary) for org_id, org in dataset['orgs'].items()}
+
+    def run():
+        # Opening a session scores the whole catalog once
+        for user in users:
+            MatchSession(user['rankings'], catalog, vocabulary, user['actions'], user['values'],
+                         options['weights'])
+        return len(users) * len(catalog)
+    return run
+
+
+@variant('cached_matcher-cold')
+def _cached_matcher(dataset, options):
+    users = dataset['users']
+    matcher = CachedMatcher(dataset['orgs'], _vocabulary(dataset), weights=options['weights'])
+
+    def run():
+        matcher.cache.clear()
+        for user in users:
+            matcher.score_all(user)
+        return len(users) * len(dataset['orgs'])
+    return run
+
+
+@variant('catalog', requires_numpy=True)
+def _catalog(dataset, options):
+    users = dataset['users']
+    catalog = OrgCatalog(dataset['orgs'], _vocabulary(dataset))
+
+    def run():
+        for user in _user_profiles(users, catalog.vocabulary):
+            score_user_against_catalog(user, catalog, options['weights'])
+        return len(users) * len(catalog)
+    return run
+
+
+@variant('score_matrix', requires_numpy=True)
+def _score_matrix(dataset, options):
+    users = dataset['users']
+    catalog = OrgCatalog(dataset['orgs'], _vocabulary(dataset))
+
+    def run():
+        score_matrix(users, catalog, options['weights'], workers=options['workers'])
+        return len(users) * len(catalog)
+    return run
+
+##_______________________________________________________________
+# Runner
+
+def measure(setup, dataset: dict, options: dict, repeat: int = 3) -> dict:
+    """
+    Time one variant on one dataset
+
+    Returns:
+    --------
+    dict
+        pairs, setup_seconds, seconds (best of ``repeat`` runs), pairs_per_second
+        and peak_memory_bytes (traced Python / NumPy allocations of setup plus
+        one run, in this process only)
+    """
+    gc.collect()
+    start = time.perf_counter()
+    run, teardown = _prepare(setup, dataset, options)
+    setup_seconds = time.perf_counter() - start
+
+    timings = []
+    try:
+        for _ in range(max(repeat, 1)):
+            start = time.perf_counter()
+            pairs = run()
+            timings.append(time.perf_counter() - start)
+    finally:
+        teardown()
+    del run, teardown
+
+    # Tracing slows everything down, so memory gets its own run
+    gc.collect()
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    try:
+        run, teardown = _prepare(setup, dataset, options)
+        try:
+            run()
+        finally:
+            teardown()
+        peak = tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+
+    seconds = min(timings)
+    return {
+        'pairs': pairs,
+        'setup_seconds': setup_seconds,
+        'seconds': seconds,
+        'pairs_per_second': pairs / seconds if seconds else None,
+        'peak_memory_bytes': peak,
+    }
+
+
+def run_benchmarks(sizes=('small',), variants=None, seed=0, repeat: int = 3, top: int = 20,
+                   workers: int = 1, weights: dict = DEFAULT_WEIGHTS, progress=None) -> dict:
+    """
+    Time every variant on every size
+
+    Parameters:
+    -----------
+    sizes : list
+        Names from SIZES, or dicts of ``generate_dataset`` sizes (with a 'name')
+    variants : list, optional
+        Names from VARIANTS (default: all that can run here)
+    seed : int
+        Dataset seed; each size derives its own dataset from it
+    repeat : int
+        Timed runs per variant and size; the fastest is reported
+    top : int
+        k of top_k_matches
+    workers : int
+        Worker processes of score_matrix
+    weights : dict, optional
+        Dictionary of weights for different score components, as for ``score_pair``
+    progress : callable, optional
+        Called with each result as soon as it is measured
+
+    Returns:
+    --------
+    dict
+        'environment' (interpreter, platform, NumPy, seed) and 'results', one
+        dict per (size, variant) with the size parameters and ``measure`` output
+    """
+    variants = list(variants or available_variants())
+    for name in variants:
+        if name not in VARIANTS:
+            raise ValueError(f"unknown variant {name!r}")
+        if VARIANTS[name].requires_numpy and np is None:
+            raise ImportError(f"variant {name!r} requires numpy")
+    options = {'top': top, 'workers': workers, 'weights': weights}
+
+    results = []
+    for size in sizes:
+        if isinstance(size, str):
+            size_name, parameters = size, SIZES[size]
+        else:
+            parameters = dict(size)
+            size_name = parameters.pop('name', 'custom')
+        dataset = generate_dataset(f'{seed}:{size_name}', **parameters)
+        for name in variants:
+            result = {'variant': name, 'size': size_name, **parameters,
+                      **measure(VARIANTS[name], dataset, options, repeat)}
+            results.append(result)
+            if progress is not None:
+                progress(result)
+
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'numpy': None if np is None else np.__version__,
+            'seed': seed,
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+
+def compare_results(baseline: dict, current: dict, tolerance: float = 0.1) -> list:
+    """
+    (size, variant) pairs that got slower than the baseline
+
+    Returns:
+    --------
+    list
+        One dict per regression: size, variant, baseline / current
+        pairs_per_second and their ratio, slowest first. Results whose
+        throughput dropped by no more than ``tolerance`` are not listed.
+    """
+    baseline_rates = {(result['size'], result['variant']): result['pairs_per_second']
+                      for result in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        before = baseline_rates.get((result['size'], result['variant']))
+        after = result['pairs_per_second']
+        if not before or after is None:
+            continue
+        if after < before * (1 - tolerance):
+            regressions.append({
+                'size': result['size'],
+                'variant': result['variant'],
+                'baseline_pairs_per_second': before,
+                'pairs_per_second': after,
+                'ratio': after / before,
+            })
+    regressions.sort(key=lambda regression: regression['ratio'])
+    return regressions
+
+##_______________________________________________________________
+# Command line
+
+def _print_result(result):
+    print(f"{result['size']:>8} {result['variant']:<28} {result['pairs']:>9} pairs "
+          f"{result['pairs_per_second']:>14,.0f} pairs/s "
+          f"{result['peak_memory_bytes'] / 1024:>12,.1f} KiB peak",
+          file=sys.stderr)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='python -m matching.benchmark',
+        description="Time every scorer on seeded synthetic data and write the results as JSON",
+    )
+    parser.add_argument('--sizes', nargs='+', default=['small', 'medium'], choices=list(SIZES),
+                        help="size presets (default: small medium)")
+    parser.add_argument('--variants', nargs='+', choices=list(VARIANTS),
+                        help="variants to run (default: all that can run here)")
+    parser.add_argument('--seed', type=int, default=0, help="dataset seed (default: 0)")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per variant (default: 3)")
+    parser.add_argument('--top', type=int, default=20, help="k of top_k_matches (default: 20)")
+    parser.add_argument('--workers', type=int, default=1, help="score_matrix workers / sharded shards (default: 1)")
+    parser.add_argument('--output', default='-', help="JSON results file (default: stdout)")
+    parser.add_argument('--compare', help="JSON results of an earlier run to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help="throughput drop allowed by --compare (default: 0.1)")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.sizes, args.variants, args.seed, args.repeat, args.top,
+                            args.workers, progress=_print_result)
+    if args.output == '-':
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    else:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump(report, output_file, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as baseline_file:
+            regressions = compare_results(json.load(baseline_file), report, args.tolerance)
+        for regression in regressions:
+            print(f"slower: {regression['size']} {regression['variant']} "
+                  f"{regression['ratio']:.2f}x of baseline", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+"""
+Score cache keyed on profile content.
+
+Many users submit identical profiles (onboarding presets) and orgs change
+rarely, so ``score_pair`` results are cached under a fingerprint of
+(user profile, org profile, weights). ``CachedMatcher`` owns the org catalog,
+so when an org is updated it drops every cached entry of that org.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from .profiles import OrgProfile, UserProfile
+from .scoring import DEFAULT_WEIGHTS, score_pair
+from .vocabulary import Vocabulary
+
+
+def profile_fingerprint(rankings: dict, actions=(), values: dict = None, ordered: bool = True) -> str:
+    """
+    Stable content hash of a profile in the dict input format
+
+    Actions are a set and value answers are compared by key, so neither
+    depends on input order. Org rankings are ``ordered``: the order their
+    distances are added in can change the last bit of a score, so two orgs
+    with the same ranks in a different order get different fingerprints.
+    User ranking order never changes a score (``ordered=False``).
+    """
+    ranking_items = list(rankings.items())
+    if not ordered:
+        ranking_items.sort(key=lambda item: json.dumps(item[0]))
+    canonical = json.dumps(
+        [ranking_items, sorted(set(actions), key=json.dumps), values or {}],
+        sort_keys=True,
+        separators=(',', ':'),
+        default=str,
+    )
+    return hashlib.blake2b(canonical.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def weights_fingerprint(weights: dict) -> tuple:
+    return tuple(sorted(weights.items()))
+
+
+class ScoreCache:
+    """
+    Thread-safe LRU map of ``(user fingerprint, org fingerprint, weights) -> scores``
+
+    Every entry also records the org id it was stored for, so
+    ``invalidate_org`` can drop all of one org's entries at once.
+
+    Parameters:
+    -----------
+    maxsize : int
+        Entries kept before the least recently used one is evicted
+    """
+
+    def __init__(self, maxsize: int = 65536):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._keys_by_org = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Cached scores for ``key`` (marking it recently used), or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, org_id, scores: dict):
+        """Store scores for ``key`` under ``org_id``, evicting the LRU entry when full"""
+        with self._lock:
+            if key in self._entries:
+                # Same content, same scores: keep the entry under the org it was first stored for
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = (org_id, scores)
+            self._keys_by_org.setdefault(org_id, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                old_key, (old_org_id, _) = self._entries.popitem(last=False)
+                self._forget(old_org_id, old_key)
+                self.evictions += 1
+
+    def invalidate_org(self, org_id) -> int:
+        """Drop every entry stored for an org; returns how many were dropped"""
+        with self._lock:
+            keys = self._keys_by_org.pop(org_id, ())
+            for key in keys:
+                self._entries.pop(key, None)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_org.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+    def _forget(self, org_id, key):
+        keys = self._keys_by_org.get(org_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_org[org_id]
+
+
+class CachedMatcher:
+    """
+    Org catalog with cached ``score_pair`` results
+
+    Parameters:
+    -----------
+    catalog : dict
+        Dictionary of organizations, format:
+        {org_id: {'rankings': dict, 'actions': list, 'values': dict}}
+    issue_categories : dict, CategoryIndex or Vocabulary
+        Dictionary mapping issues to their categories
+    maxsize : int, optional
+        Cache entries kept (see ScoreCache)
+    weights : dict, optional
+        Default weights for ``score`` / ``score_all``
+    """
+
+    def __init__(self, catalog: dict, issue_categories, maxsize: int = 65536,
+                 weights: dict = DEFAULT_WEIGHTS):
+        self.vocabulary = Vocabulary.coerce(issue_categories)
+        self.weights = weights
+        self.cache = ScoreCache(maxsize)
+        self._orgs = {}
+        self._lock = threading.Lock()
+        for org_id, org in catalog.items():
+            self._orgs[org_id] = self._compile_org(org)
+
+    def _compile_org(self, org: dict) -> tuple:
+        fingerprint = profile_fingerprint(org['rankings'], org.get('actions', ()), org.get('values'))
+        return fingerprint, OrgProfile.from_dict(org, self.vocabulary)
+
+    def update_org(self, org_id, org: dict) -> int:
+        """
+        Add or replace an org and drop its cached scores; returns how many
+        cache entries were dropped
+        """
+        compiled = self._compile_org(org)
+        with self._lock:
+            self._orgs[org_id] = compiled
+            # Invalidate under the same lock, so no reader can store a score
+            # for the old profile under the new one's id after this returns
+            return self.cache.invalidate_org(org_id)
+
+    def remove_org(self, org_id) -> int:
+        with self._lock:
+            del self._orgs[org_id]
+            return self.cache.invalidate_org(org_id)
+
+    def score(self, user: dict, org_id, weights: dict = None) -> dict:
+        """``score_pair`` result for a user dict against one org"""
+        return self.score_all(user, [org_id], weights)[org_id]
+
+    def score_all(self, user: dict, org_ids=None, weights: dict = None) -> dict:
+        """
+        ``{org_id: score_pair result}`` for a user dict against the given orgs
+        (default: every org); the user is only compiled on the first cache miss
+        """
+        weights = weights or self.weights
+        user_key = profile_fingerprint(user['rankings'], user.get('actions', ()), user.get('values'),
+                                       ordered=False)
+        weights_key = weights_fingerprint(weights)
+        with self._lock:
+            orgs = dict(self._orgs) if org_ids is None else {org_id: self._orgs[org_id] for org_id in org_ids}
+
+        user_profile = None
+        results = {}
+        for org_id, (org_key, org_profile) in orgs.items():
+            key = (user_key, org_key, weights_key)
+            scores = self.cache.get(key)
+            if scores is None:
+                if user_profile is None:
+                    user_profile = UserProfile(user['rankings'], self.vocabulary,
+                                               user.get('actions', ()), user.get('values'))
+                scores = score_pair(user_profile, org_profile, weights=weights)
+                with self._lock:
+                    # Skip storing if the org changed while we were scoring it
+                    if self._orgs.get(org_id, (None,))[0] == org_key:
+                        self.cache.put(key, org_id, scores)
+            results[org_id] = dict(scores)
+        return results
@@ -0,0 +1,384 @@
+"""
+Organization catalog and one-user-vs-all-orgs batch scoring.
+
+``score_user_against_catalog`` scores one compiled ``UserProfile`` against
+every organization of an ``OrgCatalog`` in a single vectorized pass and
+returns the same numbers ``score_pair`` (and ``calculate_total_score``) gives
+for each org, as NumPy vectors in catalog order.
+
+The catalog's arrays are org x ranking position, as wide as the longest org
+ranking rather than the whole issue vocabulary, so their size (and that of
+every per-user temporary) grows with what the orgs ranked. A user is looked up
+once per org issue through a vocabulary-sized table of the user's positions.
+
+NumPy is only needed for this module; the per-pair scorers work without it.
+"""
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+
+from time import perf_counter
+
+from . import instrumentation
+from .actions import batch_action_components, pack_masks, popcount
+from .profiles import OrgProfile
+from .scoring import DEFAULT_WEIGHTS, MISSING_VALUE_PENALTY, check_vocabulary
+from .taxonomy import NO_CATEGORY
+from .values import answer_matrix
+from .vocabulary import Vocabulary
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("OrgCatalog and score_user_against_catalog require NumPy")
+
+
+class OrgCatalog:
+    """
+    All organizations held as arrays in each org's own ranking order
+
+    - ``rank_order``: org x position matrix of each org's issue ids in its
+      ranking order, padded with ``num_issue_columns`` (``rank_order_valid``
+      marks the real entries)
+    - ``ranks``: org x position matrix of raw org ranks (0 in the padding)
+    - ``action_words``: org x word uint64 matrix of packed action bitmasks
+    - ``value_matrix``: org x position x question matrix of value answers (NaN when missing)
+    - ``category_positions``: flat ``rank_order`` positions of every
+      categorized org issue, grouped by category id, with the group of
+      category ``c`` at ``category_offsets[c]:category_offsets[c + 1]``
+
+    Per-org sums are accumulated over the positions so they add up in the same
+    order, and so to the same floats, as the per-pair loop over ``org_rankings``.
+    Users scored against the catalog must be built with ``catalog.vocabulary``.
+
+    Parameters:
+    -----------
+    orgs : dict
+        Dictionary of organizations, format:
+        {org_id: {'rankings': dict, 'actions': list, 'values': dict}}
+        'actions' and 'values' are optional. Entries can also be OrgProfiles.
+    issue_categories : dict, CategoryIndex or Vocabulary
+        Dictionary mapping issues to their categories, or the Vocabulary to
+        intern the orgs' issues and actions into
+    """
+
+    # Every NumPy array attribute, e.g. to place them in shared memory
+    ARRAY_FIELDS = (
+        'rank_order',
+        'rank_order_valid',
+        'ranks',
+        'num_ranked',
+        'action_words',
+        'num_actions',
+        'value_matrix',
+        'category_positions',
+        'category_offsets',
+    )
+
+    def __init__(self, orgs: dict, issue_categories):
+        _require_numpy()
+        self.vocabulary = vocabulary = Vocabulary.coerce(issue_categories)
+        self.category_index = vocabulary.category_index
+        self.org_ids = tuple(orgs)
+
+        profiles = []
+        for org in orgs.values():
+            if isinstance(org, OrgProfile):
+                if org.vocabulary is not vocabulary:
+                    org = OrgProfile.from_dict(org.to_dict(), vocabulary)
+            else:
+                org = OrgProfile.from_dict(org, vocabulary)
+            profiles.append(org)
+
+        # Issue ids interned so far; later ones can never match an org issue
+        num_orgs = len(profiles)
+        self.num_issue_columns = num_issues = vocabulary.num_issues
+        num_questions = vocabulary.num_questions
+        max_org_issues = max(map(len, profiles), default=0)
+        rank_order = np.full((num_orgs, max_org_issues), num_issues, dtype=np.intp)
+        ranks = np.zeros((num_orgs, max_org_issues))
+        value_matrix = np.full((num_orgs, max_org_issues, num_questions), np.nan)
+        num_ranked = np.zeros(num_orgs, dtype=np.intp)
+
+        for row, org in enumerate(profiles):
+            num_ranked[row] = count = len(org.issue_ids)
+            rank_order[row, :count] = np.frombuffer(org.issue_ids, dtype=np.intc)
+            ranks[row, :count] = org.ranks
+            value_matrix[row, :count] = np.frombuffer(org.flat_values).reshape(-1, num_questions)
+
+        self.rank_order = rank_order
+        self.rank_order_valid = np.arange(max_org_issues) < num_ranked[:, None]
+        self.ranks = ranks
+        self.num_ranked = num_ranked
+        self.num_action_columns = vocabulary.num_actions
+        self.action_words = pack_masks((org.action_mask for org in profiles), self.num_action_columns)
+        self.num_actions = popcount(self.action_words)
+        self.value_matrix = value_matrix
+
+        # Positions grouped by category id (CSR), for the category distance
+        issue_category_ids = np.append(
+            np.frombuffer(vocabulary.issue_category_ids, dtype=np.intc)[:num_issues], NO_CATEGORY)
+        position_categories = issue_category_ids[rank_order].ravel()
+        categorized = np.flatnonzero(position_categories != NO_CATEGORY)
+        grouped = np.argsort(position_categories[categorized], kind='stable')
+        self.category_positions = categorized[grouped]
+        self.category_offsets = np.zeros(vocabulary.num_categories + 1, dtype=np.intp)
+        np.cumsum(np.bincount(position_categories[categorized], minlength=vocabulary.num_categories),
+                  out=self.category_offsets[1:])
+
+    @classmethod
+    def from_arrays(cls, vocabulary, org_ids, arrays: dict, num_issue_columns: int,
+                    num_action_columns: int) -> 'OrgCatalog':
+        """
+        Rebuild a catalog around existing arrays (one per ``ARRAY_FIELDS``
+        entry) without copying them, e.g. views of shared memory in a worker
+        """
+        _require_numpy()
+        catalog = cls.__new__(cls)
+        catalog.vocabulary = vocabulary
+        catalog.category_index = vocabulary.category_index
+        catalog.org_ids = tuple(org_ids)
+        for field in cls.ARRAY_FIELDS:
+            setattr(catalog, field, arrays[field])
+        catalog.num_issue_columns = num_issue_columns
+        catalog.num_action_columns = num_action_columns
+        return catalog
+
+    def __len__(self):
+        return len(self.org_ids)
+
+    def __repr__(self):
+        return (f"OrgCatalog({len(self.org_ids)} orgs, {self.num_issue_columns} issues, "
+                f"{self.num_action_columns} actions)")
+
+    def category_positions_of(self, category_id: int):
+        """Flat ``rank_order`` positions of the org issues in the category"""
+        if not 0 <= category_id < len(self.category_offsets) - 1:
+            return self.category_positions[:0]
+        return self.category_positions[self.category_offsets[category_id]:self.category_offsets[category_id + 1]]
+
+
+def score_user_against_catalog(user, catalog: OrgCatalog, weights: dict = DEFAULT_WEIGHTS,
+                               scaled_org_ranks=None) -> dict:
+    """
+    Calculate issue, action, value and total scores between one user and every
+    organization in the catalog
+
+    Parameters:
+    -----------
+    user : UserProfile
+        Compiled user profile, built with ``catalog.vocabulary``
+    catalog : OrgCatalog
+        Organizations to score against
+    weights : dict, optional
+        Dictionary of weights for different score components, as for ``score_pair``
+    scaled_org_ranks : numpy.ndarray, optional
+        ``scaled_ranks(catalog, user.max_rank)``, when the caller shares it
+        between users ranking the same number of issues
+
+    Returns:
+    --------
+    dict
+        Dictionary of issue_score, action_score, value_score and total_score
+        arrays, one entry per org in ``catalog.org_ids`` order
+    """
+    _require_numpy()
+    check_vocabulary(user, catalog)
+    if instrumentation.active is not None:
+        return _profiled_score(instrumentation.active, user, catalog, weights, scaled_org_ranks)
+    final_issue_score = issue_components(user, catalog, weights, scaled_org_ranks) * weights['issue_weight']
+    final_action_score = action_components(user, catalog) * weights['action_weight']
+    final_value_score = value_components(user, catalog) * weights.get('value_weight', 0)
+
+    return {
+        'issue_score': round_scores(final_issue_score),
+        'action_score': round_scores(final_action_score),
+        'value_score': round_scores(final_value_score),
+        'total_score': round_scores(final_issue_score + final_action_score + final_value_score),
+    }
+
+
+def _profiled_score(profiler, user, catalog: OrgCatalog, weights: dict, scaled_org_ranks=None) -> dict:
+    """``score_user_against_catalog`` with its phases timed and counted into ``profiler``"""
+    start = perf_counter()
+    final_issue_score = issue_components(user, catalog, weights, scaled_org_ranks) * weights['issue_weight']
+    issues_done = perf_counter()
+    final_action_score = action_components(user, catalog) * weights['action_weight']
+    actions_done = perf_counter()
+    final_value_score = value_components(user, catalog) * weights.get('value_weight', 0)
+    values_done = perf_counter()
+    scores = {
+        'issue_score': round_scores(final_issue_score),
+        'action_score': round_scores(final_action_score),
+        'value_score': round_scores(final_value_score),
+        'total_score': round_scores(final_issue_score + final_action_score + final_value_score),
+    }
+    end = perf_counter()
+
+    profiler.record(
+        {
+            'issues': issues_done - start,
+            'actions': actions_done - issues_done,
+            'values': values_done - actions_done,
+            'rounding': end - values_done,
+        },
+        catalog_counts(user, catalog),
+    )
+    return scores
+
+
+def catalog_counts(user, catalog: OrgCatalog) -> dict:
+    """``scoring.pair_counts`` summed over every org of the catalog"""
+    _require_numpy()
+    positions = _user_positions(user, catalog)
+    _, value_questions = _value_distances(user, catalog, positions)
+
+    category_sizes = np.diff(catalog.category_offsets)
+    user_categories = [category_id for category_id in user.category_ranks
+                       if 0 <= category_id < len(category_sizes)]
+    user_category_sizes = [len(user.category_ranks[category_id]) for category_id in user_categories]
+    num_issues = int(catalog.num_ranked.sum())
+    category_hits = int(category_sizes[user_categories].sum())
+    num_uncategorized = num_issues - len(catalog.category_positions)
+    return {
+        'pairs': len(catalog),
+        'issue_comparisons': int(np.dot(category_sizes[user_categories], user_category_sizes)),
+        'exact_hits': int((positions >= 0).sum()),
+        'category_hits': category_hits,
+        'category_misses': num_issues - category_hits - num_uncategorized,
+        'uncategorized': num_uncategorized,
+        'value_questions': int(value_questions.sum()),
+        'value_penalties': int((value_questions == 0).sum()),
+    }
+
+
+def round_scores(scores):
+    """
+    ``round(score, 2)`` for every element
+
+    ``np.round`` rounds ``score * 100``, which can land on the other side of a
+    half-way case than Python's correctly rounded ``round``; those few
+    elements are rounded with ``round`` itself.
+    """
+    scaled = scores * 100
+    rounded = np.round(scaled) / 100
+    for index in np.flatnonzero(near_half_way(scores)):
+        rounded.flat[index] = round(float(scores.flat[index]), 2)
+    return rounded
+
+
+def near_half_way(scores, tolerance: float = 1e-6):
+    """Mask of scores within ``tolerance`` hundredths of a rounding boundary"""
+    scaled = scores * 100
+    return np.abs(np.abs(scaled - np.floor(scaled)) - 0.5) < tolerance
+
+##_______________________________________________________________
+# Unweighted components, one value per org
+
+def _user_positions(user, catalog):
+    """
+    org x position matrix of where each org issue is in the user's ranking,
+    -1 where the user did not rank it (and in the padding)
+    """
+    issue_ids = np.frombuffer(user.issue_ids, dtype=np.intc)
+    # Unknown issues, and ones interned after the catalog was built, match no org issue
+    has_column = (issue_ids >= 0) & (issue_ids < catalog.num_issue_columns)
+    lookup = np.full(catalog.num_issue_columns + 1, -1, dtype=np.intp)
+    lookup[issue_ids[has_column]] = np.flatnonzero(has_column)
+    return lookup[catalog.rank_order]
+
+
+def _sum_in_order(per_position):
+    """Left-to-right sum over every axis but the first (org) one"""
+    per_position = per_position.reshape(len(per_position), -1)
+    total = np.zeros(len(per_position))
+    for column in per_position.T:
+        total += column
+    return total
+
+
+def scaled_ranks(catalog: OrgCatalog, user_max_rank: int):
+    """
+    org x position ranks scaled to a user ranking ``user_max_rank`` issues;
+    the same for every such user
+    """
+    scale_factor = user_max_rank / catalog.num_ranked
+    return catalog.ranks * scale_factor[:, None]
+
+
+def issue_components(user, catalog: OrgCatalog, weights: dict, scaled_org_ranks=None):
+    """Vector form of ``scoring.issue_component``"""
+    user_max_rank = user.max_rank
+    if scaled_org_ranks is None:
+        scaled_org_ranks = scaled_ranks(catalog, user_max_rank)
+
+    exact_distance = np.full(scaled_org_ranks.shape, float(user_max_rank))
+    positions = _user_positions(user, catalog)
+    shared = positions >= 0
+    user_ranks = np.frombuffer(user.ranks)
+    exact_distance[shared] = np.abs(user_ranks[positions[shared]] - scaled_org_ranks[shared])
+
+    category_distance = np.full(scaled_org_ranks.shape, float(user_max_rank))
+    flat_scaled = scaled_org_ranks.reshape(-1)
+    flat_category_distance = category_distance.reshape(-1)
+    for category_id, ranks in user.category_ranks.items():
+        category_positions = catalog.category_positions_of(category_id)
+        if not len(category_positions):
+            continue
+        ranks = np.asarray(ranks, dtype=float)
+        scaled = flat_scaled[category_positions]
+        # Closest sorted user rank is one of the two either side of the insertion point
+        position = np.searchsorted(ranks, scaled)
+        above = ranks[np.minimum(position, len(ranks) - 1)]
+        below = ranks[np.maximum(position - 1, 0)]
+        closest = np.minimum(np.abs(above - scaled), np.abs(below - scaled))
+        flat_category_distance[category_positions] = np.minimum(closest, user_max_rank)
+
+    weighted_distance = (exact_distance * weights['exact_match'] +
+                         category_distance * weights['category_match'])
+    total_distance = _sum_in_order(np.where(catalog.rank_order_valid, weighted_distance, 0))
+    return total_distance / user_max_rank
+
+
+def action_components(user, catalog: OrgCatalog):
+    """Vector form of ``scoring.action_component``"""
+    return batch_action_components(user.action_mask, len(user.action_ids),
+                                   catalog.action_words, catalog.num_actions)
+
+
+def _value_distances(user, catalog: OrgCatalog, positions):
+    """
+    Per org total value distance and number of mutually answered questions,
+    from the ``_user_positions`` of the user
+    """
+    total_value_distance = np.zeros(len(catalog))
+    num_value_questions = np.zeros(len(catalog), dtype=np.intp)
+    # Only issues both sides ranked can have mutually answered questions
+    shared = positions >= 0
+    num_shared = shared.sum(axis=1)
+    rows = np.flatnonzero(num_shared)
+    if not len(rows):
+        return total_value_distance, num_value_questions
+
+    # Each org's shared positions first, still in its ranking order
+    order = np.argsort(~shared[rows], axis=1, kind='stable')[:, :num_shared.max()]
+    user_positions = np.take_along_axis(positions[rows], order, axis=1)
+    # Position -1 (past an org's shared issues) picks the all-NaN row
+    user_values = np.vstack([answer_matrix(user), np.full(catalog.value_matrix.shape[2], np.nan)])
+    # NaN marks a question either side left unanswered
+    value_distance = np.abs(user_values[user_positions] - catalog.value_matrix[rows[:, None], order])
+    answered = ~np.isnan(value_distance)
+    value_distance[~answered] = 0
+    total_value_distance[rows] = _sum_in_order(value_distance)
+    num_value_questions[rows] = answered.sum(axis=(1, 2))
+    return total_value_distance, num_value_questions
+
+
+def value_components(user, catalog: OrgCatalog):
+    """Vector form of ``scoring.value_component``"""
+    total_value_distance, num_value_questions = _value_distances(
+        user, catalog, _user_positions(user, catalog))
+    mean_distance = np.divide(total_value_distance, num_value_questions,
+                              out=np.zeros(len(catalog)), where=num_value_questions > 0)
+    return np.where(num_value_questions > 0, mean_distance, float(MISSING_VALUE_PENALTY))
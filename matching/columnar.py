@@ -0,0 +1,381 @@
+"""
+Columnar binary export of precomputed top-N matches for the browser client.
+
+The JavaScript scorer recomputes every match on the phone and has no value
+component. ``write_match_results`` stores what the Python side already
+computed, each user's top-N ``score_pair`` results, as flat little-endian
+sections that load straight into typed arrays: the client reads the header
+words, wraps each section in a ``Uint32Array`` / ``Float32Array`` and only
+renders.
+
+Every user has ``top`` slots, so the matches of user ``u`` are
+``[u * top, u * top + match_counts[u])`` in every per-match section; unused
+slots hold org index 0xFFFFFFFF and NaN scores. Scores are float32, so a
+rounded score like 1.23 comes back as the nearest float32 (render with
+``toFixed(2)``).
+
+The writer streams: each section is buffered up to ``SPOOL_SIZE`` bytes and
+spilled to a temporary file, and the file is assembled from those once the
+results run out, so memory does not grow with the number of users (only the
+org id dictionary is held in memory).
+
+File layout (little-endian; every section starts on an 8-byte boundary):
+
+    header    magic b'MRES', then u32: format version, number of users,
+              top (slots per user), flags (bit 0: component scores present),
+              number of orgs in the dictionary, then (offset, length) in
+              bytes (u32, u32) of each section below, in this order
+    match_counts      u32 x users: matches stored for each user (<= top)
+    org_indices       u32 x users x top: index into the org id dictionary
+    total_scores      f32 x users x top
+    issue_scores      f32 x users x top (empty without component scores)
+    action_scores     f32 x users x top (empty without component scores)
+    value_scores      f32 x users x top (empty without component scores)
+    user_id_offsets   u32 x (users + 1): byte range of each user id in user_ids
+    user_id_encodings u8 x users: 0 for a plain UTF-8 string id, 1 for
+                      UTF-8 JSON (ids that are not strings, e.g. numbers or null)
+    user_ids          UTF-8
+    org_id_offsets    u32 x (orgs + 1): byte range of each org id in org_ids
+    org_id_encodings  u8 x orgs, as user_id_encodings
+    org_ids           UTF-8
+
+Reading it in the browser: ``loadMatchResults(buffer)`` in
+``excludes value questions _. algorithm_in_javascript.js`` checks the magic
+and format version, decodes both id dictionaries with ``TextDecoder`` and
+returns ``{userIds, orgIds, top, counts, orgIndices, totals, components}``,
+the per-match sections as typed-array views of ``buffer``; ``userMatches``
+turns one user's row into the match list the client renders.
+"""
+import json
+import struct
+import sys
+import tempfile
+from array import array
+from contextlib import ExitStack
+from functools import partial
+
+
+MAGIC = b'MRES'
+FORMAT_VERSION = 2
+
+SECTIONS = (
+    'match_counts',
+    'org_indices',
+    'total_scores',
+    'issue_scores',
+    'action_scores',
+    'value_scores',
+    'user_id_offsets',
+    'user_id_encodings',
+    'user_ids',
+    'org_id_offsets',
+    'org_id_encodings',
+    'org_ids',
+)
+
+# array / memoryview format of each fixed-width section
+SECTION_FORMATS = {
+    'match_counts': 'I',
+    'org_indices': 'I',
+    'total_scores': 'f',
+    'issue_scores': 'f',
+    'action_scores': 'f',
+    'value_scores': 'f',
+    'user_id_offsets': 'I',
+    'user_id_encodings': 'B',
+    'org_id_offsets': 'I',
+    'org_id_encodings': 'B',
+}
+
+# Score sections and the score_pair keys they hold
+SCORE_SECTIONS = {
+    'total_scores': 'total_score',
+    'issue_scores': 'issue_score',
+    'action_scores': 'action_score',
+    'value_scores': 'value_score',
+}
+
+FLAG_COMPONENTS = 1
+
+# Id encodings
+ID_UTF8 = 0
+ID_JSON = 1
+
+# Org index of an unused slot
+NO_MATCH = 0xFFFFFFFF
+
+_HEADER = struct.Struct('<4sIIIII')
+_SECTION_ENTRY = struct.Struct('<II')
+HEADER_SIZE = _HEADER.size + _SECTION_ENTRY.size * len(SECTIONS)
+
+ALIGNMENT = 8
+
+# Bytes of a section the writer buffers before spilling them to its temporary file
+SPOOL_SIZE = 1 << 20
+
+
+def _check_byte_order():
+    # Sections are written and read in native order
+    if sys.byteorder != 'little':
+        raise RuntimeError("columnar match results can only be used on little-endian machines")
+
+
+def _padding(offset: int) -> int:
+    return -offset % ALIGNMENT
+
+
+def _encode_id(item_id) -> tuple:
+    """(encoding, UTF-8 bytes) of one id"""
+    if isinstance(item_id, str):
+        return ID_UTF8, item_id.encode('utf-8')
+    return ID_JSON, json.dumps(item_id, separators=(',', ':')).encode('utf-8')
+
+
+class _Spool:
+    """
+    Items of one section in order, buffered in an array (a bytearray without
+    ``typecode``) and spilled to a temporary file every ``SPOOL_SIZE`` bytes
+    """
+
+    def __init__(self, typecode: str = None):
+        self.buffer = array(typecode) if typecode else bytearray()
+        self.typecode = typecode
+        self.itemsize = self.buffer.itemsize if typecode else 1
+        self.file = tempfile.TemporaryFile()
+        self.spilled = 0
+
+    def extend(self, items):
+        self.buffer.extend(items)
+        if len(self.buffer) * self.itemsize >= SPOOL_SIZE:
+            self.flush()
+
+    def flush(self):
+        self.file.write(self.buffer)
+        self.spilled += len(self.buffer) * self.itemsize
+        del self.buffer[:]
+
+    @property
+    def nbytes(self) -> int:
+        return self.spilled + len(self.buffer) * self.itemsize
+
+    def rewind(self):
+        """Spill the rest and go back to the start of the file, to read it"""
+        self.flush()
+        self.file.seek(0)
+
+    def read_chunks(self):
+        self.rewind()
+        return iter(partial(self.file.read, SPOOL_SIZE), b'')
+
+
+def _copy_padded(output_file, spool: _Spool, counts: _Spool, top: int, fill):
+    """
+    Copy the compact per-match items of ``spool`` into ``top`` slots per
+    user, the unused ones holding ``fill``
+    """
+    spool.rewind()
+    fill = array(spool.typecode, [fill]).tobytes()
+    item_size = spool.itemsize
+    for chunk in counts.read_chunks():
+        chunk_counts = array('I')
+        chunk_counts.frombytes(chunk)
+        matches = spool.file.read(sum(chunk_counts) * item_size)
+        padded = bytearray()
+        start = 0
+        for count in chunk_counts:
+            end = start + count * item_size
+            padded += matches[start:end]
+            padded += fill * (top - count)
+            start = end
+        output_file.write(padded)
+
+##_______________________________________________________________
+# Writer
+
+def write_match_results(path, results, top: int = None, org_ids=(), components: bool = False) -> int:
+    """
+    Write per-user top-N matches in the columnar binary format
+
+    Parameters:
+    -----------
+    path : str or path-like
+        File to write (replaced if it exists)
+    results : iterable
+        (user_id, matches) pairs, where matches is a ``top_k_matches``
+        'matches' list of (org_id, scores) pairs, best first; read once, as
+        it goes, so it can be a generator over a stream of users
+    top : int, optional
+        Slots per user (default: the longest match list); longer lists are cut
+    org_ids : iterable, optional
+        Org ids to put first in the dictionary, e.g. ``list(catalog)``, so
+        indices stay the same across exports; other orgs are added as they
+        first appear
+    components : bool, optional
+        Also store issue, action and value scores
+
+    Returns:
+    --------
+    int
+        Size of the file in bytes
+    """
+    _check_byte_order()
+    org_index = {}
+    for org_id in org_ids:
+        org_index.setdefault(org_id, len(org_index))
+    score_keys = {name: SCORE_SECTIONS[name]
+                  for name in (SCORE_SECTIONS if components else ('total_scores',))}
+
+    with ExitStack() as spools:
+        def spool(typecode=None):
+            section = _Spool(typecode)
+            spools.callback(section.file.close)
+            return section
+
+        match_counts = spool('I')
+        org_indices = spool('I')
+        score_spools = {name: spool('f') for name in score_keys}
+        user_id_offsets = spool('I')
+        user_id_encodings = spool('B')
+        user_ids = spool()
+        user_id_offsets.extend((0,))
+        num_users = 0
+        longest = 0
+        for user_id, matches in results:
+            if top is not None:
+                matches = matches[:top]
+            num_users += 1
+            longest = max(longest, len(matches))
+            match_counts.extend((len(matches),))
+            org_indices.extend([org_index.setdefault(org_id, len(org_index)) for org_id, _ in matches])
+            for name, key in score_keys.items():
+                score_spools[name].extend([scores[key] for _, scores in matches])
+            encoding, encoded = _encode_id(user_id)
+            user_id_encodings.extend((encoding,))
+            user_ids.extend(encoded)
+            user_id_offsets.extend((user_ids.nbytes,))
+        if top is None:
+            top = longest
+
+        org_id_offsets = array('I', [0])
+        org_id_encodings = array('B')
+        encoded_org_ids = bytearray()
+        for org_id in org_index:
+            encoding, encoded = _encode_id(org_id)
+            org_id_encodings.append(encoding)
+            encoded_org_ids += encoded
+            org_id_offsets.append(len(encoded_org_ids))
+
+        slots_size = 4 * num_users * top
+        lengths = {
+            'match_counts': match_counts.nbytes,
+            'org_indices': slots_size,
+            'issue_scores': 0,
+            'action_scores': 0,
+            'value_scores': 0,
+            **dict.fromkeys(score_keys, slots_size),
+            'user_id_offsets': user_id_offsets.nbytes,
+            'user_id_encodings': user_id_encodings.nbytes,
+            'user_ids': user_ids.nbytes,
+            'org_id_offsets': len(org_id_offsets) * org_id_offsets.itemsize,
+            'org_id_encodings': len(org_id_encodings),
+            'org_ids': len(encoded_org_ids),
+        }
+        table = []
+        offset = HEADER_SIZE + _padding(HEADER_SIZE)
+        for name in SECTIONS:
+            table.append((offset, lengths[name]))
+            offset += lengths[name] + _padding(lengths[name])
+        if offset > 0xFFFFFFFF:
+            raise ValueError("match results do not fit the 4 GiB limit of the columnar format")
+
+        # Per-match sections are padded to top slots as they are copied
+        sections = {
+            'match_counts': match_counts,
+            'org_indices': (org_indices, NO_MATCH),
+            **{name: (score_spool, float('nan')) for name, score_spool in score_spools.items()},
+            'user_id_offsets': user_id_offsets,
+            'user_id_encodings': user_id_encodings,
+            'user_ids': user_ids,
+            'org_id_offsets': org_id_offsets,
+            'org_id_encodings': org_id_encodings,
+            'org_ids': encoded_org_ids,
+        }
+        flags = FLAG_COMPONENTS if components else 0
+        with open(path, 'wb') as output_file:
+            output_file.write(_HEADER.pack(MAGIC, FORMAT_VERSION, num_users, top, flags, len(org_index)))
+            for entry in table:
+                output_file.write(_SECTION_ENTRY.pack(*entry))
+            output_file.write(bytes(_padding(HEADER_SIZE)))
+            for name, (_, length) in zip(SECTIONS, table):
+                section = sections.get(name, b'')
+                if isinstance(section, tuple):
+                    compact, fill = section
+                    _copy_padded(output_file, compact, match_counts, top, fill)
+                elif isinstance(section, _Spool):
+                    for chunk in section.read_chunks():
+                        output_file.write(chunk)
+                else:
+                    output_file.write(section)
+                output_file.write(bytes(_padding(length)))
+            return output_file.tell()
+
+##_______________________________________________________________
+# Reader
+
+def read_match_results(path) -> list:
+    """
+    Read a file written by ``write_match_results``
+
+    Parameters:
+    -----------
+    path : str or path-like
+        Columnar match results file
+
+    Returns:
+    --------
+    list
+        (user_id, [(org_id, scores)]) pairs in file order, one per user
+        written (duplicate ids included), with scores holding the stored
+        score_pair keys as float32 values widened to float
+    """
+    _check_byte_order()
+    with open(path, 'rb') as results_file:
+        buffer = memoryview(results_file.read())
+    if len(buffer) < HEADER_SIZE:
+        raise ValueError("not a columnar match results file: file too short")
+    magic, version, num_users, top, flags, num_orgs = _HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise ValueError("not a columnar match results file: bad magic number")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"unsupported columnar match results version {version}")
+
+    views = {}
+    for index, name in enumerate(SECTIONS):
+        offset, length = _SECTION_ENTRY.unpack_from(buffer, _HEADER.size + index * _SECTION_ENTRY.size)
+        if offset + length > len(buffer):
+            raise ValueError(f"columnar match results section {name!r} is truncated")
+        view = buffer[offset:offset + length]
+        views[name] = view.cast(SECTION_FORMATS[name]) if name in SECTION_FORMATS else view
+
+    def ids(prefix, count):
+        offsets, encodings, encoded = (views[f'{prefix}_id_offsets'], views[f'{prefix}_id_encodings'],
+                                       views[f'{prefix}_ids'])
+        decoded = []
+        for item in range(count):
+            item_id = bytes(encoded[offsets[item]:offsets[item + 1]]).decode('utf-8')
+            decoded.append(json.loads(item_id) if encodings[item] == ID_JSON else item_id)
+        return decoded
+
+    user_ids = ids('user', num_users)
+    org_ids = ids('org', num_orgs)
+    score_sections = [(SCORE_SECTIONS[name], views[name])
+                      for name in SCORE_SECTIONS if name == 'total_scores' or flags & FLAG_COMPONENTS]
+    org_indices = views['org_indices']
+    results = []
+    for user, user_id in enumerate(user_ids):
+        start = user * top
+        results.append((user_id, [
+            (org_ids[org_indices[slot]], {key: scores[slot] for key, scores in score_sections})
+            for slot in range(start, start + views['match_counts'][user])
+        ]))
+    return results
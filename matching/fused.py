@@ -0,0 +1,145 @@
+"""
+Fused single-pass scoring of a UserProfile / OrgProfile pair.
+
+``calculate_total_score`` walks the org's issues once for the exact /
+category distances and a second time for the value questions, looking the
+issue up on the user side in both. ``scoring.fused_components``, which
+``score_pair`` and ``score_users`` use for OrgProfile pairs, visits every org
+issue once: one ``user.position`` lookup gives the exact distance and, for a
+shared issue, the row of value answers to add up. Both totals are still
+added in org order (and question order for the values), so the components
+are the same floats as from the two separate loops.
+
+Further components join the same pass through ``PairComponent``:
+
+    class RankAgreement(PairComponent):
+        name = 'agreement'
+
+        def begin(self, user, org):
+            return 0
+
+        def visit(self, state, org_position, user_position, scaled_org_rank):
+            return state + (user_position is None)
+
+        def finish(self, state, user, org):
+            return state / len(org)
+
+    scorer = FusedScorer([RankAgreement()], weights={**DEFAULT_WEIGHTS, 'agreement_weight': 0.1})
+    scores = scorer.score(user, org)   # score_pair keys plus 'agreement_score'
+
+A component that needs no per-issue data (a distance between the two
+profiles' locations, say) only implements ``begin`` and ``finish``; the
+pass then never calls it per issue.
+"""
+from .actions import mask_action_component
+from .scoring import DEFAULT_WEIGHTS, check_vocabulary, combine_components, fused_components
+
+
+class PairComponent:
+    """
+    Extra score component computed in the fused pass
+
+    Subclasses set ``name``: the result gets a ``'<name>_score'`` entry, the
+    unweighted distance times ``weights['<name>_weight']`` (left out, scored
+    as 0, when the weights have no such entry), added to the total after the
+    issue, action and value scores.
+    """
+    name = None
+
+    def begin(self, user, org):
+        """State of one pair before its first org issue"""
+        return None
+
+    def visit(self, state, org_position: int, user_position, scaled_org_rank: float):
+        """
+        State after one org issue, in org order; ``user_position`` is None
+        when the user did not rank the issue. Not called unless overridden.
+        """
+        return state
+
+    def finish(self, state, user, org) -> float:
+        """Unweighted distance of the pair (lower is better)"""
+        raise NotImplementedError
+
+
+class FusedScorer:
+    """
+    ``score_pair`` for OrgProfile pairs with extra components in the same pass
+
+    Parameters:
+    -----------
+    components : list, optional
+        PairComponent instances with distinct names, scored after the issue,
+        action and value components in this order
+    weights : dict, optional
+        Dictionary of weights for different score components, as for
+        ``score_pair``, plus a '<name>_weight' entry per extra component
+    """
+
+    def __init__(self, components=(), weights: dict = DEFAULT_WEIGHTS):
+        self.components = tuple(components)
+        names = [component.name for component in self.components]
+        if None in names or len(set(names)) != len(names):
+            raise ValueError("every component needs a distinct name")
+        reserved = {'issue', 'action', 'value', 'total'}.intersection(names)
+        if reserved:
+            raise ValueError(f"component names {sorted(reserved)} are taken by the built-in scores")
+        self.weights = weights
+        # Only components that override visit() are called per issue
+        self._per_issue = tuple(type(component).visit is not PairComponent.visit
+                                for component in self.components)
+
+    def __repr__(self):
+        return f"FusedScorer({[component.name for component in self.components]})"
+
+    def score(self, user, org, weights: dict = None) -> dict:
+        """
+        Score one pair
+
+        Parameters:
+        -----------
+        user : UserProfile
+            Compiled user profile
+        org : OrgProfile
+            Compiled org, built with the user's Vocabulary
+        weights : dict, optional
+            Dictionary of weights (default: the scorer's)
+
+        Returns:
+        --------
+        dict
+            The ``score_pair`` result (equal to it without extra components),
+            plus a '<name>_score' entry per extra component
+        """
+        weights = weights or self.weights
+        check_vocabulary(user, org)
+        states = [component.begin(user, org) for component in self.components]
+        visitors = [[component, state] for component, state, per_issue
+                    in zip(self.components, states, self._per_issue) if per_issue]
+
+        issue_distance, value_distance = fused_components(user, org, weights, visitors=visitors)
+        action_distance = mask_action_component(user.action_mask, len(user.action_ids), org.action_mask)
+        if not self.components:
+            return combine_components(issue_distance, action_distance, value_distance, weights)
+
+        visited = iter(visitors)
+        final_scores = [
+            issue_distance * weights['issue_weight'],
+            action_distance * weights['action_weight'],
+            value_distance * weights.get('value_weight', 0),
+        ]
+        for component, state, per_issue in zip(self.components, states, self._per_issue):
+            if per_issue:
+                state = next(visited)[1]
+            final_scores.append(component.finish(state, user, org) * weights.get(f'{component.name}_weight', 0))
+
+        scores = {
+            f'{name}_score': round(final_score, 2)
+            for name, final_score in zip(['issue', 'action', 'value'] +
+                                         [component.name for component in self.components], final_scores)
+        }
+        total_score = 0
+        for final_score in final_scores:
+            total_score += final_score
+        scores['total_score'] = round(total_score, 2)
+        return scores
@@ -0,0 +1,210 @@
+"""
+Compiled form of the ``rankings_by_category`` layout of ``calculate_match_score``.
+
+The 20241223 scorer takes profiles grouped by category:
+
+    {"max_rank": 10, "actions": [...],
+     "rankings_by_category": {"Environmental": {"climate_change": 4, ...}, ...}}
+
+and, on every call, rebuilds a ``category_ranking_differences`` table of
+every org issue against every user issue of the same category just to take
+the minimum of each row. Here each side is compiled once:
+
+- ``GroupedOrg`` keeps, per taxonomy category, the org issues the scorer
+  compares (taxonomy order) with their ranks, and caches the scaled ranks
+  per scale factor, so all users with the same ``max_rank`` share them;
+- ``GroupedUser`` keeps, per category, its ranks by issue and the same ranks
+  sorted, so the smallest difference is a bisect lookup.
+
+``grouped_match_score`` returns exactly what ``calculate_match_score`` does;
+``group_by_category`` converts the flat ``{'rankings', 'actions'}`` format.
+"""
+from array import array
+from bisect import bisect_left
+
+from .taxonomy import CategoryIndex
+
+
+def group_by_category(profile: dict, issue_categories) -> dict:
+    """
+    ``{'rankings', 'actions'}`` profile in the ``rankings_by_category`` layout,
+    with ``max_rank`` the number of ranked issues (uncategorized issues are
+    grouped under their falsy category, which no taxonomy category matches)
+    """
+    rankings_by_category = {}
+    for issue, rank in profile['rankings'].items():
+        rankings_by_category.setdefault(issue_categories.get(issue), {})[issue] = rank
+    return {
+        'max_rank': len(profile['rankings']),
+        'rankings_by_category': rankings_by_category,
+        'actions': profile.get('actions', []),
+    }
+
+
+def _smallest_difference(sorted_ranks: tuple, scaled_org_rank: float):
+    # Only the ranks either side of the insertion point can be the closest one
+    position = bisect_left(sorted_ranks, scaled_org_rank)
+    if position == len(sorted_ranks):
+        return abs(sorted_ranks[-1] - scaled_org_rank)
+    difference = abs(sorted_ranks[position] - scaled_org_rank)
+    if position > 0:
+        difference = min(difference, abs(sorted_ranks[position - 1] - scaled_org_rank))
+    return difference
+
+
+class GroupedUser:
+    """
+    Compiled user in the ``rankings_by_category`` layout
+
+    Parameters:
+    -----------
+    user : dict
+        {'max_rank': int, 'rankings_by_category': {category: {issue: rank}},
+         'actions': list}
+    """
+    __slots__ = ('max_rank', 'actions', 'categories')
+
+    def __init__(self, user: dict):
+        self.max_rank = user['max_rank']
+        self.actions = frozenset(user['actions'])
+        # category -> ({issue: rank}, sorted ranks); categories without issues are left out
+        self.categories = {
+            category: (dict(rankings), tuple(sorted(rankings.values())))
+            for category, rankings in user['rankings_by_category'].items()
+            if rankings
+        }
+
+    def __repr__(self):
+        return f"GroupedUser(max_rank {self.max_rank}, {len(self.categories)} categories)"
+
+
+class GroupedOrg:
+    """
+    Compiled org in the ``rankings_by_category`` layout
+
+    Only the issues ``calculate_match_score`` compares are kept: those listed
+    under the same category in the taxonomy, in taxonomy order.
+
+    Parameters:
+    -----------
+    org : dict
+        {'max_rank': int, 'rankings_by_category': {category: {issue: rank}},
+         'actions': list}
+    issue_categories : dict or CategoryIndex
+        Dictionary mapping issues to their categories
+    """
+    __slots__ = ('max_rank', 'actions', 'groups', '_scaled')
+
+    def __init__(self, org: dict, issue_categories):
+        index = CategoryIndex.coerce(issue_categories)
+        rankings_by_category = org['rankings_by_category']
+        self.max_rank = org['max_rank']
+        self.actions = frozenset(org['actions'])
+        groups = []
+        for category, issues in index.category_to_issues.items():
+            org_category_rankings = rankings_by_category.get(category)
+            if not org_category_rankings:
+                continue
+            ranked = [issue for issue in issues if issue in org_category_rankings]
+            if ranked:
+                groups.append((category, tuple(ranked),
+                               array('d', (org_category_rankings[issue] for issue in ranked))))
+        # (category, issues, ranks) in the order the scorer adds them up
+        self.groups = tuple(groups)
+        # scale factor -> scaled ranks of every group
+        self._scaled = {}
+
+    def __len__(self):
+        return sum(len(issues) for _, issues, _ in self.groups)
+
+    def __repr__(self):
+        return f"GroupedOrg(max_rank {self.max_rank}, {len(self)} issues in {len(self.groups)} categories)"
+
+    def scaled_ranks(self, scale_factor: float) -> tuple:
+        """Ranks of every group times ``scale_factor``, computed once per scale factor"""
+        scaled = self._scaled.get(scale_factor)
+        if scaled is None:
+            scaled = self._scaled[scale_factor] = tuple(
+                tuple(org_rank * scale_factor for org_rank in ranks)
+                for _, _, ranks in self.groups
+            )
+        return scaled
+
+
+def grouped_issue_score(user: GroupedUser, org: GroupedOrg, exact_match_ratio: float = 0.7) -> float:
+    """Issue part of ``calculate_match_score``: mean combined distance over the compared org issues"""
+    user_max_rank = user.max_rank
+    scale_factor = user_max_rank / org.max_rank
+    category_match_ratio = 1 - exact_match_ratio
+    user_categories = user.categories
+    total_issue_distance = 0
+    number_of_comparisons = 0
+
+    for (category, issues, _), scaled_ranks in zip(org.groups, org.scaled_ranks(scale_factor)):
+        number_of_comparisons += len(issues)
+        user_category = user_categories.get(category)
+        if user_category is None:
+            # No user issue in the category: both distances are max_rank
+            issue_distance = (user_max_rank * exact_match_ratio +
+                              user_max_rank * category_match_ratio)
+            for _ in issues:
+                total_issue_distance += issue_distance
+            continue
+
+        user_category_rankings, sorted_ranks = user_category
+        for issue_id, scaled_org_rank in zip(issues, scaled_ranks):
+            exact_distance = user_max_rank
+            user_rank = user_category_rankings.get(issue_id)
+            if user_rank is not None:
+                exact_distance = abs(user_rank - scaled_org_rank)
+            category_distance = _smallest_difference(sorted_ranks, scaled_org_rank)
+            total_issue_distance += (exact_distance * exact_match_ratio +
+                                     category_distance * category_match_ratio)
+
+    return total_issue_distance / (number_of_comparisons or 1)
+
+
+def grouped_match_score(
+    user: GroupedUser,
+    org: GroupedOrg,
+    issue_weight: float = 0.7,
+    action_weight: float = 0.3,
+    exact_match_ratio: float = 0.7
+) -> float:
+    """
+    ``calculate_match_score`` on compiled profiles
+
+    Parameters:
+    -----------
+    user : GroupedUser
+        Compiled user
+    org : GroupedOrg
+        Compiled org
+    issue_weight, action_weight, exact_match_ratio : float, optional
+        Same weights as ``calculate_match_score``
+
+    Returns:
+    --------
+    float
+        Match score, lower is better
+    """
+    user_max_rank = user.max_rank
+    issue_score = grouped_issue_score(user, org, exact_match_ratio)
+
+    user_actions = user.actions
+    org_actions = org.actions
+    if user_actions and org_actions:
+        action_similarity = len(user_actions & org_actions) / len(user_actions | org_actions)
+        action_score = (1 - action_similarity) * user_max_rank
+    else:
+        action_score = user_max_rank
+
+    final_score = (issue_score * issue_weight +
+                   action_score * action_weight)
+    return final_score / user_max_rank
+
+
+def grouped_match_scores(user: GroupedUser, orgs, issue_weight: float = 0.7, action_weight: float = 0.3,
+                         exact_match_ratio: float = 0.7) -> list:
+    """``grouped_match_score`` of one user against each of ``orgs``, in order"""
+    return [grouped_match_score(user, org, issue_weight, action_weight, exact_match_ratio) for org in orgs]
@@ -0,0 +1,170 @@
+"""
+Opt-in per-phase timings and hot-path counters of the scorers.
+
+Nothing is recorded until a ``MatchProfiler`` is enabled. While none is, each
+scoring call pays a single ``active is not None`` check. While one is, every
+``score_pair`` and ``score_user_against_catalog`` call adds its phase wall
+times and counters to it; the counters are worked out in a separate pass
+after the phases are timed, so they do not inflate the timings.
+``top_k_matches`` scores the orgs it does not prune through ``score_pair``
+(pruned ones only count under topk_pruned), and ``MatchSession`` reports the
+phases and pairs of each recomputation.
+
+Phases (the scorers scale each org rank inside the issue loop, so scaling is
+part of 'issues'):
+
+- issues: scaling plus the exact / category distance loop
+- actions: the action set (or bitmask) dissimilarity
+- values: the value question loop
+- rounding: weighting and rounding into the result dict
+
+Counters:
+
+- pairs: (user, org) pairs scored
+- issue_comparisons: (org issue, user rank in the same category) pairs, the
+  inner-loop iterations of the reference's category scan (the compiled
+  scorers bisect the sorted ranks instead, so this is the work they avoid)
+- exact_hits: org issues the user ranked too
+- category_hits / category_misses: categorized org issues in a category the
+  user did / did not rank anything in
+- uncategorized: org issues without a category
+- value_questions: value questions answered by both sides and compared
+- value_penalties: pairs scored with the missing-value penalty
+- topk_pruned: orgs ``top_k_matches`` skipped on their lower bound
+- overlap_fast_path: orgs ``OverlapIndex`` scored in closed form (no shared issue or category)
+
+Usage:
+
+    with profiling() as profiler:
+        ...
+    print(profiler.to_prometheus())
+"""
+import threading
+from contextlib import contextmanager
+
+
+PHASES = ('issues', 'actions', 'values', 'rounding')
+
+COUNTERS = (
+    'pairs',
+    'issue_comparisons',
+    'exact_hits',
+    'category_hits',
+    'category_misses',
+    'uncategorized',
+    'value_questions',
+    'value_penalties',
+    'topk_pruned',
+    'overlap_fast_path',
+)
+
+# The profiler scoring calls report to, or None when profiling is off
+active = None
+
+
+class MatchProfiler:
+    """
+    Thread-safe accumulator of phase wall times and counters, across any
+    number of scoring calls
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._phase_seconds = dict.fromkeys(PHASES, 0.0)
+            self._phase_calls = dict.fromkeys(PHASES, 0)
+            self._counters = dict.fromkeys(COUNTERS, 0)
+
+    def record(self, phases: dict = None, counts: dict = None, calls: int = 1):
+        """
+        Add ``{phase: seconds}`` (each timed over ``calls`` calls) and
+        ``{counter: n}`` under one lock acquisition
+        """
+        with self._lock:
+            for phase, seconds in (phases or {}).items():
+                self._phase_seconds[phase] += seconds
+                self._phase_calls[phase] += calls
+            for counter, count in (counts or {}).items():
+                self._counters[counter] += int(count)
+
+    def count(self, **counts):
+        self.record(counts=counts)
+
+    def merge(self, snapshot: dict):
+        """Add a ``snapshot()`` of another profiler, e.g. from a worker process"""
+        with self._lock:
+            for phase, totals in snapshot['phases'].items():
+                self._phase_seconds[phase] += totals['seconds']
+                self._phase_calls[phase] += totals['calls']
+            for counter, count in snapshot['counters'].items():
+                self._counters[counter] += count
+
+    def snapshot(self) -> dict:
+        """
+        Totals so far
+
+        Returns:
+        --------
+        dict
+            'phases': {phase: {'seconds': float, 'calls': int}}
+            'counters': {counter: int}
+        """
+        with self._lock:
+            return {
+                'phases': {
+                    phase: {'seconds': self._phase_seconds[phase], 'calls': self._phase_calls[phase]}
+                    for phase in self._phase_seconds
+                },
+                'counters': dict(self._counters),
+            }
+
+    def to_prometheus(self, prefix: str = 'matching') -> str:
+        """Snapshot in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = [
+            f'# HELP {prefix}_phase_seconds_total Wall time spent in each scoring phase',
+            f'# TYPE {prefix}_phase_seconds_total counter',
+        ]
+        for phase, totals in snapshot['phases'].items():
+            lines.append(f'{prefix}_phase_seconds_total{{phase="{phase}"}} {totals["seconds"]!r}')
+        lines += [
+            f'# HELP {prefix}_phase_calls_total Scoring calls that timed each phase',
+            f'# TYPE {prefix}_phase_calls_total counter',
+        ]
+        for phase, totals in snapshot['phases'].items():
+            lines.append(f'{prefix}_phase_calls_total{{phase="{phase}"}} {totals["calls"]}')
+        for counter, count in snapshot['counters'].items():
+            lines += [
+                f'# TYPE {prefix}_{counter}_total counter',
+                f'{prefix}_{counter}_total {count}',
+            ]
+        return '\n'.join(lines) + '\n'
+
+
+def enable(profiler: MatchProfiler = None) -> MatchProfiler:
+    """Start reporting scoring calls to ``profiler`` (a new one by default); returns it"""
+    global active
+    active = profiler if profiler is not None else MatchProfiler()
+    return active
+
+
+def disable():
+    """Stop profiling; returns the profiler that was active, if any"""
+    global active
+    profiler, active = active, None
+    return profiler
+
+
+@contextmanager
+def profiling(profiler: MatchProfiler = None):
+    """Profile the scoring calls made inside the ``with`` block, then restore the previous state"""
+    global active
+    previous = active
+    profiler = enable(profiler)
+    try:
+        yield profiler
+    finally:
+        active = previous
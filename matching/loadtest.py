@@ -0,0 +1,166 @@
+"""
+Load test of the matching service: micro-batched vs one request at a time.
+
+For each mode a service is started in a child process on a synthetic catalog
+(``benchmark.generate_dataset``), and ``concurrency`` keep-alive clients each
+send ``requests`` /match requests back to back. The baseline mode sets the
+batch size to 1 and no window, so each request is scored on its own as a
+synchronous handler would.
+
+Command line:
+
+    python -m matching.loadtest [--size small] [--concurrency 32] [--requests 50] \
+        [--window-ms 2] [--max-batch 64] [--output results.json]
+"""
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import sys
+import time
+from collections import Counter
+
+from .benchmark import SIZES, generate_dataset
+from .profiles import OrgProfile
+from .service import build_service, serve
+from .vocabulary import Vocabulary
+
+
+def _dataset(size: str, seed: int, num_users: int) -> dict:
+    return generate_dataset(f'{seed}:{size}', **{**SIZES[size], 'num_users': num_users})
+
+
+def _run_server(size, seed, num_users, window, max_batch, timeout, port_queue):
+    dataset = _dataset(size, seed, num_users)
+    vocabulary = Vocabulary(dataset['taxonomy'], value_questions=dataset['value_questions'])
+    catalog = {org_id: OrgProfile.from_dict(org, vocabulary) for org_id, org in dataset['orgs'].items()}
+    service = build_service(vocabulary, catalog, window=window, max_batch=max_batch, timeout=timeout)
+    asyncio.run(serve(service, '127.0.0.1', 0, port_queue.put))
+
+
+async def _read_response(reader) -> tuple:
+    status_line = await reader.readline()
+    status = int(status_line.split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    return status, await reader.readexactly(length)
+
+
+async def _client(port: int, payloads: list, latencies: list, statuses: Counter):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        for payload in payloads:
+            body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+            request = (f'POST /match HTTP/1.1\r\nHost: 127.0.0.1\r\n'
+                       f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n')
+            start = time.perf_counter()
+            writer.write(request.encode('latin-1') + body)
+            await writer.drain()
+            status, _ = await _read_response(reader)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] += 1
+    finally:
+        writer.close()
+
+
+def percentile(values: list, fraction: float) -> float:
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+async def _load(port: int, users: list, concurrency: int, requests: int, top: int) -> dict:
+    latencies = []
+    statuses = Counter()
+    clients = []
+    for client in range(concurrency):
+        payloads = [
+            {'id': f'{client}-{number}', 'top': top,
+             **users[(client * requests + number) % len(users)]}
+            for number in range(requests)
+        ]
+        clients.append(_client(port, payloads, latencies, statuses))
+    start = time.perf_counter()
+    await asyncio.gather(*clients)
+    seconds = time.perf_counter() - start
+    return {
+        'requests': len(latencies),
+        'seconds': seconds,
+        'requests_per_second': len(latencies) / seconds,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+    }
+
+
+def run_mode(size: str, seed: int, num_users: int, window: float, max_batch: int, timeout: float,
+             concurrency: int, requests: int, top: int) -> dict:
+    """Start a service with the given batching in a child process and load it"""
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(
+        target=_run_server,
+        args=(size, seed, num_users, window, max_batch, timeout, port_queue),
+        daemon=True,
+    )
+    server.start()
+    try:
+        port = port_queue.get(timeout=120)
+        users = _dataset(size, seed, num_users)['users']
+        return asyncio.run(_load(port, users, concurrency, requests, top))
+    finally:
+        server.terminate()
+        server.join()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='python -m matching.loadtest',
+        description="Compare micro-batched and one-at-a-time serving throughput and latency",
+    )
+    parser.add_argument('--size', default='small', choices=list(SIZES), help="catalog preset (default: small)")
+    parser.add_argument('--seed', type=int, default=0, help="dataset seed (default: 0)")
+    parser.add_argument('--users', type=int, default=200, help="distinct users sent (default: 200)")
+    parser.add_argument('--concurrency', type=int, default=32, help="concurrent clients (default: 32)")
+    parser.add_argument('--requests', type=int, default=50, help="requests per client (default: 50)")
+    parser.add_argument('--top', type=int, default=20, help="matches per request (default: 20)")
+    parser.add_argument('--window-ms', type=float, default=2.0,
+                        help="batching window in milliseconds (default: 2)")
+    parser.add_argument('--max-batch', type=int, default=64, help="largest batch (default: 64)")
+    parser.add_argument('--timeout-ms', type=float, default=10000.0,
+                        help="request deadline in milliseconds (default: 10000)")
+    parser.add_argument('--output', default='-', help="JSON results file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    modes = {
+        'baseline': (0.0, 1),
+        'batched': (args.window_ms / 1000, args.max_batch),
+    }
+    results = {}
+    for mode, (window, max_batch) in modes.items():
+        result = run_mode(args.size, args.seed, args.users, window, max_batch, args.timeout_ms / 1000,
+                          args.concurrency, args.requests, args.top)
+        results[mode] = {'window_ms': window * 1000, 'max_batch': max_batch, **result}
+        print(f"{mode:>9}: {result['requests_per_second']:>9,.1f} req/s  "
+              f"p50 {result['p50_ms']:>8.1f} ms  p99 {result['p99_ms']:>8.1f} ms  "
+              f"statuses {result['statuses']}", file=sys.stderr)
+
+    report = {'size': args.size, 'seed': args.seed, 'concurrency': args.concurrency,
+              'requests_per_client': args.requests, 'results': results}
+    if args.output == '-':
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    else:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump(report, output_file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
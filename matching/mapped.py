@@ -0,0 +1,361 @@
+"""
+Memory-mapped binary org catalog.
+
+``write_mapped_catalog`` converts the org dicts (or OrgProfiles) into one
+file, and ``MappedCatalog`` ``mmap``s it: opening a catalog only parses the
+header and the vocabulary, and each org is scored straight off the mapped
+pages through an ``OrgProfile`` whose buffers are views into the file. No
+per-org dicts or arrays are built, and every process that maps the same file
+shares its page cache.
+
+File layout (little-endian; every section starts on a 64-byte boundary):
+
+    header    magic b'MCAT', format version (u32), number of orgs (u64),
+              total org issues (u64), value questions per issue (u32),
+              64-bit action words per org (u32), then (offset, length) in
+              bytes (u64, u64) of each section below, in this order
+    vocabulary       UTF-8 JSON: taxonomy as [issue, category] pairs, issue
+                     names in id order, action names in id order, value
+                     questions, org id encoding
+    org_id_offsets   u64 x (orgs + 1): byte range of each org id in org_ids
+    org_ids          each org id as UTF-8 (string ids) or UTF-8 JSON (any other ids)
+    issue_offsets    u64 x (orgs + 1): each org's range of org issues
+    issue_ids        i32 per org issue, in each org's ranking order
+    category_ids     i32 per org issue
+    ranks            f64 per org issue
+    values           f64 x value questions per org issue (NaN when unanswered)
+    action_words     u64 x action words per org: action bitmask
+"""
+import json
+import mmap
+import struct
+import sys
+from array import array
+from collections.abc import Mapping
+
+from .actions import num_words
+from .profiles import OrgProfile
+from .vocabulary import Vocabulary, _restore_vocabulary
+
+
+MAGIC = b'MCAT'
+FORMAT_VERSION = 1
+
+SECTIONS = (
+    'vocabulary',
+    'org_id_offsets',
+    'org_ids',
+    'issue_offsets',
+    'issue_ids',
+    'category_ids',
+    'ranks',
+    'values',
+    'action_words',
+)
+
+# memoryview format of each fixed-width section
+SECTION_FORMATS = {
+    'org_id_offsets': 'Q',
+    'issue_offsets': 'Q',
+    'issue_ids': 'i',
+    'category_ids': 'i',
+    'ranks': 'd',
+    'values': 'd',
+    'action_words': 'Q',
+}
+
+_HEADER = struct.Struct('<4sIQQII')
+_SECTION_ENTRY = struct.Struct('<QQ')
+HEADER_SIZE = _HEADER.size + _SECTION_ENTRY.size * len(SECTIONS)
+
+ALIGNMENT = 64
+
+
+def _check_byte_order():
+    # Sections are read with native-order memoryview casts
+    if sys.byteorder != 'little':
+        raise RuntimeError("mapped catalogs can only be used on little-endian machines")
+
+
+def _padding(offset: int) -> int:
+    return -offset % ALIGNMENT
+
+##_______________________________________________________________
+# Writer
+
+def write_mapped_catalog(path, orgs: dict, issue_categories) -> int:
+    """
+    Write an org catalog in the mapped binary format
+
+    Parameters:
+    -----------
+    path : str or path-like
+        File to write (replaced if it exists)
+    orgs : dict
+        Dictionary of organizations, format:
+        {org_id: {'rankings': dict, 'actions': list, 'values': dict}}
+        'actions' and 'values' are optional. Entries can also be OrgProfiles.
+        Org ids must be JSON-serializable.
+    issue_categories : dict, CategoryIndex or Vocabulary
+        Dictionary mapping issues to their categories, or the Vocabulary to
+        intern the orgs' issues and actions into
+
+    Returns:
+    --------
+    int
+        Size of the file in bytes
+    """
+    _check_byte_order()
+    vocabulary = Vocabulary.coerce(issue_categories)
+    profiles = []
+    for org in orgs.values():
+        if isinstance(org, OrgProfile):
+            if org.vocabulary is not vocabulary:
+                org = OrgProfile.from_dict(org.to_dict(), vocabulary)
+        else:
+            org = OrgProfile.from_dict(org, vocabulary)
+        profiles.append(org)
+
+    # Interning is done, so the action count (and word width) is final
+    words = num_words(vocabulary.num_actions)
+    org_id_offsets = array('Q', [0])
+    org_ids = bytearray()
+    issue_offsets = array('Q', [0])
+    issue_ids = array('i')
+    category_ids = array('i')
+    ranks = array('d')
+    values = array('d')
+    action_words = bytearray()
+    # String ids are stored as plain UTF-8, which is quicker to decode than JSON
+    org_id_encoding = 'utf-8' if all(isinstance(org_id, str) for org_id in orgs) else 'json'
+    for org_id, org in zip(orgs, profiles):
+        if org_id_encoding == 'utf-8':
+            org_ids += org_id.encode('utf-8')
+        else:
+            org_ids += json.dumps(org_id, separators=(',', ':')).encode('utf-8')
+        org_id_offsets.append(len(org_ids))
+        issue_ids.extend(org.issue_ids)
+        category_ids.extend(org.category_ids)
+        ranks.extend(org.ranks)
+        values.extend(org.flat_values)
+        issue_offsets.append(len(issue_ids))
+        action_words += org.action_mask.to_bytes(words * 8, 'little')
+
+    category_index = vocabulary.category_index
+    vocabulary_section = json.dumps({
+        'taxonomy': [[issue, category_index[issue]] for issue in category_index],
+        'issues': [vocabulary.issue(issue_id) for issue_id in range(vocabulary.num_issues)],
+        'actions': [vocabulary.action(action_id) for action_id in range(vocabulary.num_actions)],
+        'value_questions': list(vocabulary.value_questions),
+        'org_id_encoding': org_id_encoding,
+    }, separators=(',', ':')).encode('utf-8')
+
+    sections = {
+        'vocabulary': vocabulary_section,
+        'org_id_offsets': org_id_offsets,
+        'org_ids': org_ids,
+        'issue_offsets': issue_offsets,
+        'issue_ids': issue_ids,
+        'category_ids': category_ids,
+        'ranks': ranks,
+        'values': values,
+        'action_words': action_words,
+    }
+    table = []
+    offset = HEADER_SIZE + _padding(HEADER_SIZE)
+    for name in SECTIONS:
+        length = memoryview(sections[name]).nbytes
+        table.append((offset, length))
+        offset += length + _padding(length)
+
+    with open(path, 'wb') as output_file:
+        output_file.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(profiles), len(issue_ids),
+                                       vocabulary.num_questions, words))
+        for entry in table:
+            output_file.write(_SECTION_ENTRY.pack(*entry))
+        output_file.write(bytes(_padding(HEADER_SIZE)))
+        for name, (_, length) in zip(SECTIONS, table):
+            output_file.write(sections[name])
+            output_file.write(bytes(_padding(length)))
+        return output_file.tell()
+
+##_______________________________________________________________
+# Reader
+
+class MappedCatalog(Mapping):
+    """
+    Read-only ``{org_id: OrgProfile}`` mapping over a mapped catalog file
+
+    Can be passed wherever a catalog of OrgProfiles is accepted
+    (``top_k_matches``, ``MatchSession``, ``pipeline.score_users``, ...).
+    Users must be built with ``catalog.vocabulary``. The OrgProfiles handed
+    out are views into the file and keep it mapped while they are alive.
+
+    Parameters:
+    -----------
+    path : str or path-like
+        File written by ``write_mapped_catalog``
+    """
+
+    def __init__(self, path):
+        _check_byte_order()
+        with open(path, 'rb') as catalog_file:
+            self._mmap = mmap.mmap(catalog_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._open()
+        except Exception:
+            self.close()
+            raise
+
+    def _open(self):
+        buffer = memoryview(self._mmap)
+        self._buffer = buffer
+        if len(buffer) < HEADER_SIZE:
+            raise ValueError("not a mapped catalog: file too short")
+        magic, version, num_orgs, num_org_issues, num_questions, words = _HEADER.unpack_from(buffer)
+        if magic != MAGIC:
+            raise ValueError("not a mapped catalog: bad magic number")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"unsupported mapped catalog version {version}")
+
+        views = {}
+        for index, name in enumerate(SECTIONS):
+            offset, length = _SECTION_ENTRY.unpack_from(buffer, _HEADER.size + index * _SECTION_ENTRY.size)
+            if offset + length > len(buffer):
+                raise ValueError(f"mapped catalog section {name!r} is truncated")
+            view = buffer[offset:offset + length]
+            views[name] = view.cast(SECTION_FORMATS[name]) if name in SECTION_FORMATS else view
+        self._views = views
+
+        vocabulary = json.loads(bytes(views['vocabulary']))
+        if len(vocabulary['value_questions']) != num_questions:
+            raise ValueError("mapped catalog header and vocabulary disagree on the value questions")
+        self.vocabulary = _restore_vocabulary(
+            {issue: category for issue, category in vocabulary['taxonomy']},
+            vocabulary['issues'],
+            vocabulary['actions'],
+            vocabulary['value_questions'],
+        )
+        self._num_orgs = num_orgs
+        self._num_org_issues = num_org_issues
+        self._num_questions = num_questions
+        self._word_bytes = words * 8
+        self._decode_id = bytes.decode if vocabulary['org_id_encoding'] == 'utf-8' else json.loads
+        self._action_bytes = views['action_words'].cast('B')
+        self._positions = None
+
+    def close(self):
+        """Release the mapping (once no OrgProfile handed out is left)"""
+        views = getattr(self, '_views', {})
+        for view in list(views.values()) + [getattr(self, '_action_bytes', None),
+                                            getattr(self, '_buffer', None)]:
+            if view is not None:
+                view.release()
+        self._views = {}
+        self._action_bytes = self._buffer = None
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # Profiles handed out still view the mapping; it is unmapped
+                # once the last of them is garbage collected
+                pass
+            self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __repr__(self):
+        return (f"MappedCatalog({self._num_orgs} orgs, {self._num_org_issues} org issues, "
+                f"{self.vocabulary.num_actions} actions)")
+
+##_______________________________________________________________
+    # Orgs by position
+
+    def __len__(self):
+        return self._num_orgs
+
+    def org_id(self, row: int):
+        offsets = self._views['org_id_offsets']
+        return self._decode_id(bytes(self._views['org_ids'][offsets[row]:offsets[row + 1]]))
+
+    def org(self, row: int) -> OrgProfile:
+        """OrgProfile of the org at ``row``, backed by the mapped file"""
+        if not 0 <= row < self._num_orgs:
+            raise IndexError(row)
+        return next(self._orgs(row, row + 1))[1]
+
+    def _orgs(self, start: int, stop: int):
+        """(org_id, OrgProfile) of rows ``start...stop``"""
+        # Hot loop of every full-catalog scan: everything it reads is a local
+        views = self._views
+        id_offsets = views['org_id_offsets']
+        org_ids = views['org_ids']
+        issue_offsets = views['issue_offsets']
+        issue_ids = views['issue_ids']
+        category_ids = views['category_ids']
+        ranks = views['ranks']
+        values = views['values']
+        action_bytes = self._action_bytes
+        decode_id = self._decode_id
+        vocabulary = self.vocabulary
+        num_questions = self._num_questions
+        word_bytes = self._word_bytes
+        new_profile = OrgProfile.__new__
+        from_bytes = int.from_bytes
+
+        id_end = id_offsets[start]
+        issue_end = issue_offsets[start]
+        for row in range(start, stop):
+            id_start, id_end = id_end, id_offsets[row + 1]
+            issue_start, issue_end = issue_end, issue_offsets[row + 1]
+            org = new_profile(OrgProfile)
+            org.vocabulary = vocabulary
+            org.issue_ids = issue_ids[issue_start:issue_end]
+            org.category_ids = category_ids[issue_start:issue_end]
+            org.ranks = ranks[issue_start:issue_end]
+            org.flat_values = values[issue_start * num_questions:issue_end * num_questions]
+            org.action_mask = from_bytes(action_bytes[row * word_bytes:(row + 1) * word_bytes], 'little')
+            yield decode_id(bytes(org_ids[id_start:id_end])), org
+
+##_______________________________________________________________
+    # Mapping interface (org_id -> OrgProfile)
+
+    def __iter__(self):
+        for row in range(self._num_orgs):
+            yield self.org_id(row)
+
+    def __getitem__(self, org_id) -> OrgProfile:
+        if self._positions is None:
+            # Only built for lookups by id; iteration never needs it
+            self._positions = {self.org_id(row): row for row in range(self._num_orgs)}
+        return self.org(self._positions[org_id])
+
+    def items(self):
+        return _MappedItems(self)
+
+    def values(self):
+        return _MappedValues(self)
+
+
+class _MappedItems:
+    # items() view that walks the rows in order instead of looking each id up
+
+    def __init__(self, catalog: MappedCatalog):
+        self._catalog = catalog
+
+    def __len__(self):
+        return len(self._catalog)
+
+    def __iter__(self):
+        return self._catalog._orgs(0, len(self._catalog))
+
+
+class _MappedValues(_MappedItems):
+
+    def __iter__(self):
+        for _, org in self._catalog._orgs(0, len(self._catalog)):
+            yield org
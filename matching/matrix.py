@@ -0,0 +1,168 @@
+"""
+Users x organizations score matrix on several cores.
+
+``score_matrix`` copies the arrays of an ``OrgCatalog`` into
+``multiprocessing.shared_memory`` once, so worker processes attach to them
+instead of each unpickling its own copy of the catalog. Users are sent to the
+workers in chunks, scored with ``score_user_against_catalog`` and written
+straight into a shared users x orgs output array.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+
+from .catalog import OrgCatalog, _require_numpy, score_user_against_catalog
+from .profiles import UserProfile
+from .scoring import DEFAULT_WEIGHTS
+
+
+def _create_shared(array):
+    """Copy an array into a new shared memory block; returns (block, descriptor)"""
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    shared = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+    shared[...] = array
+    return block, (block.name, array.shape, array.dtype.str)
+
+
+def _attach_shared(descriptor):
+    """Attach to a block made by ``_create_shared``; returns (block, array view)"""
+    name, shape, dtype = descriptor
+    # Pool workers share the coordinator's resource tracker, so attaching does
+    # not add a second owner: the coordinator alone unlinks the block
+    block = shared_memory.SharedMemory(name=name)
+    return block, np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+##_______________________________________________________________
+# Worker side
+
+_worker_catalog = None
+_worker_output = None
+_worker_blocks = []
+
+
+def _init_worker(catalog_state, output_descriptor):
+    global _worker_catalog, _worker_output
+    if catalog_state is None:
+        # In-process scoring: output_descriptor is (catalog, output) itself
+        _worker_catalog, _worker_output = output_descriptor
+        return
+    vocabulary, org_ids, descriptors, num_issue_columns, num_action_columns = catalog_state
+    arrays = {}
+    for field, descriptor in descriptors.items():
+        block, arrays[field] = _attach_shared(descriptor)
+        _worker_blocks.append(block)
+    _worker_catalog = OrgCatalog.from_arrays(
+        vocabulary, org_ids, arrays, num_issue_columns, num_action_columns)
+
+    block, _worker_output = _attach_shared(output_descriptor)
+    _worker_blocks.append(block)
+
+
+def _score_chunk(first_row, users, weights, score):
+    """Score a chunk of user dicts into rows ``first_row...`` of the output"""
+    catalog = _worker_catalog
+    for offset, user in enumerate(users):
+        user_profile = UserProfile(
+            user['rankings'],
+            catalog.vocabulary,
+            user.get('actions', ()),
+            user.get('values'),
+        )
+        scores = score_user_against_catalog(user_profile, catalog, weights)[score]
+        _worker_output[first_row + offset] = scores
+    return len(users)
+
+##_______________________________________________________________
+# Coordinator
+
+def score_matrix(
+    users: list,
+    catalog: OrgCatalog,
+    weights: dict = DEFAULT_WEIGHTS,
+    workers: int = None,
+    chunk_size: int = 256,
+    dtype=None,
+    score: str = 'total_score',
+):
+    """
+    Score every user against every organization of the catalog
+
+    Parameters:
+    -----------
+    users : list
+        List of users, format:
+        [{'rankings': dict, 'actions': list, 'values': dict}, ...]
+        'actions' and 'values' are optional
+    catalog : OrgCatalog
+        Organizations to score against
+    weights : dict, optional
+        Dictionary of weights for different score components, as for ``score_pair``
+    workers : int, optional
+        Number of worker processes (default: one per CPU). 1 scores in this
+        process, without a pool.
+    chunk_size : int, optional
+        Users sent to a worker per task. Larger chunks cost less overhead,
+        smaller ones balance the load better.
+    dtype : numpy dtype, optional
+        Output dtype, float64 by default; float32 halves the output memory
+    score : str, optional
+        Which score to store: 'total_score', 'issue_score', 'action_score'
+        or 'value_score'
+
+    Returns:
+    --------
+    numpy.ndarray
+        len(users) x len(catalog) array of scores, rows in ``users`` order
+        and columns in ``catalog.org_ids`` order
+    """
+    _require_numpy()
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be positive")
+    dtype = np.dtype(np.float64 if dtype is None else dtype)
+    workers = workers or os.cpu_count() or 1
+    shape = (len(users), len(catalog))
+    chunks = [(first_row, users[first_row:first_row + chunk_size])
+              for first_row in range(0, len(users), chunk_size)]
+
+    if workers == 1 or len(chunks) <= 1:
+        output = np.empty(shape, dtype=dtype)
+        _init_worker(None, (catalog, output))
+        try:
+            for first_row, chunk in chunks:
+                _score_chunk(first_row, chunk, weights, score)
+        finally:
+            _init_worker(None, (None, None))
+        return output
+
+    blocks = []
+    try:
+        descriptors = {}
+        for field in OrgCatalog.ARRAY_FIELDS:
+            block, descriptors[field] = _create_shared(getattr(catalog, field))
+            blocks.append(block)
+        output_size = dtype.itemsize * shape[0] * shape[1]
+        output_block = shared_memory.SharedMemory(create=True, size=max(output_size, 1))
+        blocks.append(output_block)
+        output_descriptor = (output_block.name, shape, dtype.str)
+        catalog_state = (catalog.vocabulary, catalog.org_ids, descriptors,
+                         catalog.num_issue_columns, catalog.num_action_columns)
+
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks)),
+                                 initializer=_init_worker,
+                                 initargs=(catalog_state, output_descriptor)) as pool:
+            futures = [pool.submit(_score_chunk, first_row, chunk, weights, score)
+                       for first_row, chunk in chunks]
+            for future in futures:
+                future.result()
+
+        # Copy out so the shared block can be freed; no view of it may outlive this
+        return np.ndarray(shape, dtype=dtype, buffer=output_block.buf).copy()
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
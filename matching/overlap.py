@@ -0,0 +1,200 @@
+"""
+Inverted issue / category index over a catalog, with a closed form for orgs
+that share nothing with the user.
+
+An org that ranks none of the user's issues and no issue in any of the user's
+categories gets ``user_max_rank`` for both the exact and the category
+distance of every issue it ranks, and has no shared issue to compare values
+on. Its issue component then only depends on how many issues it ranks, and
+its value component is MISSING_VALUE_PENALTY. ``OverlapIndex`` looks up the
+orgs that do overlap through posting lists and scores only those issue by
+issue; every other org is scored from its issue count and action component.
+Scores are identical to ``score_pair``.
+"""
+import heapq
+
+from . import instrumentation
+from .actions import mask_action_component
+from .profiles import OrgProfile
+from .ranking import top_k_matches
+from .scoring import DEFAULT_WEIGHTS, combine_components, score_pair
+from .taxonomy import NO_CATEGORY
+from .values import MISSING_VALUE_PENALTY
+
+
+class OverlapIndex:
+    """
+    Orgs of a catalog by the issue ids and category ids they rank
+
+    Parameters:
+    -----------
+    catalog : dict
+        Dictionary of organizations, {org_id: OrgProfile} or
+        {org_id: {'rankings': dict, 'actions': list, 'values': dict}}
+    vocabulary : Vocabulary
+        Vocabulary the OrgProfiles were built with (dict entries are compiled into it)
+    """
+
+    def __init__(self, catalog: dict, vocabulary):
+        self.vocabulary = vocabulary
+        self._org_ids = list(catalog)
+        self._orgs = [
+            org if isinstance(org, OrgProfile) else OrgProfile.from_dict(org, vocabulary)
+            for org in catalog.values()
+        ]
+        for org in self._orgs:
+            if org.vocabulary is not vocabulary:
+                raise ValueError("OrgProfile was built with a different vocabulary")
+
+        # Catalog rows ranking each issue id / an issue in each category id
+        rows_by_issue = {}
+        rows_by_category = {}
+        for row, org in enumerate(self._orgs):
+            for issue_id in set(org.issue_ids):
+                rows_by_issue.setdefault(issue_id, []).append(row)
+            for category_id in set(org.category_ids):
+                if category_id != NO_CATEGORY:
+                    rows_by_category.setdefault(category_id, []).append(row)
+        self._rows_by_issue = {issue_id: tuple(rows) for issue_id, rows in rows_by_issue.items()}
+        self._rows_by_category = {category_id: tuple(rows) for category_id, rows in rows_by_category.items()}
+        # Orgs ranking nothing go through score_pair, which fails on them like the reference
+        self._empty_rows = tuple(row for row, org in enumerate(self._orgs) if not len(org))
+        self._max_issues = max(map(len, self._orgs), default=0)
+
+    def __len__(self) -> int:
+        return len(self._orgs)
+
+    def __repr__(self) -> str:
+        return (f"OverlapIndex({len(self._orgs)} orgs, {len(self._rows_by_issue)} issues, "
+                f"{len(self._rows_by_category)} categories)")
+
+    def overlapping(self, user) -> set:
+        """Catalog rows of the orgs that rank one of the user's issues or categories"""
+        self._check_vocabulary(user)
+        rows = set(self._empty_rows)
+        rows_by_issue = self._rows_by_issue
+        for issue_id in user.issue_ids:
+            rows.update(rows_by_issue.get(issue_id, ()))
+        rows_by_category = self._rows_by_category
+        for category_id in user.category_ranks:
+            rows.update(rows_by_category.get(category_id, ()))
+        return rows
+
+    def score_user(self, user, weights: dict = DEFAULT_WEIGHTS) -> dict:
+        """
+        Score a user against every org of the index
+
+        Parameters:
+        -----------
+        user : UserProfile
+            User compiled with the index's vocabulary
+        weights : dict, optional
+            Dictionary of weights for different score components, as for ``score_pair``
+
+        Returns:
+        --------
+        dict
+            'scores': list of (org_id, scores) pairs in catalog order, where
+            scores is the ``score_pair`` result dict
+            'fast_path': number of orgs scored in closed form
+        """
+        overlapping = self.overlapping(user)
+        closed_form = self._closed_form(user, weights)
+        scores = []
+        for row, (org_id, org) in enumerate(zip(self._org_ids, self._orgs)):
+            if row in overlapping:
+                scores.append((org_id, score_pair(user, org, weights=weights)))
+            else:
+                scores.append((org_id, dict(closed_form(org))))
+
+        fast_path = len(self._orgs) - len(overlapping)
+        if instrumentation.active is not None:
+            instrumentation.active.count(overlap_fast_path=fast_path)
+        return {'scores': scores, 'fast_path': fast_path}
+
+    def top_k(self, user, k: int = 20, weights: dict = DEFAULT_WEIGHTS) -> dict:
+        """
+        Find the k best (lowest total_score) orgs of the index for a user
+
+        Same matches and order as ``top_k_matches`` over the whole catalog.
+        Overlapping orgs go through ``top_k_matches``; the others are scored
+        in closed form and merged in by (total_score, catalog order).
+
+        Returns:
+        --------
+        dict
+            'matches': list of (org_id, scores) pairs, best first
+            'pruned': number of overlapping orgs whose issue component was never computed
+            'fast_path': number of orgs scored in closed form
+        """
+        overlapping = self.overlapping(user)
+        fast_path = len(self._orgs) - len(overlapping)
+        if instrumentation.active is not None:
+            instrumentation.active.count(overlap_fast_path=fast_path)
+        if k <= 0:
+            return {'matches': [], 'pruned': len(overlapping), 'fast_path': fast_path}
+
+        org_ids = self._org_ids
+        orgs = self._orgs
+        # Sub-catalog in catalog order, so top_k_matches breaks ties the same way
+        row_of = {org_ids[row]: row for row in sorted(overlapping)}
+        result = top_k_matches(user, {org_id: orgs[row] for org_id, row in row_of.items()}, k, weights)
+        ranked = [(scores['total_score'], row_of[org_id], org_id, scores)
+                  for org_id, scores in result['matches']]
+
+        closed_form = self._closed_form(user, weights)
+        best = []
+        for row, org in enumerate(orgs):
+            if row in overlapping:
+                continue
+            scores = closed_form(org)
+            entry = (-scores['total_score'], -row)
+            if len(best) < k:
+                heapq.heappush(best, (entry, scores))
+            elif entry > best[0][0]:
+                heapq.heapreplace(best, (entry, scores))
+        ranked.extend((scores['total_score'], -negative_row, org_ids[-negative_row], dict(scores))
+                      for (_, negative_row), scores in best)
+
+        ranked.sort(key=lambda entry: (entry[0], entry[1]))
+        return {
+            'matches': [(org_id, scores) for _, _, org_id, scores in ranked[:k]],
+            'pruned': result['pruned'],
+            'fast_path': fast_path,
+        }
+
+    def _closed_form(self, user, weights: dict):
+        """
+        ``org -> scores`` for orgs sharing no issue or category with the user;
+        the returned dicts are shared between orgs and must not be modified
+        """
+        user_max_rank = user.max_rank
+        issue_term = (user_max_rank * weights['exact_match'] +
+                      user_max_rank * weights['category_match'])
+        # Same left-to-right additions as issue_component, one total per issue count
+        totals = [0]
+        for _ in range(self._max_issues):
+            totals.append(totals[-1] + issue_term)
+
+        user_mask = user.action_mask
+        num_user_actions = len(user.action_ids)
+        by_shape = {}
+
+        def closed_form(org):
+            action_distance = mask_action_component(user_mask, num_user_actions, org.action_mask)
+            shape = (len(org), action_distance)
+            scores = by_shape.get(shape)
+            if scores is None:
+                scores = by_shape[shape] = combine_components(
+                    totals[shape[0]] / user_max_rank,
+                    action_distance,
+                    MISSING_VALUE_PENALTY,
+                    weights,
+                )
+            return scores
+
+        return closed_form
+
+    def _check_vocabulary(self, user):
+        if user.vocabulary is not self.vocabulary:
+            raise ValueError("UserProfile was built with a different vocabulary than the index")
@@ -0,0 +1,183 @@
+"""
+Streaming JSONL scoring pipeline.
+
+Users are read one JSON object per line, scored against an org catalog loaded
+once, and written out as one JSON object per line with their top-N matches.
+Every stage is a generator, so memory is bounded by the catalog no matter how
+many users go through.
+
+Input lines (users and orgs) use the dict format of ``calculate_total_score``:
+
+    {"id": "u1", "rankings": {"Ocean Conservation": 1, ...},
+     "actions": ["volunteer", ...], "values": {"Ocean Conservation": {"q1": 8}}}
+
+Output lines:
+
+    {"id": "u1", "matches": [{"org": "o7", "issue_score": ..., "action_score": ...,
+                              "value_score": ..., "total_score": ...}, ...]}
+
+Command line:
+
+    python -m matching.pipeline --taxonomy categories.json --orgs orgs.jsonl \
+        [--users users.jsonl] [--output results.jsonl] [--top 20]
+
+With ``--format columnar`` the results go to ``--output`` in the binary
+layout of ``columnar`` (for the browser client) instead of JSONL.
+"""
+import argparse
+import json
+import sys
+
+from .columnar import write_match_results
+from .profiles import OrgProfile, UserProfile
+from .ranking import top_k_matches
+from .scoring import DEFAULT_WEIGHTS
+from .vocabulary import VALUE_QUESTIONS, Vocabulary
+
+
+# Default read / write buffer size in bytes
+DEFAULT_BUFFER_SIZE = 1 << 16
+
+
+def read_jsonl(stream):
+    """Yield one parsed object per non-blank line"""
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as error:
+            raise ValueError(f"line {line_number}: {error}") from None
+
+
+def write_jsonl(records, stream):
+    """Write one compact JSON object per line; returns the number written"""
+    count = 0
+    for record in records:
+        stream.write(json.dumps(record, separators=(',', ':')))
+        stream.write('\n')
+        count += 1
+    return count
+
+
+def load_catalog(org_records, vocabulary: Vocabulary) -> dict:
+    """
+    Compile org records (each with an "id") into ``{org_id: OrgProfile}``
+
+    Parameters:
+    -----------
+    org_records : iterable
+        Org dicts, e.g. from ``read_jsonl``
+    vocabulary : Vocabulary
+        Vocabulary the orgs are interned into
+
+    Returns:
+    --------
+    dict
+        Dictionary of compiled orgs, in input order
+    """
+    catalog = {}
+    for record in org_records:
+        org_id = record.get('id')
+        if org_id is None:
+            raise ValueError("every org record needs an 'id'")
+        if org_id in catalog:
+            raise ValueError(f"duplicate org id {org_id!r}")
+        catalog[org_id] = OrgProfile.from_dict(record, vocabulary)
+    return catalog
+
+
+def score_users(user_records, catalog: dict, vocabulary: Vocabulary, top: int = 20,
+                weights: dict = DEFAULT_WEIGHTS):
+    """
+    Yield ``{"id", "matches"}`` for each user record, matches best first
+
+    Parameters:
+    -----------
+    user_records : iterable
+        User dicts, e.g. from ``read_jsonl``; "id" is optional and echoed back
+    catalog : dict
+        Compiled orgs from ``load_catalog``
+    vocabulary : Vocabulary
+        Vocabulary the catalog was compiled with
+    top : int, optional
+        Number of matches per user
+    weights : dict, optional
+        Dictionary of weights for different score components, as for ``score_pair``
+    """
+    for record in user_records:
+        user = UserProfile(
+            record['rankings'],
+            vocabulary,
+            record.get('actions', ()),
+            record.get('values'),
+        )
+        result = top_k_matches(user, catalog, top, weights)
+        yield {
+            'id': record.get('id'),
+            'matches': [{'org': org_id, **scores} for org_id, scores in result['matches']],
+        }
+
+##_______________________________________________________________
+# Command line
+
+def _open(path, mode, buffer_size):
+    if path == '-':
+        stream = sys.stdin if 'r' in mode else sys.stdout
+        return open(stream.fileno(), mode, buffering=buffer_size, encoding='utf-8', closefd=False)
+    return open(path, mode, buffering=buffer_size, encoding='utf-8')
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='python -m matching.pipeline',
+        description="Score users from JSONL against an org catalog and write top matches as JSONL",
+    )
+    parser.add_argument('--taxonomy', required=True, help="JSON file mapping issues to categories")
+    parser.add_argument('--orgs', required=True, help="JSONL file of orgs, one per line, each with an 'id'")
+    parser.add_argument('--value-questions', default=','.join(VALUE_QUESTIONS),
+                        help=f"comma-separated value questions (default: {','.join(VALUE_QUESTIONS)})")
+    parser.add_argument('--users', default='-', help="JSONL file of users (default: stdin)")
+    parser.add_argument('--output', default='-', help="JSONL output file (default: stdout)")
+    parser.add_argument('--top', type=int, default=20, help="matches per user (default: 20)")
+    parser.add_argument('--format', choices=('jsonl', 'columnar'), default='jsonl',
+                        help="output format (default: jsonl); columnar needs an --output file")
+    parser.add_argument('--components', action='store_true',
+                        help="columnar output: also store issue, action and value scores")
+    parser.add_argument('--weights', help="JSON file of score weights (default: DEFAULT_WEIGHTS)")
+    parser.add_argument('--read-buffer', type=int, default=DEFAULT_BUFFER_SIZE,
+                        help=f"input buffer size in bytes (default: {DEFAULT_BUFFER_SIZE})")
+    parser.add_argument('--write-buffer', type=int, default=DEFAULT_BUFFER_SIZE,
+                        help=f"output buffer size in bytes (default: {DEFAULT_BUFFER_SIZE})")
+    args = parser.parse_args(argv)
+    if args.format == 'columnar' and args.output == '-':
+        parser.error("--format columnar needs an --output file")
+
+    with open(args.taxonomy, encoding='utf-8') as taxonomy_file:
+        vocabulary = Vocabulary(json.load(taxonomy_file), value_questions=args.value_questions.split(','))
+    weights = DEFAULT_WEIGHTS
+    if args.weights:
+        with open(args.weights, encoding='utf-8') as weights_file:
+            weights = json.load(weights_file)
+    with _open(args.orgs, 'r', args.read_buffer) as orgs_file:
+        catalog = load_catalog(read_jsonl(orgs_file), vocabulary)
+
+    if args.format == 'columnar':
+        with _open(args.users, 'r', args.read_buffer) as users_file:
+            results = (
+                (record['id'], [(match.pop('org'), match) for match in record['matches']])
+                for record in score_users(read_jsonl(users_file), catalog, vocabulary, args.top, weights)
+            )
+            write_match_results(args.output, results, args.top, list(catalog), args.components)
+        return 0
+
+    with _open(args.users, 'r', args.read_buffer) as users_file, \
+            _open(args.output, 'w', args.write_buffer) as output_file:
+        write_jsonl(score_users(read_jsonl(users_file), catalog, vocabulary, args.top, weights),
+                    output_file)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+"""
+Compiled user and organization profiles.
+
+A profile is built once from the dict input format used by
+``calculate_total_score`` and then reused for every pair it is scored in.
+
+Issues are stored as integer ids from a shared ``Vocabulary`` in ``array``
+buffers, actions as a bitmask over action ids, and value answers as a dense
+issue x question matrix (one column per entry of the vocabulary's
+``value_questions``) flattened to one ``array('d')``, with NaN marking
+unanswered questions.
+
+Measured with ``tracemalloc`` over 20,000 synthetic orgs ranking 8 issues
+(300-issue taxonomy), with 3 actions and both value questions answered for 6
+issues, an ``OrgProfile`` takes about 0.7 KB against about 2.9 KB for the
+``{'rankings', 'actions', 'values'}`` dicts parsed from JSON that it is built
+from.
+"""
+from array import array
+from bisect import bisect_left
+from math import isnan
+
+from .actions import action_mask, mask_action_ids
+from .taxonomy import NO_CATEGORY
+from .vocabulary import VALUE_QUESTIONS, Vocabulary
+
+
+def _flat_values(issues, values: dict, questions=VALUE_QUESTIONS) -> array:
+    """Value answers of ``issues`` as one flat array, ``len(questions)`` per issue"""
+    flat_values = array('d')
+    for issue in issues:
+        issue_values = values.get(issue, {})
+        for q in questions:
+            value = issue_values.get(q)
+            flat_values.append(float('nan') if value is None else value)
+    return flat_values
+
+
+class UserProfile:
+    """
+    Compiled form of one user's rankings, actions and value answers
+
+    Besides the original inputs, the profile keeps, for every category the user
+    ranked an issue in, a sorted list of those ranks. The closest same-category
+    rank to a scaled org rank is then a bisect lookup instead of a scan over all
+    of the user's issues.
+
+    The id-based fields (``issue_ids``, ``ranks``, ``flat_values``,
+    ``action_ids``, ``action_mask``) are what ``OrgProfile`` scoring reads. They are resolved
+    against the vocabulary without interning, so building a user profile never
+    writes to the shared vocabulary: issues and actions it has not seen get
+    negative ids that match no org, which is how the dict scorer treats them
+    too. A user profile built before an org introduced a new issue keeps
+    treating that issue as unknown until it is rebuilt.
+
+    Parameters:
+    -----------
+    user_rankings : dict
+        Dictionary of user's issue rankings
+    issue_categories : dict, CategoryIndex or Vocabulary
+        Dictionary mapping issues to their categories. Pass the Vocabulary the
+        OrgProfiles were built with to score against them.
+    user_actions : list
+        List of user's preferred actions
+    user_values : dict
+        Dictionary of user's value responses, format:
+        {issue: {'q1': score, 'q2': score}} (questions as in the vocabulary)
+    """
+    __slots__ = (
+        'vocabulary',
+        'category_index',
+        'rankings',
+        'max_rank',
+        'actions',
+        'values',
+        'issue_ids',
+        'ranks',
+        'flat_values',
+        'action_ids',
+        'action_mask',
+        '_positions',
+        '_category_ranks',
+    )
+
+    def __init__(
+        self,
+        user_rankings: dict,
+        issue_categories,
+        user_actions: list = (),
+        user_values: dict = None,
+    ):
+        if not user_rankings:
+            raise ValueError("user_rankings must contain at least one ranked issue")
+
+        self.vocabulary = vocabulary = Vocabulary.coerce(issue_categories)
+        self.category_index = vocabulary.category_index
+        self.rankings = dict(user_rankings)
+        self.max_rank = len(user_rankings)
+        self.actions = frozenset(user_actions)
+        self.values = dict(user_values or {})
+
+        self.issue_ids = array('i', vocabulary.resolve_issues(self.rankings))
+        self.ranks = array('d', self.rankings.values())
+        self.flat_values = _flat_values(self.rankings, self.values, vocabulary.value_questions)
+        self.action_ids = frozenset(vocabulary.resolve_actions(self.actions))
+        self.action_mask = action_mask(self.action_ids)
+        self._positions = {issue_id: position for position, issue_id in enumerate(self.issue_ids)}
+
+        category_ranks = {}
+        for issue_id, user_rank in zip(self.issue_ids, self.rankings.values()):
+            category_id = vocabulary.issue_category_id(issue_id)
+            if category_id != NO_CATEGORY:
+                category_ranks.setdefault(category_id, []).append(user_rank)
+        for ranks in category_ranks.values():
+            ranks.sort()
+        self._category_ranks = category_ranks
+
+    @property
+    def category_ranks(self) -> dict:
+        """``{category_id: sorted ranks}`` for every category the user ranked an issue in"""
+        return self._category_ranks
+
+    def position(self, issue_id: int):
+        """Index of an issue id in ``issue_ids`` / ``ranks``, or None if the user did not rank it"""
+        return self._positions.get(issue_id)
+
+    def best_category_distance(self, category_id: int, scaled_org_rank: float):
+        """
+        Smallest ``abs(user_rank - scaled_org_rank)`` over the user's issues in
+        the category, or ``max_rank`` when that is smaller or the user has no
+        issue in the category (same result as the linear scan it replaces).
+        """
+        ranks = self._category_ranks.get(category_id)
+        if not ranks:
+            return self.max_rank
+
+        best_category_distance = self.max_rank
+        position = bisect_left(ranks, scaled_org_rank)
+        # Only the ranks either side of the insertion point can be the closest one
+        if position < len(ranks):
+            best_category_distance = min(best_category_distance, abs(ranks[position] - scaled_org_rank))
+        if position > 0:
+            best_category_distance = min(best_category_distance, abs(ranks[position - 1] - scaled_org_rank))
+        return best_category_distance
+
+
+class OrgProfile:
+    """
+    Compiled form of one organization's rankings, actions and value answers
+
+    Everything is kept in ``array`` buffers indexed by ranking position, in the
+    order of the original ``org_rankings`` dict, so per-org sums add up in the
+    same order as in ``calculate_total_score``. Actions are one bitmask over
+    vocabulary action ids.
+
+    Parameters:
+    -----------
+    org_rankings : dict
+        Dictionary of organization's issue rankings
+    vocabulary : Vocabulary
+        Vocabulary shared with the UserProfiles this org is scored against;
+        the org's issues and actions are interned into it
+    org_actions : list
+        List of organization's actions
+    org_values : dict
+        Dictionary of organization's value responses
+    """
+    __slots__ = (
+        'vocabulary',
+        'issue_ids',
+        'ranks',
+        'category_ids',
+        'flat_values',
+        'action_mask',
+    )
+
+    def __init__(
+        self,
+        org_rankings: dict,
+        vocabulary: Vocabulary,
+        org_actions: list = (),
+        org_values: dict = None,
+    ):
+        if not org_rankings:
+            raise ValueError("org_rankings must contain at least one ranked issue")
+
+        self.vocabulary = vocabulary
+        self.issue_ids = array('i', map(vocabulary.intern_issue, org_rankings))
+        self.ranks = array('d', org_rankings.values())
+        self.category_ids = array('i', map(vocabulary.issue_category_id, self.issue_ids))
+        self.flat_values = _flat_values(org_rankings, org_values or {}, vocabulary.value_questions)
+        self.action_mask = action_mask(map(vocabulary.intern_action, org_actions))
+
+    @classmethod
+    def from_dict(cls, org: dict, vocabulary: Vocabulary) -> 'OrgProfile':
+        """Build from one ``{'rankings', 'actions', 'values'}`` catalog entry"""
+        return cls(org['rankings'], vocabulary, org.get('actions', ()), org.get('values'))
+
+    def __len__(self):
+        return len(self.issue_ids)
+
+    def __repr__(self):
+        return f"OrgProfile({len(self.issue_ids)} issues, {self.action_mask.bit_count()} actions)"
+
+    @property
+    def action_ids(self) -> tuple:
+        """Ids of the org's actions, in increasing order"""
+        return mask_action_ids(self.action_mask)
+
+    def to_dict(self) -> dict:
+        """
+        The ``{'rankings', 'actions', 'values'}`` catalog entry this profile was
+        built from (ranks come back as floats)
+        """
+        vocabulary = self.vocabulary
+        issues = [vocabulary.issue(issue_id) for issue_id in self.issue_ids]
+        questions = vocabulary.value_questions
+        num_questions = len(questions)
+        values = {}
+        for position, issue in enumerate(issues):
+            issue_values = {
+                q: self.flat_values[position * num_questions + q_index]
+                for q_index, q in enumerate(questions)
+                if not isnan(self.flat_values[position * num_questions + q_index])
+            }
+            if issue_values:
+                values[issue] = issue_values
+        return {
+            'rankings': dict(zip(issues, self.ranks)),
+            'actions': [vocabulary.action(action_id) for action_id in self.action_ids],
+            'values': values,
+        }
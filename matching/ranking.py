@@ -0,0 +1,156 @@
+"""
+Top-K organization matching with bound-based pruning.
+
+Lower total scores are better matches. The action and value components are
+cheap to compute exactly, and the issue component has a floor that only needs
+to know which org issues the user ranked (or shares a category with), so an
+org whose floor already cannot beat the current k-th best is never fully
+scored.
+"""
+import heapq
+
+from . import instrumentation
+from .actions import mask_action_component
+from .profiles import OrgProfile
+from .scoring import (
+    DEFAULT_WEIGHTS,
+    action_component,
+    check_vocabulary,
+    combine_components,
+    issue_component,
+    score_pair,
+    value_component,
+)
+from .taxonomy import NO_CATEGORY
+
+
+def issue_lower_bound(user, org_rankings, weights: dict = DEFAULT_WEIGHTS) -> float:
+    """
+    Floor of ``issue_component(user, org_rankings, weights)``
+
+    An org issue the user did not rank always has exact distance user_max_rank,
+    and one in a category the user ranked nothing in always has category
+    distance user_max_rank; every other distance is taken as 0. Each term is
+    no larger than the real one and they are added in the same order, so the
+    floor holds for the floats as well, not just on paper.
+    """
+    user_category_ranks = user.category_ranks
+    user_max_rank = user.max_rank
+    exact_match_weight = weights['exact_match']
+    category_match_weight = weights['category_match']
+
+    if isinstance(org_rankings, OrgProfile):
+        user_ranked = [user.position(issue_id) is not None for issue_id in org_rankings.issue_ids]
+        category_ids = org_rankings.category_ids
+    else:
+        user_ranked = [org_issue in user.rankings for org_issue in org_rankings]
+        category_ids = map(user.category_index.category_id, org_rankings)
+
+    total_distance = 0
+    for ranked_by_user, category_id in zip(user_ranked, category_ids):
+        exact_distance = 0 if ranked_by_user else user_max_rank
+        if category_id != NO_CATEGORY and category_id in user_category_ranks:
+            category_distance = 0
+        else:
+            category_distance = user_max_rank
+        total_distance += (exact_distance * exact_match_weight +
+                           category_distance * category_match_weight)
+
+    return total_distance / user_max_rank
+
+
+def top_k_matches(user, catalog: dict, k: int = 20, weights: dict = DEFAULT_WEIGHTS) -> dict:
+    """
+    Find the k best (lowest total_score) organizations for a user
+
+    Gives the same orgs, scores and order as scoring every org with
+    ``calculate_total_score`` and stable-sorting by total_score (ties keep
+    catalog order). The weights must be non-negative for the bound to hold.
+
+    Parameters:
+    -----------
+    user : UserProfile
+        Compiled user profile
+    catalog : dict
+        Dictionary of organizations, format:
+        {org_id: {'rankings': dict, 'actions': list, 'values': dict}}
+        'actions' and 'values' are optional. Entries can also be OrgProfiles
+        built with the user's Vocabulary.
+    k : int, optional
+        Number of matches to return
+    weights : dict, optional
+        Dictionary of weights for different score components, as for ``score_pair``
+
+    Returns:
+    --------
+    dict
+        'matches': list of (org_id, scores) pairs, best first, where scores is
+        the ``score_pair`` result dict
+        'pruned': number of orgs whose issue component was never computed
+    """
+    if k <= 0:
+        return {'matches': [], 'pruned': len(catalog)}
+
+    profiler = instrumentation.active
+    # Cheap pass: exact action / value components and the issue floor for every org
+    candidates = []
+    for position, (org_id, org) in enumerate(catalog.items()):
+        if isinstance(org, OrgProfile):
+            check_vocabulary(user, org)
+            org_rankings = org
+            action_distance = mask_action_component(user.action_mask, len(user.action_ids), org.action_mask)
+            value_distance = value_component(user, org, None)
+        else:
+            org_rankings = org['rankings']
+            action_distance = action_component(user.actions, org.get('actions', ()))
+            value_distance = value_component(user, org_rankings, org.get('values') or {})
+        bound = combine_components(
+            issue_lower_bound(user, org_rankings, weights),
+            action_distance,
+            value_distance,
+            weights,
+        )['total_score']
+        candidates.append((bound, position, org_id, org, org_rankings, action_distance, value_distance))
+    # Most promising orgs first, so the k-th best score tightens quickly
+    candidates.sort(key=lambda candidate: (candidate[0], candidate[1]))
+
+    # Max-heap (by total_score, then catalog position) of the best k seen so far
+    best = []
+    pruned = 0
+    for index, candidate in enumerate(candidates):
+        bound, position, org_id, org, org_rankings, action_distance, value_distance = candidate
+        if len(best) == k:
+            worst_total, worst_position = -best[0][0], -best[0][1]
+            if bound > worst_total:
+                # Candidates are sorted by bound, so none of the rest can get in either
+                pruned += len(candidates) - index
+                break
+            if (bound, position) >= (worst_total, worst_position):
+                pruned += 1
+                continue
+
+        if profiler is None:
+            scores = combine_components(
+                issue_component(user, org_rankings, weights),
+                action_distance,
+                value_distance,
+                weights,
+            )
+        elif org is org_rankings:
+            # score_pair times the phases and counts the pair; the scores are the same
+            scores = score_pair(user, org, weights=weights)
+        else:
+            scores = score_pair(user, org_rankings, org.get('actions', ()), org.get('values'), weights)
+        entry = (-scores['total_score'], -position, org_id, scores)
+        if len(best) < k:
+            heapq.heappush(best, entry)
+        elif entry > best[0]:
+            heapq.heapreplace(best, entry)
+
+    if profiler is not None:
+        profiler.count(topk_pruned=pruned)
+    matches = sorted(best, key=lambda entry: (-entry[0], -entry[1]))
+    return {
+        'matches': [(org_id, scores) for _, _, org_id, scores in matches],
+        'pruned': pruned,
+    }
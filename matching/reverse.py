@@ -0,0 +1,279 @@
+"""
+Reverse matching: the best-aligned users for an organization.
+
+The score is asymmetric (divided by the user's ``max_rank``, the action term
+scaled by the user's action count), so ranking users for an org means
+scoring the org against every user with the user-side definition.
+``UserStore`` keeps all users in columnar NumPy arrays grouped by how many
+issues they ranked: within a group every user has the same ``max_rank`` and
+the same scale factor for a given org, so each org issue is one vector
+operation over the group.
+
+As in ``overlap``, a user sharing no issue and no category with the org has
+exact and category distance ``max_rank`` on every org issue and the
+missing-value penalty, so only the users that do overlap go through the
+per-issue work; the rest of the group gets its issue total in closed form.
+
+``top_k_users`` returns the same scores as ``score_pair(user, org)`` for every
+user, best first, ties in store order.
+"""
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+
+from .actions import num_words, pack_mask, pack_masks, popcount
+from .catalog import _require_numpy, round_scores
+from .profiles import OrgProfile, UserProfile
+from .scoring import DEFAULT_WEIGHTS
+from .taxonomy import NO_CATEGORY
+from .values import MISSING_VALUE_PENALTY
+
+
+class _UserGroup:
+    """Columns of the users that ranked ``max_rank`` issues"""
+    __slots__ = ('max_rank', 'positions', 'issue_ids', 'category_ids', 'ranks', 'values',
+                 'action_words', 'num_actions')
+
+    def __init__(self, max_rank: int, positions: list, profiles: list):
+        vocabulary = profiles[0].vocabulary
+        shape = (len(profiles), max_rank)
+        self.max_rank = max_rank
+        self.positions = np.asarray(positions, dtype=np.int64)
+        self.issue_ids = np.frombuffer(b''.join(profile.issue_ids.tobytes() for profile in profiles),
+                                       dtype=np.intc).reshape(shape)
+        # Sliced first: a copy, so interning elsewhere never meets an exported buffer
+        issue_category_ids = np.array(vocabulary.issue_category_ids[:], dtype=np.intc)
+        self.category_ids = issue_category_ids[self.issue_ids]
+        # Unknown (negative) issue ids have no category
+        self.category_ids[self.issue_ids < 0] = NO_CATEGORY
+        self.ranks = np.frombuffer(b''.join(profile.ranks.tobytes() for profile in profiles)).reshape(shape)
+        self.values = np.frombuffer(b''.join(profile.flat_values.tobytes() for profile in profiles)
+                                    ).reshape(shape + (vocabulary.num_questions,))
+        self.action_words = pack_masks((profile.action_mask for profile in profiles), vocabulary.num_actions)
+        self.num_actions = np.array([len(profile.action_ids) for profile in profiles], dtype=np.int64)
+
+    def __len__(self):
+        return len(self.positions)
+
+
+class UserStore:
+    """
+    Columnar store of user profiles for org -> users queries
+
+    Parameters:
+    -----------
+    users : dict
+        {user_id: {'rankings': dict, 'actions': list, 'values': dict}} or
+        {user_id: UserProfile}; every user must rank at least one issue
+    vocabulary : Vocabulary
+        Vocabulary the orgs are (or will be) compiled with
+    """
+
+    def __init__(self, users: dict, vocabulary):
+        _require_numpy()
+        self.vocabulary = vocabulary
+        self.user_ids = []
+        profiles_by_rank = {}
+        positions_by_rank = {}
+        for position, (user_id, user) in enumerate(users.items()):
+            if not isinstance(user, UserProfile):
+                user = UserProfile(user['rankings'], vocabulary, user.get('actions', ()), user.get('values'))
+            elif user.vocabulary is not vocabulary:
+                raise ValueError("UserProfile was built with a different vocabulary")
+            if not user.max_rank:
+                raise ValueError(f"user {user_id!r} must rank at least one issue")
+            self.user_ids.append(user_id)
+            profiles_by_rank.setdefault(user.max_rank, []).append(user)
+            positions_by_rank.setdefault(user.max_rank, []).append(position)
+
+        # User masks only have bits for actions known when they were built
+        self._words = num_words(vocabulary.num_actions)
+        self._groups = [
+            _UserGroup(max_rank, positions_by_rank[max_rank], profiles)
+            for max_rank, profiles in sorted(profiles_by_rank.items())
+        ]
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def __repr__(self):
+        return f"UserStore({len(self.user_ids)} users in {len(self._groups)} rank-length groups)"
+
+    @property
+    def group_sizes(self) -> dict:
+        """``{max_rank: number of users}``"""
+        return {group.max_rank: len(group) for group in self._groups}
+
+    def top_k_users(self, org, k: int = 20, weights: dict = DEFAULT_WEIGHTS) -> dict:
+        """
+        Find the k best (lowest total_score) users for an org
+
+        Parameters:
+        -----------
+        org : OrgProfile or dict
+            The org, compiled with the store's vocabulary or as a
+            {'rankings', 'actions', 'values'} dict
+        k : int, optional
+            Number of matches to return
+        weights : dict, optional
+            Dictionary of weights for different score components, as for ``score_pair``
+
+        Returns:
+        --------
+        dict
+            'matches': list of (user_id, scores) pairs, best first, where
+            scores is the ``score_pair(user, org)`` result dict
+            'fast_path': number of users scored in closed form (no shared issue or category)
+        """
+        if not isinstance(org, OrgProfile):
+            org = OrgProfile.from_dict(org, self.vocabulary)
+        elif org.vocabulary is not self.vocabulary:
+            raise ValueError("OrgProfile was built with a different vocabulary than the store")
+
+        positions, components, totals = [], [], []
+        fast_path = 0
+        for group in self._groups:
+            final_scores, group_fast_path = self._score_group(group, org, weights)
+            positions.append(group.positions)
+            components.append(final_scores)
+            totals.append(round_scores(final_scores[0] + final_scores[1] + final_scores[2]))
+            fast_path += group_fast_path
+        if not positions or k <= 0:
+            return {'matches': [], 'fast_path': fast_path}
+
+        positions = np.concatenate(positions)
+        totals = np.concatenate(totals)
+        final_issue_score, final_action_score, final_value_score = (
+            np.concatenate([scores[index] for scores in components]) for index in range(3))
+        # Everything tied with the k-th best total is a candidate; ties go by store position
+        if k < len(totals):
+            candidates = np.flatnonzero(totals <= np.partition(totals, k - 1)[k - 1])
+        else:
+            candidates = np.arange(len(totals))
+        best = candidates[np.lexsort((positions[candidates], totals[candidates]))][:k]
+
+        return {
+            'matches': [
+                (self.user_ids[positions[row]], {
+                    'issue_score': round(float(final_issue_score[row]), 2),
+                    'action_score': round(float(final_action_score[row]), 2),
+                    'value_score': round(float(final_value_score[row]), 2),
+                    'total_score': float(totals[row]),
+                })
+                for row in best
+            ],
+            'fast_path': fast_path,
+        }
+
+    def _score_group(self, group: _UserGroup, org: OrgProfile, weights: dict) -> tuple:
+        """Unrounded (issue, action, value) weighted score arrays of one group, and its fast-path count"""
+        user_max_rank = group.max_rank
+        exact_match_weight = weights['exact_match']
+        category_match_weight = weights['category_match']
+        org_issue_ids = np.frombuffer(org.issue_ids, dtype=np.intc)
+        org_category_ids = np.frombuffer(org.category_ids, dtype=np.intc)
+        # Same products as org_rank * scale_factor in the per-pair loop
+        scaled_org_ranks = np.frombuffer(org.ranks) * (user_max_rank / len(org))
+
+        # Users sharing an issue or a category with the org
+        overlapping = (np.isin(group.issue_ids, org_issue_ids) |
+                       np.isin(group.category_ids, org_category_ids[org_category_ids != NO_CATEGORY]))
+        rows = np.flatnonzero(overlapping.any(axis=1))
+
+        # Everyone else: max_rank on both distances for every org issue, added one by one
+        issue_term = user_max_rank * exact_match_weight + user_max_rank * category_match_weight
+        closed_total = 0
+        for _ in range(len(org)):
+            closed_total += issue_term
+        issue_distance = np.full(len(group), closed_total / user_max_rank)
+        value_distance = np.full(len(group), float(MISSING_VALUE_PENALTY))
+
+        if len(rows):
+            issue_distance[rows], value_distance[rows] = self._overlapping_components(
+                group, rows, org, org_issue_ids, org_category_ids, scaled_org_ranks,
+                exact_match_weight, category_match_weight)
+
+        # Same float operations as mask_action_component, one user per row
+        org_count = org.action_mask.bit_count()
+        action_intersection = popcount(group.action_words & pack_mask(org.action_mask, self._words))
+        num_user_actions = group.num_actions
+        has_actions = (num_user_actions > 0) & (org_count > 0)
+        action_similarity = np.divide(action_intersection, num_user_actions + org_count - action_intersection,
+                                      out=np.zeros(len(group)), where=has_actions)
+        action_distance = np.where(has_actions, (1 - action_similarity) * num_user_actions,
+                                   num_user_actions.astype(np.float64))
+
+        final_scores = (
+            issue_distance * weights['issue_weight'],
+            action_distance * weights['action_weight'],
+            value_distance * weights.get('value_weight', 0),
+        )
+        return final_scores, len(group) - len(rows)
+
+    def _overlapping_components(self, group, rows, org, org_issue_ids, org_category_ids, scaled_org_ranks,
+                                exact_match_weight, category_match_weight) -> tuple:
+        """Unweighted issue and value distances of the given rows"""
+        user_max_rank = group.max_rank
+        issue_ids = group.issue_ids[rows]
+        category_ids = group.category_ids[rows]
+        ranks = group.ranks[rows]
+        num_rows, num_org_issues = len(rows), len(org)
+
+        # Org position of every user issue (-1 where the org did not rank it);
+        # a user ranks an issue at most once, so each (row, org position) is hit once
+        org_position_of = np.full(self.vocabulary.num_issues, -1, dtype=np.intp)
+        org_position_of[org_issue_ids] = np.arange(num_org_issues)
+        user_org_positions = np.where(issue_ids >= 0, org_position_of[issue_ids], -1)
+        shared_rows, shared_columns = np.nonzero(user_org_positions >= 0)
+        shared_positions = user_org_positions[shared_rows, shared_columns]
+
+        exact_distance = np.full((num_rows, num_org_issues), float(user_max_rank))
+        exact_distance[shared_rows, shared_positions] = np.abs(
+            ranks[shared_rows, shared_columns] - scaled_org_ranks[shared_positions])
+
+        # Closest same-category user rank, one org category at a time and only
+        # over the rows with an issue in it (min over all of them is the bisect result)
+        category_distance = np.full((num_rows, num_org_issues), float(user_max_rank))
+        for category_id in np.unique(org_category_ids[org_category_ids != NO_CATEGORY]):
+            org_positions = np.flatnonzero(org_category_ids == category_id)
+            in_category = category_ids == category_id
+            category_rows = np.flatnonzero(in_category.any(axis=1))
+            if not len(category_rows):
+                continue
+            distances = np.abs(ranks[category_rows, :, None] - scaled_org_ranks[org_positions])
+            distances[~in_category[category_rows]] = np.inf
+            category_distance[np.ix_(category_rows, org_positions)] = np.minimum(
+                distances.min(axis=1), user_max_rank)
+
+        weighted_distance = (exact_distance * exact_match_weight +
+                             category_distance * category_match_weight)
+        # Added org issue by org issue, as in the per-pair loop
+        total_distance = np.zeros(num_rows)
+        for column in weighted_distance.T:
+            total_distance += column
+
+        # Value questions of the shared issues, in org order then question order
+        org_values = np.frombuffer(org.flat_values).reshape(num_org_issues, -1)
+        shared_values = group.values[rows[shared_rows], shared_columns]
+        by_position = np.argsort(shared_positions, kind='stable')
+        boundaries = np.searchsorted(shared_positions[by_position], np.arange(num_org_issues + 1))
+        total_value_distance = np.zeros(num_rows)
+        num_value_questions = np.zeros(num_rows, dtype=np.int64)
+        for org_position in range(num_org_issues):
+            entries = by_position[boundaries[org_position]:boundaries[org_position + 1]]
+            if not len(entries):
+                continue
+            entry_rows = shared_rows[entries]
+            for q_index, org_value in enumerate(org_values[org_position]):
+                if org_value != org_value:
+                    continue
+                user_value = shared_values[entries, q_index]
+                answered = user_value == user_value
+                total_value_distance[entry_rows[answered]] += np.abs(user_value[answered] - org_value)
+                num_value_questions[entry_rows[answered]] += 1
+
+        value_distance = np.divide(total_value_distance, num_value_questions,
+                                   out=np.full(num_rows, float(MISSING_VALUE_PENALTY)),
+                                   where=num_value_questions > 0)
+        return total_distance / user_max_rank, value_distance
@@ -0,0 +1,417 @@
+"""
+Per-pair scoring on compiled profiles.
+
+``score_pair`` returns exactly what ``calculate_total_score`` in
+``20250108 version_issue_value_action_algorithm.py`` returns for the same
+inputs, but reads the user side from a precompiled ``UserProfile``. The org
+side is either the original dicts or an ``OrgProfile``, which is scored on
+integer ids only, with the issue and value components accumulated in one
+pass over the org's issues (``fused_components``).
+"""
+from itertools import count
+from time import perf_counter
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+
+from . import instrumentation
+from .actions import mask_action_component
+from .profiles import OrgProfile
+from .taxonomy import NO_CATEGORY
+from .values import MISSING_VALUE_PENALTY, pair_value_component
+
+
+DEFAULT_WEIGHTS = {
+    'exact_match': 0.7,
+    'category_match': 0.3,
+    'issue_weight': 0.6,
+    'action_weight': 0.2,
+    'value_weight': 0.2,
+}
+
+# From this many value questions per issue on, OrgProfile pairs compute the
+# value component on NumPy answer matrices instead of a scalar loop (below it
+# the per-call NumPy overhead outweighs the loop for typical ~10-issue rankings)
+VECTORIZED_VALUE_QUESTIONS = 48
+
+
+def score_pair(
+    user,
+    org_rankings: dict,
+    org_actions: list = (),
+    org_values: dict = None,
+    weights: dict = DEFAULT_WEIGHTS,
+) -> dict:
+    """
+    Calculate combined issue, action, and value scores between a compiled user
+    profile and an organization
+
+    Parameters:
+    -----------
+    user : UserProfile
+        Compiled user profile
+    org_rankings : dict or OrgProfile
+        Dictionary of organization's issue rankings, or the compiled org
+        (built with the user's Vocabulary), in which case org_actions and
+        org_values are ignored
+    org_actions : list
+        List of organization's actions
+    org_values : dict
+        Dictionary of organization's value responses
+    weights : dict, optional
+        Dictionary of weights for different score components. Without a
+        'value_weight' entry the value component is left out (scored as 0),
+        as in the issue/action-only scorer.
+
+    Returns:
+    --------
+    dict
+        Dictionary containing issue_score, action_score, value_score, and total_score
+    """
+    if instrumentation.active is not None:
+        return _profiled_score_pair(instrumentation.active, user, org_rankings, org_actions,
+                                    org_values, weights)
+    if isinstance(org_rankings, OrgProfile):
+        check_vocabulary(user, org_rankings)
+        # Issue and value components in one pass over the org's issues
+        issue_distance, value_distance = fused_components(user, org_rankings, weights)
+        return combine_components(
+            issue_distance,
+            mask_action_component(user.action_mask, len(user.action_ids), org_rankings.action_mask),
+            value_distance,
+            weights,
+        )
+
+    return combine_components(
+        issue_component(user, org_rankings, weights),
+        action_component(user.actions, org_actions),
+        value_component(user, org_rankings, org_values or {}),
+        weights,
+    )
+
+
+def _profiled_score_pair(profiler, user, org_rankings, org_actions, org_values, weights) -> dict:
+    """``score_pair`` with its phases timed and counted into ``profiler``"""
+    start = perf_counter()
+    if isinstance(org_rankings, OrgProfile):
+        check_vocabulary(user, org_rankings)
+    issue_distance = issue_component(user, org_rankings, weights)
+    issues_done = perf_counter()
+    if isinstance(org_rankings, OrgProfile):
+        action_distance = mask_action_component(user.action_mask, len(user.action_ids),
+                                                org_rankings.action_mask)
+    else:
+        action_distance = action_component(user.actions, org_actions)
+    actions_done = perf_counter()
+    value_distance = value_component(user, org_rankings, org_values or {})
+    values_done = perf_counter()
+    scores = combine_components(issue_distance, action_distance, value_distance, weights)
+    end = perf_counter()
+
+    profiler.record(
+        {
+            'issues': issues_done - start,
+            'actions': actions_done - issues_done,
+            'values': values_done - actions_done,
+            'rounding': end - values_done,
+        },
+        pair_counts(user, org_rankings, org_values or {}),
+    )
+    return scores
+
+
+def pair_counts(user, org_rankings, org_values: dict = None) -> dict:
+    """
+    Hot-path counters (see ``instrumentation.COUNTERS``) of scoring one pair,
+    worked out without scoring it
+    """
+    if isinstance(org_rankings, OrgProfile):
+        category_ids = org_rankings.category_ids
+        # Positions of the shared issues on the (org, user) side
+        shared = [(org_position, user.position(issue_id))
+                  for org_position, issue_id in enumerate(org_rankings.issue_ids)]
+        shared = [(org_position, user_position) for org_position, user_position in shared
+                  if user_position is not None]
+        num_questions = user.vocabulary.num_questions
+        answers = [
+            zip(org_rankings.flat_values[org_position * num_questions:(org_position + 1) * num_questions],
+                user.flat_values[user_position * num_questions:(user_position + 1) * num_questions])
+            for org_position, user_position in shared
+        ]
+    else:
+        category_ids = [user.category_index.category_id(org_issue) for org_issue in org_rankings]
+        shared = [org_issue for org_issue in org_rankings if org_issue in user.rankings]
+        answers = [
+            [((org_values or {}).get(org_issue, {}).get(q), user.values.get(org_issue, {}).get(q))
+             for q in user.vocabulary.value_questions]
+            for org_issue in shared
+        ]
+
+    user_category_ranks = user.category_ranks
+    uncategorized = category_hits = issue_comparisons = 0
+    for category_id in category_ids:
+        if category_id == NO_CATEGORY:
+            uncategorized += 1
+        elif category_id in user_category_ranks:
+            category_hits += 1
+            issue_comparisons += len(user_category_ranks[category_id])
+
+    # None or NaN marks an unanswered question; NaN != NaN
+    value_questions = sum(
+        1
+        for issue_answers in answers
+        for org_value, user_value in issue_answers
+        if org_value is not None and user_value is not None
+        and org_value == org_value and user_value == user_value
+    )
+    return {
+        'pairs': 1,
+        'issue_comparisons': issue_comparisons,
+        'exact_hits': len(shared),
+        'category_hits': category_hits,
+        'category_misses': len(org_rankings) - category_hits - uncategorized,
+        'uncategorized': uncategorized,
+        'value_questions': value_questions,
+        'value_penalties': 0 if value_questions else 1,
+    }
+
+
+def check_vocabulary(user, org):
+    """Make sure a user and an OrgProfile share issue / action ids"""
+    if user.vocabulary is not org.vocabulary:
+        raise ValueError("UserProfile and OrgProfile were built with different vocabularies")
+
+
+def combine_components(issue_distance: float, action_distance: float, value_distance: float,
+                       weights: dict = DEFAULT_WEIGHTS) -> dict:
+    """Weight and round the unweighted components into the ``score_pair`` result dict"""
+    final_issue_score = issue_distance * weights['issue_weight']
+    final_action_score = action_distance * weights['action_weight']
+    final_value_score = value_distance * weights.get('value_weight', 0)
+
+    return {
+        'issue_score': round(final_issue_score, 2),
+        'action_score': round(final_action_score, 2),
+        'value_score': round(final_value_score, 2),
+        'total_score': round(final_issue_score + final_action_score + final_value_score, 2)
+    }
+
+##_______________________________________________________________
+# Unweighted components
+
+def issue_component(user, org_rankings, weights: dict) -> float:
+    """Summed exact/category distance over the org's issues, divided by user_max_rank"""
+    if isinstance(org_rankings, OrgProfile):
+        return fused_components(user, org_rankings, weights, values=False)[0]
+
+    category_index = user.category_index
+    user_rankings = user.rankings
+    user_max_rank = user.max_rank
+    scale_factor = user_max_rank / len(org_rankings)
+    exact_match_weight = weights['exact_match']
+    category_match_weight = weights['category_match']
+
+    total_distance = 0
+    for org_issue, org_rank in org_rankings.items():
+        scaled_org_rank = org_rank * scale_factor
+
+        if org_issue in user_rankings:
+            exact_distance = abs(user_rankings[org_issue] - scaled_org_rank)
+        else:
+            exact_distance = user_max_rank
+
+        category_id = category_index.category_id(org_issue)
+        if category_id != NO_CATEGORY:
+            category_distance = user.best_category_distance(category_id, scaled_org_rank)
+        else:
+            category_distance = user_max_rank
+
+        total_distance += (exact_distance * exact_match_weight +
+                           category_distance * category_match_weight)
+
+    return total_distance / user_max_rank
+
+
+def action_component(user_set, org_actions) -> float:
+    """Action dissimilarity ``(1 - jaccard) * len(user_set)``"""
+    org_set = set(org_actions)
+    if user_set and org_set:
+        action_similarity = len(user_set & org_set) / len(user_set | org_set)
+        return (1 - action_similarity) * len(user_set)
+    return len(user_set)
+
+
+def value_component(user, org_rankings, org_values: dict) -> float:
+    """Mean absolute value-question difference over shared issues, or the penalty"""
+    if isinstance(org_rankings, OrgProfile):
+        return _compiled_value_component(user, org_rankings)
+
+    user_rankings = user.rankings
+    user_values = user.values
+    value_questions = user.vocabulary.value_questions
+    total_value_distance = 0
+    num_value_questions = 0
+
+    for org_issue in org_rankings:
+        if org_issue in user_rankings:
+            org_issue_values = org_values.get(org_issue, {})
+            user_issue_values = user_values.get(org_issue, {})
+            for q in value_questions:
+                org_value = org_issue_values.get(q)
+                user_value = user_issue_values.get(q)
+                if org_value is not None and user_value is not None:
+                    total_value_distance += abs(user_value - org_value)
+                    num_value_questions += 1
+
+    return _mean_value_distance(total_value_distance, num_value_questions)
+
+##_______________________________________________________________
+# Same components on OrgProfile ids
+
+def _issue_distances(user, position, scaled_org_rank: float, category_id: int) -> tuple:
+    """
+    Unweighted ``(exact_distance, category_distance)`` of one org issue, from
+    the user's position of it (None when the user did not rank it)
+    """
+    if position is not None:
+        exact_distance = abs(user.ranks[position] - scaled_org_rank)
+    else:
+        exact_distance = user.max_rank
+
+    if category_id != NO_CATEGORY:
+        category_distance = user.best_category_distance(category_id, scaled_org_rank)
+    else:
+        category_distance = user.max_rank
+
+    return exact_distance, category_distance
+
+
+def issue_distances(user, org, org_position: int) -> tuple:
+    """Unweighted ``(exact_distance, category_distance)`` of one OrgProfile issue"""
+    scaled_org_rank = org.ranks[org_position] * (user.max_rank / len(org))
+    return _issue_distances(user, user.position(org.issue_ids[org_position]), scaled_org_rank,
+                            org.category_ids[org_position])
+
+
+def issue_term(user, org, org_position: int, weights: dict) -> float:
+    """
+    Weighted exact + category distance of one OrgProfile issue, the term
+    ``issue_component`` adds up for it
+    """
+    exact_distance, category_distance = issue_distances(user, org, org_position)
+    return (exact_distance * weights['exact_match'] +
+            category_distance * weights['category_match'])
+
+
+def _add_issue_values(user, org, user_position: int, org_position: int,
+                      total_value_distance: float, num_value_questions: int) -> tuple:
+    """
+    Value totals after one issue both sides ranked, its mutually answered
+    questions added in question order
+    """
+    num_questions = user.vocabulary.num_questions
+    user_values = user.flat_values
+    org_values = org.flat_values
+    org_offset = org_position * num_questions
+    user_offset = user_position * num_questions
+    # NaN marks an unanswered question; NaN != NaN
+    for q_index in range(num_questions):
+        org_value = org_values[org_offset + q_index]
+        user_value = user_values[user_offset + q_index]
+        if org_value == org_value and user_value == user_value:
+            total_value_distance += abs(user_value - org_value)
+            num_value_questions += 1
+    return total_value_distance, num_value_questions
+
+
+def _mean_value_distance(total_value_distance: float, num_value_questions: int) -> float:
+    if num_value_questions > 0:
+        return total_value_distance / num_value_questions
+    return MISSING_VALUE_PENALTY
+
+
+def _vectorized_values(user) -> bool:
+    # Many questions per issue: difference the shared rows as matrices instead
+    return user.vocabulary.num_questions >= VECTORIZED_VALUE_QUESTIONS and np is not None
+
+
+def _compiled_value_component(user, org) -> float:
+    if _vectorized_values(user):
+        return pair_value_component(user, org)
+
+    position_of = user.position
+    total_value_distance = 0
+    num_value_questions = 0
+    for org_position, issue_id in enumerate(org.issue_ids):
+        user_position = position_of(issue_id)
+        if user_position is not None:
+            total_value_distance, num_value_questions = _add_issue_values(
+                user, org, user_position, org_position, total_value_distance, num_value_questions)
+    return _mean_value_distance(total_value_distance, num_value_questions)
+
+
+def fused_components(user, org, weights: dict = DEFAULT_WEIGHTS, scaled_org_ranks=None, visitors=(),
+                     values: bool = True) -> tuple:
+    """
+    Unweighted ``(issue_distance, value_distance)`` of a pair in one pass over
+    the org's issues
+
+    Parameters:
+    -----------
+    user : UserProfile
+        Compiled user profile
+    org : OrgProfile
+        Compiled org, built with the user's Vocabulary
+    weights : dict, optional
+        'exact_match' and 'category_match' weights, as for ``score_pair``
+    scaled_org_ranks : sequence, optional
+        The org's ranks already scaled to the user's max_rank (as from
+        ``batch``), instead of scaling them here
+    visitors : list, optional
+        ``[component, state]`` pairs whose state is advanced by
+        ``component.visit`` at every org issue
+    values : bool, optional
+        Also compute the value distance (None when False)
+
+    Returns:
+    --------
+    tuple
+        (issue_distance, value_distance), the same floats as
+        ``issue_component`` and ``value_component``
+    """
+    exact_match_weight = weights['exact_match']
+    category_match_weight = weights['category_match']
+    if scaled_org_ranks is None:
+        # Same products as org_rank * scale_factor
+        scaled_org_ranks = map((user.max_rank / len(org)).__mul__, org.ranks)
+    position_of = user.position
+    vectorized = values and _vectorized_values(user)
+    scalar_values = values and not vectorized
+
+    total_distance = 0
+    total_value_distance = 0
+    num_value_questions = 0
+    for org_position, issue_id, scaled_org_rank, category_id in zip(
+            count(), org.issue_ids, scaled_org_ranks, org.category_ids):
+        position = position_of(issue_id)
+        exact_distance, category_distance = _issue_distances(user, position, scaled_org_rank, category_id)
+        total_distance += (exact_distance * exact_match_weight +
+                           category_distance * category_match_weight)
+
+        if scalar_values and position is not None:
+            total_value_distance, num_value_questions = _add_issue_values(
+                user, org, position, org_position, total_value_distance, num_value_questions)
+
+        if visitors:
+            for visitor in visitors:
+                visitor[1] = visitor[0].visit(visitor[1], org_position, position, scaled_org_rank)
+
+    if vectorized:
+        mean_value_distance = pair_value_component(user, org)
+    elif values:
+        mean_value_distance = _mean_value_distance(total_value_distance, num_value_questions)
+    else:
+        mean_value_distance = None
+    return total_distance / user.max_rank, mean_value_distance
@@ -0,0 +1,489 @@
+"""
+Asyncio HTTP/JSON matching service with request micro-batching.
+
+Requests that arrive within ``window`` seconds of each other (up to
+``max_batch`` of them) are scored together in one executor job, so the event
+loop only hands work to the executor once per batch and keeps accepting
+connections while the batch is scored. Every request carries a deadline:
+requests whose deadline passes while they wait for a batch are dropped from
+it, and a request whose deadline passes while it is being scored is answered
+with 504 (the score is discarded).
+
+Endpoints:
+
+    POST /match    {"id": "u1", "rankings": {...}, "actions": [...], "values": {...},
+                    "top": 20, "timeout_ms": 500}
+                   -> {"id": "u1", "matches": [{"org": "o7", "total_score": ...}, ...]}
+                   ("id", "actions", "values", "top" and "timeout_ms" are optional)
+    GET  /stats    service counters as JSON
+    GET  /metrics  service counters (and the active MatchProfiler, if any) as Prometheus text
+    GET  /health   {"status": "ok"}
+
+Command line:
+
+    python -m matching.service --taxonomy categories.json --orgs orgs.jsonl \
+        [--host 127.0.0.1] [--port 8000] [--window-ms 2] [--max-batch 64]
+"""
+import argparse
+import asyncio
+import json
+import math
+import operator
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+
+from . import instrumentation
+from .batch import score_users, score_users_against_catalog
+from .catalog import OrgCatalog
+from .pipeline import load_catalog, read_jsonl
+from .profiles import UserProfile
+from .scoring import DEFAULT_WEIGHTS
+from .snapshots import CatalogStore
+from .vocabulary import VALUE_QUESTIONS, Vocabulary
+
+
+# Largest request body accepted, in bytes
+MAX_BODY_SIZE = 1 << 20
+
+REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    413: 'Payload Too Large',
+    500: 'Internal Server Error',
+    504: 'Gateway Timeout',
+}
+
+
+class DeadlineExceeded(Exception):
+    """A request's deadline passed before its scores were ready"""
+
+
+def make_batch_scorer(catalog: dict, vocabulary: Vocabulary, weights: dict = DEFAULT_WEIGHTS):
+    """
+    ``score_batch(requests) -> results`` over a compiled catalog
+
+    Each request is a dict in the pipeline's user format plus a 'top'; its
+    result is the list of ``{"org", ...scores}`` matches, or the exception
+    that request raised, so one bad request does not fail its batch.
+
+    A batch is scored in one pass over the catalog, its users grouped by
+    max_rank: ``score_users_against_catalog`` over an OrgCatalog of the
+    catalog (built once, and again after each org edit) when NumPy is
+    installed, ``score_users`` otherwise. Each request then keeps its own
+    'top' best orgs, in ``top_k_matches`` order.
+
+    ``catalog`` can also be a CatalogStore: each batch then scores against
+    the snapshot current when it starts, while org edits publish new ones.
+    """
+    compiled = [None, None]   # (snapshot, OrgCatalog of it)
+
+    def org_catalog(snapshot):
+        if compiled[0] is not snapshot:
+            compiled[:] = snapshot, OrgCatalog(snapshot, vocabulary)
+        return compiled[1]
+
+    def score_batch(requests: list) -> list:
+        snapshot = catalog.current if isinstance(catalog, CatalogStore) else catalog
+        results = [None] * len(requests)
+        indices, users, tops = [], [], []
+        for index, request in enumerate(requests):
+            try:
+                top = max(operator.index(request['top']), 0)
+                user = UserProfile(request['rankings'], vocabulary, request.get('actions', ()),
+                                   request.get('values'))
+            except (KeyError, TypeError, ValueError, AttributeError) as error:
+                results[index] = error
+                continue
+            indices.append(index)
+            users.append(user)
+            tops.append(top)
+        if not users:
+            return results
+
+        org_ids = list(snapshot)
+        if np is None:
+            batch_scores = score_users(users, snapshot.values(), weights)
+        else:
+            batch_scores = score_users_against_catalog(users, org_catalog(snapshot), weights)
+        for index, scores, top in zip(indices, batch_scores, tops):
+            results[index] = _top_matches(org_ids, scores, top)
+        return results
+    return score_batch
+
+
+def _top_matches(org_ids: list, scores, top: int) -> list:
+    """
+    The ``top`` best ``{"org", ...scores}`` matches of one user, ties in
+    catalog order; ``scores`` is a ``score_users`` row or a
+    ``score_user_against_catalog`` result
+    """
+    if isinstance(scores, list):
+        best = sorted(range(len(scores)), key=lambda column: scores[column]['total_score'])[:top]
+        return [{'org': org_ids[column], **scores[column]} for column in best]
+    best = np.argsort(scores['total_score'], kind='stable')[:top]
+    keys = list(scores)
+    return [{'org': org_ids[column], **{key: float(scores[key][column]) for key in keys}}
+            for column in best.tolist()]
+
+
+class MicroBatcher:
+    """
+    Coalesce concurrent ``submit`` calls into batches for ``score_batch``
+
+    Parameters:
+    -----------
+    score_batch : callable
+        ``score_batch(requests) -> results``, one result per request (an
+        exception instance is raised to that request's caller). Runs in
+        ``executor``.
+    window : float
+        Seconds to wait for more requests after the first one of a batch
+    max_batch : int
+        Largest batch; a full batch is scored without waiting out the window
+    executor : concurrent.futures.Executor, optional
+        Where batches are scored (default: one worker thread)
+    """
+
+    def __init__(self, score_batch, window: float = 0.002, max_batch: int = 64, executor=None):
+        if max_batch <= 0:
+            raise ValueError("max_batch must be positive")
+        self.score_batch = score_batch
+        self.window = window
+        self.max_batch = max_batch
+        self.executor = executor
+        self._own_executor = executor is None
+        self._queue = None
+        self._task = None
+        self.stats = dict.fromkeys(('requests', 'batches', 'batched_requests', 'expired_in_queue',
+                                    'deadline_exceeded'), 0)
+
+    async def start(self):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='match-batch')
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._own_executor and self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    async def submit(self, request, deadline: float):
+        """
+        Result of ``request``, scored in the next batch
+
+        ``deadline`` is in ``loop.time()`` seconds; DeadlineExceeded is raised
+        once it passes.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.stats['requests'] += 1
+        self._queue.put_nowait((request, future, deadline))
+        try:
+            # On timeout wait_for cancels the future, which takes it out of its batch
+            result = await asyncio.wait_for(future, max(deadline - loop.time(), 0))
+        except asyncio.TimeoutError:
+            self.stats['deadline_exceeded'] += 1
+            raise DeadlineExceeded() from None
+        if isinstance(result, BaseException):
+            raise result
+        return result
+
+    async def _next_batch(self) -> list:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        window_end = loop.time() + self.window
+        while len(batch) < self.max_batch:
+            remaining = window_end - loop.time()
+            if remaining <= 0:
+                # Still take whatever is already queued
+                if self._queue.empty():
+                    break
+                batch.append(self._queue.get_nowait())
+                continue
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            now = loop.time()
+            live = []
+            for request, future, deadline in batch:
+                if future.done():
+                    # Cancelled: the caller's deadline already passed
+                    self.stats['expired_in_queue'] += 1
+                elif deadline <= now:
+                    self.stats['expired_in_queue'] += 1
+                    future.cancel()
+                else:
+                    live.append((request, future))
+            if not live:
+                continue
+
+            self.stats['batches'] += 1
+            self.stats['batched_requests'] += len(live)
+            try:
+                results = await loop.run_in_executor(
+                    self.executor, self.score_batch, [request for request, _ in live])
+            except Exception as error:
+                results = [error] * len(live)
+            for (_, future), result in zip(live, results):
+                if not future.done():
+                    future.set_result(result)
+
+
+class MatchService:
+    """
+    HTTP front end of a MicroBatcher
+
+    Parameters:
+    -----------
+    batcher : MicroBatcher
+        Scores the requests
+    top : int, optional
+        Matches per request when the request does not say
+    timeout : float, optional
+        Seconds a request may take when it does not set 'timeout_ms'
+    """
+
+    def __init__(self, batcher: MicroBatcher, top: int = 20, timeout: float = 1.0):
+        self.batcher = batcher
+        self.top = top
+        self.timeout = timeout
+        self._server = None
+        self.stats = dict.fromkeys(('connections', 'bad_requests', 'errors'), 0)
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8000):
+        await self.batcher.start()
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        return self._server
+
+    @property
+    def port(self) -> int:
+        return self._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        await self.batcher.close()
+
+    def snapshot(self) -> dict:
+        return {**self.batcher.stats, **self.stats}
+
+##_______________________________________________________________
+    # Requests
+
+    async def match(self, payload: dict) -> tuple:
+        """(status, response body) for one /match payload"""
+        if not isinstance(payload, dict) or not isinstance(payload.get('rankings'), dict):
+            return 400, {'error': "'rankings' must be an object of issue ranks"}
+        timeout = payload.get('timeout_ms')
+        if timeout is not None and (isinstance(timeout, bool) or not isinstance(timeout, (int, float))
+                                    or not 0 <= timeout < math.inf):
+            return 400, {'id': payload.get('id'), 'error': "'timeout_ms' must be a non-negative number"}
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (self.timeout if timeout is None else timeout / 1000)
+        request = {
+            'rankings': payload['rankings'],
+            'actions': payload.get('actions', ()),
+            'values': payload.get('values'),
+            'top': payload.get('top', self.top),
+        }
+        try:
+            matches = await self.batcher.submit(request, deadline)
+        except DeadlineExceeded:
+            return 504, {'id': payload.get('id'), 'error': 'deadline exceeded'}
+        except (KeyError, TypeError, ValueError, AttributeError) as error:
+            return 400, {'id': payload.get('id'), 'error': str(error)}
+        return 200, {'id': payload.get('id'), 'matches': matches}
+
+    async def _dispatch(self, method: str, path: str, body: bytes) -> tuple:
+        if path == '/match':
+            if method != 'POST':
+                return 405, {'error': 'use POST'}
+            try:
+                payload = json.loads(body)
+            except (UnicodeDecodeError, json.JSONDecodeError) as error:
+                return 400, {'error': f'invalid JSON: {error}'}
+            return await self.match(payload)
+        if method != 'GET':
+            return 405, {'error': 'use GET'}
+        if path == '/stats':
+            return 200, self.snapshot()
+        if path == '/metrics':
+            return 200, self.to_prometheus()
+        if path == '/health':
+            return 200, {'status': 'ok'}
+        return 404, {'error': f'no route {path}'}
+
+    def to_prometheus(self, prefix: str = 'matching_service') -> str:
+        lines = []
+        for counter, count in self.snapshot().items():
+            lines += [f'# TYPE {prefix}_{counter}_total counter', f'{prefix}_{counter}_total {count}']
+        text = '\n'.join(lines) + '\n'
+        if instrumentation.active is not None:
+            text += instrumentation.active.to_prometheus()
+        return text
+
+##_______________________________________________________________
+    # HTTP/1.1
+
+    async def _handle_connection(self, reader, writer):
+        self.stats['connections'] += 1
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except ValueError as error:
+                    self.stats['bad_requests'] += 1
+                    status = 413 if 'too large' in str(error) else 400
+                    await _write_response(writer, status, {'error': str(error)}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                method, path, keep_alive, body = request
+                try:
+                    status, response = await self._dispatch(method, path, body)
+                except Exception as error:
+                    self.stats['errors'] += 1
+                    status, response = 500, {'error': repr(error)}
+                if status == 400:
+                    self.stats['bad_requests'] += 1
+                await _write_response(writer, status, response, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def _read_request(reader):
+    """(method, path, keep_alive, body) of the next request, or None at EOF"""
+    request_line = await reader.readline()
+    if not request_line.strip():
+        return None
+    try:
+        method, target, version = request_line.decode('latin-1').split()
+    except ValueError:
+        raise ValueError('malformed request line') from None
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get('content-length') or 0)
+    if length > MAX_BODY_SIZE:
+        raise ValueError('request body too large')
+    body = await reader.readexactly(length) if length else b''
+    connection = headers.get('connection', '').lower()
+    keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+    return method, target.split('?', 1)[0], keep_alive, body
+
+
+async def _write_response(writer, status: int, response, keep_alive: bool):
+    if isinstance(response, str):
+        body = response.encode('utf-8')
+        content_type = 'text/plain; version=0.0.4'
+    else:
+        body = json.dumps(response, separators=(',', ':')).encode('utf-8')
+        content_type = 'application/json'
+    writer.write(
+        f'HTTP/1.1 {status} {REASONS[status]}\r\n'
+        f'Content-Type: {content_type}\r\n'
+        f'Content-Length: {len(body)}\r\n'
+        f'Connection: {"keep-alive" if keep_alive else "close"}\r\n'
+        '\r\n'.encode('latin-1') + body
+    )
+    await writer.drain()
+
+##_______________________________________________________________
+# Command line
+
+def build_service(vocabulary: Vocabulary, catalog: dict, weights: dict = DEFAULT_WEIGHTS,
+                  window: float = 0.002, max_batch: int = 64, top: int = 20,
+                  timeout: float = 1.0) -> MatchService:
+    """MatchService over a compiled catalog (see ``pipeline.load_catalog``)"""
+    batcher = MicroBatcher(make_batch_scorer(catalog, vocabulary, weights), window, max_batch)
+    return MatchService(batcher, top, timeout)
+
+
+async def serve(service: MatchService, host: str, port: int, ready=None):
+    """Run ``service`` until cancelled; ``ready(port)`` is called once it listens"""
+    server = await service.start(host, port)
+    if ready is not None:
+        ready(service.port)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='python -m matching.service',
+        description="Serve top matches over HTTP/JSON, micro-batching concurrent requests",
+    )
+    parser.add_argument('--taxonomy', required=True, help="JSON file mapping issues to categories")
+    parser.add_argument('--orgs', required=True, help="JSONL file of orgs, one per line, each with an 'id'")
+    parser.add_argument('--value-questions', default=','.join(VALUE_QUESTIONS),
+                        help=f"comma-separated value questions (default: {','.join(VALUE_QUESTIONS)})")
+    parser.add_argument('--host', default='127.0.0.1', help="interface to listen on (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=8000, help="port to listen on (default: 8000)")
+    parser.add_argument('--window-ms', type=float, default=2.0,
+                        help="batching window in milliseconds (default: 2)")
+    parser.add_argument('--max-batch', type=int, default=64, help="largest batch (default: 64)")
+    parser.add_argument('--top', type=int, default=20, help="default matches per request (default: 20)")
+    parser.add_argument('--timeout-ms', type=float, default=1000.0,
+                        help="default request deadline in milliseconds (default: 1000)")
+    parser.add_argument('--weights', help="JSON file of score weights (default: DEFAULT_WEIGHTS)")
+    args = parser.parse_args(argv)
+
+    with open(args.taxonomy, encoding='utf-8') as taxonomy_file:
+        vocabulary = Vocabulary(json.load(taxonomy_file), value_questions=args.value_questions.split(','))
+    weights = DEFAULT_WEIGHTS
+    if args.weights:
+        with open(args.weights, encoding='utf-8') as weights_file:
+            weights = json.load(weights_file)
+    with open(args.orgs, encoding='utf-8') as orgs_file:
+        catalog = load_catalog(read_jsonl(orgs_file), vocabulary)
+
+    service = build_service(vocabulary, catalog, weights, args.window_ms / 1000, args.max_batch,
+                            args.top, args.timeout_ms / 1000)
+    def announce(port):
+        print(f"matching service listening on {args.host}:{port}", file=sys.stderr)
+
+    try:
+        asyncio.run(serve(service, args.host, args.port, announce))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
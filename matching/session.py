@@ -0,0 +1,290 @@
+"""
+Incremental re-scoring of one user against a catalog while they edit their profile.
+
+``MatchSession`` keeps, for every org, the weighted distance term of each org
+issue and the action / value components. An edit only recomputes the terms it
+can change and re-adds each touched org's terms in ranking order, so every
+score stays identical to a fresh ``score_pair`` call.
+"""
+from time import perf_counter
+
+from . import instrumentation
+from .actions import mask_action_component
+from .profiles import OrgProfile, UserProfile
+from .scoring import DEFAULT_WEIGHTS, combine_components, issue_term, pair_counts, value_component
+from .taxonomy import NO_CATEGORY
+
+
+def _sum_terms(terms) -> float:
+    # Same left-to-right additions as issue_component (sum() may compensate)
+    total_distance = 0
+    for term in terms:
+        total_distance += term
+    return total_distance
+
+
+class MatchSession:
+    """
+    One user's scores against every org, kept up to date across profile edits
+
+    - rank edits that keep the number of ranked issues re-score only the org
+      issues that are the edited issues or share a category with one;
+    - adding or removing an issue changes user_max_rank and the scale factor
+      of every org, so it re-scores everything;
+    - action edits recompute the action component only;
+    - value edits recompute the value component of the orgs that rank the
+      edited issues.
+
+    Every edit method returns the number of orgs whose scores were recomputed.
+
+    Parameters:
+    -----------
+    user_rankings : dict
+        Dictionary of user's issue rankings
+    catalog : dict
+        Dictionary of organizations, {org_id: OrgProfile} or
+        {org_id: {'rankings': dict, 'actions': list, 'values': dict}}
+    vocabulary : Vocabulary
+        Vocabulary the OrgProfiles were built with (dict entries are compiled into it)
+    user_actions : list
+        List of user's preferred actions
+    user_values : dict
+        Dictionary of user's value responses
+    weights : dict, optional
+        Dictionary of weights for different score components, as for ``score_pair``
+    """
+
+    def __init__(self, user_rankings: dict, catalog: dict, vocabulary, user_actions: list = (),
+                 user_values: dict = None, weights: dict = DEFAULT_WEIGHTS):
+        self.vocabulary = vocabulary
+        self.weights = weights
+        self._org_ids = list(catalog)
+        self._orgs = [
+            org if isinstance(org, OrgProfile) else OrgProfile.from_dict(org, vocabulary)
+            for org in catalog.values()
+        ]
+        for org in self._orgs:
+            if org.vocabulary is not vocabulary:
+                raise ValueError("OrgProfile was built with a different vocabulary")
+
+        # (org row, org position) of every org issue, by issue id and by category id
+        self._positions_by_issue = {}
+        self._positions_by_category = {}
+        for row, org in enumerate(self._orgs):
+            for org_position, (issue_id, category_id) in enumerate(zip(org.issue_ids, org.category_ids)):
+                self._positions_by_issue.setdefault(issue_id, []).append((row, org_position))
+                if category_id != NO_CATEGORY:
+                    self._positions_by_category.setdefault(category_id, []).append((row, org_position))
+
+        self._rankings = dict(user_rankings)
+        self._actions = list(user_actions)
+        self._values = dict(user_values or {})
+        self._user = self._compile_user()
+
+        num_orgs = len(self._orgs)
+        self._issue_terms = [None] * num_orgs
+        self._issue_distances = [None] * num_orgs
+        self._action_distances = [None] * num_orgs
+        self._value_distances = [None] * num_orgs
+        self._scores = [None] * num_orgs
+        self._rescore_all()
+
+    def _compile_user(self) -> UserProfile:
+        return UserProfile(self._rankings, self.vocabulary, self._actions, self._values)
+
+##_______________________________________________________________
+    # Results
+
+    @property
+    def user(self) -> UserProfile:
+        return self._user
+
+    @property
+    def rankings(self) -> dict:
+        return dict(self._rankings)
+
+    def scores(self) -> dict:
+        """``{org_id: score_pair result}`` for every org, in catalog order"""
+        return dict(zip(self._org_ids, self._scores))
+
+    def top(self, k: int = 20) -> list:
+        """k best (lowest total_score) ``(org_id, scores)`` pairs; ties keep catalog order"""
+        rows = sorted(range(len(self._orgs)), key=lambda row: self._scores[row]['total_score'])
+        return [(self._org_ids[row], self._scores[row]) for row in rows[:k]]
+
+##_______________________________________________________________
+    # Edits
+
+    def set_rank(self, issue, rank) -> int:
+        """Rank one issue (re-ranking it, or adding it if the user had not ranked it)"""
+        rankings = dict(self._rankings)
+        rankings[issue] = rank
+        return self.set_rankings(rankings)
+
+    def remove_issue(self, issue) -> int:
+        """Stop ranking an issue"""
+        rankings = dict(self._rankings)
+        del rankings[issue]
+        return self.set_rankings(rankings)
+
+    def set_rankings(self, user_rankings: dict) -> int:
+        """Replace the user's rankings"""
+        if not user_rankings:
+            raise ValueError("user_rankings must contain at least one ranked issue")
+        old_rankings = self._rankings
+        self._rankings = dict(user_rankings)
+        self._user = self._compile_user()
+
+        if len(old_rankings) != len(user_rankings):
+            return self._rescore_all()
+
+        changed = {
+            issue for issue in old_rankings.keys() | user_rankings.keys()
+            if old_rankings.get(issue) != user_rankings.get(issue)
+        }
+        # Issues that entered or left the ranking also change the value component
+        added_or_removed = old_rankings.keys() ^ user_rankings.keys()
+
+        touched = {}
+        for issue in changed:
+            issue_id = self.vocabulary.issue_id(issue)
+            if issue_id is None:
+                # No org ranks an issue the vocabulary does not know, and it has no category
+                continue
+            for row, org_position in self._positions_by_issue.get(issue_id, ()):
+                touched.setdefault(row, set()).add(org_position)
+            category_id = self.vocabulary.issue_category_id(issue_id)
+            for row, org_position in self._positions_by_category.get(category_id, ()):
+                touched.setdefault(row, set()).add(org_position)
+
+        value_rows = self._rows_ranking(added_or_removed)
+        start = perf_counter()
+        for row, org_positions in touched.items():
+            org = self._orgs[row]
+            terms = self._issue_terms[row]
+            for org_position in org_positions:
+                terms[org_position] = issue_term(self._user, org, org_position, self.weights)
+            self._issue_distances[row] = _sum_terms(terms) / self._user.max_rank
+        issues_done = perf_counter()
+        for row in value_rows:
+            self._value_distances[row] = value_component(self._user, self._orgs[row], None)
+        values_done = perf_counter()
+
+        rows = touched.keys() | value_rows
+        self._combine(rows)
+        counts = {'pairs': len(rows)}
+        if instrumentation.active is not None:
+            counts['issue_comparisons'] = self._issue_comparisons(touched)
+        self._record(
+            {'issues': issues_done - start, 'values': values_done - issues_done,
+             'rounding': perf_counter() - values_done},
+            counts,
+        )
+        return len(rows)
+
+    def set_actions(self, user_actions: list) -> int:
+        """Replace the user's actions"""
+        self._actions = list(user_actions)
+        self._user = self._compile_user()
+        user = self._user
+        start = perf_counter()
+        for row, org in enumerate(self._orgs):
+            self._action_distances[row] = mask_action_component(
+                user.action_mask, len(user.action_ids), org.action_mask)
+        actions_done = perf_counter()
+        self._combine(range(len(self._orgs)))
+        self._record({'actions': actions_done - start, 'rounding': perf_counter() - actions_done},
+                     {'pairs': len(self._orgs)})
+        return len(self._orgs)
+
+    def set_values(self, user_values: dict) -> int:
+        """Replace the user's value answers"""
+        old_values = self._values
+        self._values = dict(user_values)
+        self._user = self._compile_user()
+
+        changed = {
+            issue for issue in old_values.keys() | self._values.keys()
+            if issue in self._rankings and old_values.get(issue) != self._values.get(issue)
+        }
+        rows = self._rows_ranking(changed)
+        start = perf_counter()
+        for row in rows:
+            self._value_distances[row] = value_component(self._user, self._orgs[row], None)
+        values_done = perf_counter()
+        self._combine(rows)
+        self._record({'values': values_done - start, 'rounding': perf_counter() - values_done},
+                     {'pairs': len(rows)})
+        return len(rows)
+
+    def set_issue_values(self, issue, issue_values: dict) -> int:
+        """Replace the user's value answers for one issue"""
+        user_values = dict(self._values)
+        user_values[issue] = issue_values
+        return self.set_values(user_values)
+
+##_______________________________________________________________
+    # Recomputation
+
+    def _rows_ranking(self, issues) -> set:
+        rows = set()
+        for issue in issues:
+            issue_id = self.vocabulary.issue_id(issue)
+            for row, _ in self._positions_by_issue.get(issue_id, ()):
+                rows.add(row)
+        return rows
+
+    def _issue_comparisons(self, touched: dict) -> int:
+        # See instrumentation.COUNTERS: same-category user ranks per re-scored org issue
+        category_ranks = self._user.category_ranks
+        return sum(
+            len(category_ranks.get(self._orgs[row].category_ids[org_position], ()))
+            for row, org_positions in touched.items()
+            for org_position in org_positions
+        )
+
+    def _rescore_all(self) -> int:
+        user = self._user
+        weights = self.weights
+        orgs = self._orgs
+        start = perf_counter()
+        for row, org in enumerate(orgs):
+            terms = [issue_term(user, org, org_position, weights) for org_position in range(len(org))]
+            self._issue_terms[row] = terms
+            self._issue_distances[row] = _sum_terms(terms) / user.max_rank
+        issues_done = perf_counter()
+        for row, org in enumerate(orgs):
+            self._action_distances[row] = mask_action_component(
+                user.action_mask, len(user.action_ids), org.action_mask)
+        actions_done = perf_counter()
+        for row, org in enumerate(orgs):
+            self._value_distances[row] = value_component(user, org, None)
+        values_done = perf_counter()
+        self._combine(range(len(orgs)))
+        end = perf_counter()
+
+        if instrumentation.active is not None:
+            counts = {}
+            for org in orgs:
+                for counter, count in pair_counts(user, org).items():
+                    counts[counter] = counts.get(counter, 0) + count
+            self._record(
+                {'issues': issues_done - start, 'actions': actions_done - issues_done,
+                 'values': values_done - actions_done, 'rounding': end - values_done},
+                counts,
+            )
+        return len(orgs)
+
+    def _record(self, phases: dict, counts: dict):
+        # Re-scoring work is reported like score_pair's, one call per recomputation
+        if instrumentation.active is not None:
+            instrumentation.active.record(phases, counts)
+
+    def _combine(self, rows):
+        for row in rows:
+            self._scores[row] = combine_components(
+                self._issue_distances[row],
+                self._action_distances[row],
+                self._value_distances[row],
+                self.weights,
+            )
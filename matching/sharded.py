@@ -0,0 +1,204 @@
+"""
+Sharded scatter-gather matching across worker processes.
+
+``ShardedMatcher`` splits the org catalog into ``num_shards`` contiguous
+ranges and starts one worker process per range. Each worker compiles only its
+own shard and serves queries over a ``multiprocessing.connection`` listener
+(a Unix socket by default, or TCP), so a shard could as well live on another
+node. A query is sent to every shard at once; each answers with its
+``top_k_matches`` list, and the coordinator merges them by (total_score,
+catalog position).
+
+Shards are contiguous, so a shard's positions plus its offset are catalog
+positions, and the merged top-K breaks ties the same way as ``top_k_matches``
+over the whole catalog: the result equals single-process exhaustive scoring.
+
+Usage:
+
+    with ShardedMatcher(orgs, taxonomy, num_shards=4) as matcher:
+        matches = matcher.top_k(user, k=20)['matches']
+"""
+import heapq
+import multiprocessing
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import weakref
+from itertools import islice
+from multiprocessing.connection import Client, Listener
+
+from .profiles import OrgProfile, UserProfile
+from .ranking import top_k_matches
+from .scoring import DEFAULT_WEIGHTS
+from .vocabulary import Vocabulary
+
+
+def _serve_shard(shard_number: int, shard: dict, offset: int, issue_categories, value_questions, address,
+                 family, authkey: bytes, ready):
+    """Worker process: compile one shard and answer queries until told to stop"""
+    vocabulary = Vocabulary(issue_categories, value_questions=value_questions)
+    catalog = {org_id: OrgProfile.from_dict(org, vocabulary) for org_id, org in shard.items()}
+    positions = {org_id: offset + position for position, org_id in enumerate(catalog)}
+
+    listener = Listener(address, family, authkey=authkey)
+    try:
+        ready.put((shard_number, listener.address))
+        connection = listener.accept()
+    finally:
+        # One coordinator per worker: stop listening (and unlink the socket) once it is connected
+        listener.close()
+
+    with connection:
+        while True:
+            try:
+                message = connection.recv()
+            except EOFError:
+                # The coordinator went away without closing
+                return
+            if message[0] == 'close':
+                return
+            _, user, k, weights = message
+            try:
+                user_profile = UserProfile(user['rankings'], vocabulary, user.get('actions', ()),
+                                           user.get('values'))
+                result = top_k_matches(user_profile, catalog, k, weights)
+                connection.send(('ok', [(positions[org_id], org_id, scores)
+                                        for org_id, scores in result['matches']], result['pruned']))
+            except Exception as error:
+                connection.send(('error', error, None))
+
+
+class ShardedMatcher:
+    """
+    Coordinator of worker processes that each hold one shard of the catalog
+
+    Queries from several threads are sent one at a time.
+
+    Parameters:
+    -----------
+    catalog : dict
+        Dictionary of organizations, {org_id: {'rankings': dict, 'actions': list,
+        'values': dict}} (OrgProfiles are sent as their ``to_dict()``)
+    issue_categories : dict, CategoryIndex or Vocabulary
+        Dictionary mapping issues to their categories; a Vocabulary also
+        gives the value questions
+    num_shards : int, optional
+        Worker processes (default: os.cpu_count()), at most one per org
+    family : str, optional
+        'AF_UNIX' (default where available) or 'AF_INET' for the workers' listeners
+    weights : dict, optional
+        Default weights for ``top_k``
+    """
+
+    def __init__(self, catalog: dict, issue_categories, num_shards: int = None, family: str = None,
+                 weights: dict = DEFAULT_WEIGHTS):
+        vocabulary = Vocabulary.coerce(issue_categories)
+        orgs = [(org_id, org.to_dict() if isinstance(org, OrgProfile) else org)
+                for org_id, org in catalog.items()]
+        num_shards = max(1, min(num_shards or os.cpu_count() or 1, len(orgs)))
+        if family is None:
+            family = 'AF_UNIX' if hasattr(socket, 'AF_UNIX') else 'AF_INET'
+        self.weights = weights
+        self.num_orgs = len(orgs)
+        self._lock = threading.Lock()
+        self._authkey = os.urandom(32)
+        directory = tempfile.mkdtemp(prefix='matching-shards-') if family == 'AF_UNIX' else None
+        # Removes the socket directory on close(), or when the matcher is collected unclosed
+        self._remove_directory = weakref.finalize(self, shutil.rmtree, directory, True) if directory else None
+        self._processes = []
+        self._connections = []
+        self.shard_sizes = []
+
+        ready = multiprocessing.Queue()
+        try:
+            for shard_number in range(num_shards):
+                start = shard_number * len(orgs) // num_shards
+                stop = (shard_number + 1) * len(orgs) // num_shards
+                if family == 'AF_UNIX':
+                    address = os.path.join(directory, f'shard-{shard_number}.sock')
+                else:
+                    address = ('127.0.0.1', 0)
+                process = multiprocessing.Process(
+                    target=_serve_shard,
+                    args=(shard_number, dict(orgs[start:stop]), start, dict(vocabulary.category_index),
+                          vocabulary.value_questions, address, family, self._authkey, ready),
+                    daemon=True,
+                )
+                process.start()
+                self._processes.append(process)
+                self.shard_sizes.append(stop - start)
+            # Shards compile in parallel and report their addresses in any order
+            addresses = dict(ready.get(timeout=120) for _ in range(num_shards))
+            self._connections = [Client(addresses[shard_number], family, authkey=self._authkey)
+                                 for shard_number in range(num_shards)]
+        except BaseException:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __repr__(self):
+        return f"ShardedMatcher({self.num_orgs} orgs in {len(self.shard_sizes)} shards)"
+
+    def top_k(self, user: dict, k: int = 20, weights: dict = None) -> dict:
+        """
+        Find the k best orgs of the whole catalog for a user
+
+        Parameters:
+        -----------
+        user : dict
+            {'rankings': dict, 'actions': list, 'values': dict} ('actions' and
+            'values' are optional)
+        k : int, optional
+            Number of matches to return
+        weights : dict, optional
+            Dictionary of weights for different score components (default: the matcher's)
+
+        Returns:
+        --------
+        dict
+            'matches': list of (org_id, scores) pairs, best first, as from
+            ``top_k_matches`` over the whole catalog
+            'pruned': orgs whose issue component was never computed, over all shards
+        """
+        message = ('match', user, k, weights or self.weights)
+        with self._lock:
+            # Scatter to every shard before gathering, so they score in parallel
+            for connection in self._connections:
+                connection.send(message)
+            replies = [connection.recv() for connection in self._connections]
+
+        for status, payload, _ in replies:
+            if status == 'error':
+                raise payload
+        # Each shard's list is sorted by (total_score, position) already
+        merged = heapq.merge(*(matches for _, matches, _ in replies),
+                             key=lambda match: (match[2]['total_score'], match[0]))
+        return {
+            'matches': [(org_id, scores) for _, org_id, scores in islice(merged, max(k, 0))],
+            'pruned': sum(pruned for _, _, pruned in replies),
+        }
+
+    def close(self):
+        """Stop the workers and remove their sockets"""
+        for connection in self._connections:
+            try:
+                connection.send(('close',))
+                connection.close()
+            except OSError:
+                pass
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        self._connections = []
+        self._processes = []
+        if self._remove_directory is not None:
+            self._remove_directory()
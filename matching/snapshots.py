@@ -0,0 +1,213 @@
+"""
+Versioned, copy-on-write org catalog snapshots.
+
+Org admins edit their profiles while matcher threads score against the same
+catalog. Instead of a global lock or a deep copy per query, a
+``CatalogStore`` publishes immutable ``CatalogSnapshot`` versions:
+
+- a reader takes ``store.current`` (one attribute read, never blocks) and
+  uses that snapshot for the whole query, however many versions are
+  published meanwhile;
+- a writer compiles only the orgs it changes, then builds the next version
+  from the current one's tables without copying the catalog: a version is a
+  base ``{org_id: OrgProfile}`` table shared by many versions plus a small
+  overlay of the orgs replaced, added or removed since that base was built.
+  An update copies only the overlay. Once the overlay outgrows the square
+  root of the catalog size, the next update folds it into a new base. That
+  is one O(catalog) copy every sqrt(catalog) updates, instead of one per
+  update. Every unchanged OrgProfile is shared between versions;
+- publishing is a single reference swap; writers are serialized among
+  themselves, never against readers.
+
+Nothing refers from a snapshot to older ones, so a version and the profiles
+only it uses are freed as soon as the last reader drops it
+(``live_versions`` reports which are still held). Batching several edits into
+one ``update`` call publishes one version for all of them.
+
+All versions share the store's append-only Vocabulary, which is safe to
+intern into while other threads read it.
+"""
+import math
+import threading
+import weakref
+from collections.abc import Mapping
+from contextlib import contextmanager
+
+from .profiles import OrgProfile
+from .vocabulary import Vocabulary
+
+
+# Overlay entry of an org removed from the base table
+_REMOVED = object()
+
+
+class CatalogSnapshot(Mapping):
+    """
+    One immutable version of an org catalog, ``{org_id: OrgProfile}`` in
+    catalog order
+
+    Can be passed anywhere a catalog dict of OrgProfiles is accepted
+    (``top_k_matches``, ``OverlapIndex``, ...). Do not modify the profiles.
+
+    ``_base`` may be shared with other versions; ``_overlay`` holds this
+    version's replaced and added orgs (``_REMOVED`` for orgs dropped from the
+    base). Base orgs come first, in base order, then the added ones.
+    """
+    __slots__ = ('version', 'vocabulary', '_base', '_overlay', '_size', '__weakref__')
+
+    def __init__(self, version: int, vocabulary: Vocabulary, base: dict, overlay: dict = None):
+        self.version = version
+        self.vocabulary = vocabulary
+        self._base = base
+        self._overlay = overlay or {}
+        self._size = len(base) + sum(
+            -1 if org is _REMOVED else org_id not in base for org_id, org in self._overlay.items())
+
+    def __getitem__(self, org_id) -> OrgProfile:
+        overlay = self._overlay
+        if org_id in overlay:
+            org = overlay[org_id]
+            if org is _REMOVED:
+                raise KeyError(org_id)
+            return org
+        return self._base[org_id]
+
+    def __iter__(self):
+        if not self._overlay:
+            return iter(self._base)
+        return self._merged_ids()
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, org_id):
+        org = self._overlay.get(org_id)
+        if org is None:
+            return org_id in self._base
+        return org is not _REMOVED
+
+    def __repr__(self):
+        return f"CatalogSnapshot(version {self.version}, {self._size} orgs)"
+
+    def _merged_ids(self):
+        base, overlay = self._base, self._overlay
+        for org_id in base:
+            if overlay.get(org_id) is not _REMOVED:
+                yield org_id
+        for org_id in overlay:
+            if org_id not in base:
+                yield org_id
+
+    def _compacted(self) -> dict:
+        """This version's orgs as one plain table, in catalog order"""
+        if not self._overlay:
+            return self._base
+        return {org_id: self[org_id] for org_id in self._merged_ids()}
+
+
+class CatalogStore:
+    """
+    Publishes copy-on-write ``CatalogSnapshot`` versions of an org catalog
+
+    Parameters:
+    -----------
+    catalog : dict
+        Dictionary of organizations, {org_id: OrgProfile} or
+        {org_id: {'rankings': dict, 'actions': list, 'values': dict}}
+    issue_categories : dict, CategoryIndex or Vocabulary
+        Dictionary mapping issues to their categories, or the Vocabulary the
+        OrgProfiles were built with
+    """
+
+    def __init__(self, catalog: dict, issue_categories):
+        self.vocabulary = Vocabulary.coerce(issue_categories)
+        self._write_lock = threading.Lock()
+        self._versions = weakref.WeakValueDictionary()
+        self._current = None
+        self._publish({org_id: self._compile(org) for org_id, org in catalog.items()}, {}, 0)
+
+    def __repr__(self):
+        return f"CatalogStore(version {self._current.version}, {len(self._current)} orgs)"
+
+    @property
+    def current(self) -> CatalogSnapshot:
+        """The latest published snapshot; hold on to it for the whole query"""
+        return self._current
+
+    @property
+    def version(self) -> int:
+        return self._current.version
+
+    @contextmanager
+    def pin(self):
+        """``with store.pin() as snapshot:`` - the current snapshot, held until the block exits"""
+        yield self._current
+
+    def live_versions(self) -> list:
+        """Versions still referenced by a reader (always includes the current one)"""
+        return sorted(self._versions.keys())
+
+    def update(self, changes: dict = None, removals=()) -> CatalogSnapshot:
+        """
+        Publish one new version with ``changes`` applied and ``removals``
+        dropped
+
+        Parameters:
+        -----------
+        changes : dict, optional
+            {org_id: org} for orgs to add or replace, as OrgProfiles built with
+            the store's vocabulary or in the dict format. Replaced orgs keep
+            their place in the catalog order; new ones go at the end.
+        removals : iterable, optional
+            Ids of orgs to remove
+
+        Returns:
+        --------
+        CatalogSnapshot
+            The published version
+        """
+        # Compile outside the lock; readers and other writers are not held up by it
+        compiled = {org_id: self._compile(org) for org_id, org in (changes or {}).items()}
+        removals = list(removals)
+        with self._write_lock:
+            current = self._current
+            base, overlay = current._base, dict(current._overlay)
+            for org_id in removals:
+                if org_id not in current or overlay.get(org_id) is _REMOVED:
+                    raise KeyError(org_id)
+                if org_id in base:
+                    overlay[org_id] = _REMOVED
+                else:
+                    del overlay[org_id]
+            if any(overlay.get(org_id) is _REMOVED for org_id in compiled):
+                # A removed base org coming back goes at the end, which an
+                # overlay over that base cannot express
+                base = CatalogSnapshot(current.version, self.vocabulary, base, overlay)._compacted()
+                overlay = {}
+            overlay.update(compiled)
+            if len(overlay) > math.isqrt(len(base)):
+                base = CatalogSnapshot(current.version, self.vocabulary, base, overlay)._compacted()
+                overlay = {}
+            return self._publish(base, overlay, current.version + 1)
+
+    def update_org(self, org_id, org) -> CatalogSnapshot:
+        """Add or replace one org; returns the published version"""
+        return self.update({org_id: org})
+
+    def remove_org(self, org_id) -> CatalogSnapshot:
+        """Remove one org; returns the published version"""
+        return self.update(removals=[org_id])
+
+    def _compile(self, org) -> OrgProfile:
+        if isinstance(org, OrgProfile):
+            if org.vocabulary is not self.vocabulary:
+                raise ValueError("OrgProfile was built with a different vocabulary")
+            return org
+        return OrgProfile.from_dict(org, self.vocabulary)
+
+    def _publish(self, base: dict, overlay: dict, version: int) -> CatalogSnapshot:
+        snapshot = CatalogSnapshot(version, self.vocabulary, base, overlay)
+        self._versions[version] = snapshot
+        # A single reference assignment: readers see the old or the new version, never a mix
+        self._current = snapshot
+        return snapshot
@@ -0,0 +1,158 @@
+"""
+Weight sweeps over raw component distances.
+
+Every score is a linear combination of four raw quantities per pair:
+
+    issue_score  = (exact_sum * exact_match + category_sum * category_match) / user_max_rank * issue_weight
+    action_score = action_distance * action_weight
+    value_score  = value_distance * value_weight
+
+``raw_components`` computes them once per (user, org) pair, and
+``sweep_weights`` evaluates any number of weight dicts over all pairs as one
+matrix multiply. Regrouping the issue sum that way can move a score by a few
+ulps, so scores the matrix product puts within a hair of a rounding boundary
+are recomputed the way ``score_pair`` adds them up. Rounded results are then
+identical to ``score_pair`` for every weight dict.
+"""
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+
+from .actions import mask_action_component
+from .catalog import _require_numpy, near_half_way, round_scores
+from .scoring import check_vocabulary, combine_components, issue_distances, value_component
+
+SCORE_KEYS = ('issue_score', 'action_score', 'value_score', 'total_score')
+
+
+def _segment_sums(values, offsets):
+    # Every org ranks at least one issue, so no segment is empty
+    if len(offsets) == 1:
+        return np.zeros(0)
+    return np.add.reduceat(values, offsets[:-1])
+
+
+class RawComponents:
+    """
+    Unweighted distances of a batch of pairs
+
+    - ``exact_sum`` / ``category_sum``: summed exact / category distance per pair
+    - ``max_rank``: user_max_rank per pair
+    - ``action_distance`` / ``value_distance``: unweighted action / value components
+    - ``exact_distances`` / ``category_distances``: every per-issue distance,
+      pair ``i`` at ``offsets[i]:offsets[i + 1]``, kept for exact recomputation
+    """
+
+    def __init__(self, pairs):
+        _require_numpy()
+        exact_distances = []
+        category_distances = []
+        offsets = [0]
+        max_ranks = []
+        action_distances = []
+        value_distances = []
+        for user, org in pairs:
+            check_vocabulary(user, org)
+            for org_position in range(len(org)):
+                exact_distance, category_distance = issue_distances(user, org, org_position)
+                exact_distances.append(exact_distance)
+                category_distances.append(category_distance)
+            offsets.append(len(exact_distances))
+            max_ranks.append(user.max_rank)
+            action_distances.append(mask_action_component(user.action_mask, len(user.action_ids),
+                                                          org.action_mask))
+            value_distances.append(value_component(user, org, None))
+
+        self.exact_distances = np.array(exact_distances, dtype=float)
+        self.category_distances = np.array(category_distances, dtype=float)
+        self.offsets = np.array(offsets, dtype=np.intp)
+        self.max_rank = np.array(max_ranks, dtype=float)
+        self.action_distance = np.array(action_distances, dtype=float)
+        self.value_distance = np.array(value_distances, dtype=float)
+        self.exact_sum = _segment_sums(self.exact_distances, self.offsets)
+        self.category_sum = _segment_sums(self.category_distances, self.offsets)
+
+    def __len__(self):
+        return len(self.max_rank)
+
+    def issue_distance(self, pair: int, weights: dict) -> float:
+        """``issue_component`` of one pair, added up in the same order"""
+        start, end = self.offsets[pair], self.offsets[pair + 1]
+        exact_match_weight = weights['exact_match']
+        category_match_weight = weights['category_match']
+        total_distance = 0
+        for exact_distance, category_distance in zip(self.exact_distances[start:end].tolist(),
+                                                     self.category_distances[start:end].tolist()):
+            total_distance += (exact_distance * exact_match_weight +
+                               category_distance * category_match_weight)
+        return total_distance / float(self.max_rank[pair])
+
+
+def raw_components(pairs) -> RawComponents:
+    """
+    Raw component distances of (UserProfile, OrgProfile) pairs, e.g.
+    ``itertools.product(users, orgs)``
+    """
+    return RawComponents(pairs)
+
+
+def sweep_weights(raw: RawComponents, weight_grid) -> dict:
+    """
+    Scores of every pair under every weight dict
+
+    Parameters:
+    -----------
+    raw : RawComponents
+        Output of ``raw_components``
+    weight_grid : list
+        Weight dicts, as for ``score_pair``
+
+    Returns:
+    --------
+    dict
+        issue_score, action_score, value_score and total_score arrays of
+        shape (len(weight_grid), len(raw)), rounded like ``score_pair``
+    """
+    _require_numpy()
+    weight_grid = list(weight_grid)
+    issue_weight = np.array([weights['issue_weight'] for weights in weight_grid], dtype=float)
+    # Issue coefficients per weight dict: rows multiply exact_sum / max_rank and category_sum / max_rank
+    issue_coefficients = np.array([
+        [weights['exact_match'] for weights in weight_grid],
+        [weights['category_match'] for weights in weight_grid],
+    ], dtype=float) * issue_weight
+    component_coefficients = np.array([
+        [weights['action_weight'] for weights in weight_grid],
+        [weights.get('value_weight', 0) for weights in weight_grid],
+    ], dtype=float)
+
+    issue_features = np.stack([raw.exact_sum, raw.category_sum], axis=1) / raw.max_rank[:, None]
+    component_features = np.stack([raw.action_distance, raw.value_distance], axis=1)
+    final_issue_score = (issue_features @ issue_coefficients).T
+    # action / value are one exact product each, same as score_pair
+    final_action_score = (component_features[:, :1] * component_coefficients[:1]).T
+    final_value_score = (component_features[:, 1:] * component_coefficients[1:]).T
+    final_total_score = final_issue_score + final_action_score + final_value_score
+
+    results = {
+        'issue_score': round_scores(final_issue_score),
+        'action_score': round_scores(final_action_score),
+        'value_score': round_scores(final_value_score),
+        'total_score': round_scores(final_total_score),
+    }
+
+    # Only the regrouped issue sum can differ from score_pair, by a few ulps;
+    # redo the pairs where that could flip a rounding
+    recompute = near_half_way(final_issue_score) | near_half_way(final_total_score)
+    for grid_index, pair in zip(*np.nonzero(recompute)):
+        weights = weight_grid[grid_index]
+        scores = combine_components(
+            raw.issue_distance(pair, weights),
+            float(raw.action_distance[pair]),
+            float(raw.value_distance[pair]),
+            weights,
+        )
+        for key in SCORE_KEYS:
+            results[key][grid_index, pair] = scores[key]
+    return results
@@ -0,0 +1,130 @@
+"""
+Issue taxonomy structures shared by every scorer.
+
+The scorers used to receive the raw ``issue_categories`` dict and rebuild
+``category_to_issues`` from it on every call. ``CategoryIndex`` does that work
+once, when the taxonomy is loaded, and can then be handed to any number of
+scoring calls (and threads) in place of the raw dict.
+"""
+from collections.abc import Mapping
+from types import MappingProxyType
+
+
+# Category id used for issues that have no (truthy) category. The original
+# scorers only look for a category match when ``if org_category:`` holds, so
+# issues mapped to None or "" never match anything.
+NO_CATEGORY = -1
+
+
+class CategoryIndex(Mapping):
+    """
+    Immutable, precompiled view of an ``issue -> category`` taxonomy
+
+    Behaves like the read-only ``issue_categories`` dict it was built from
+    (``get``, ``[]``, ``in``, iteration), so it can be passed to the existing
+    ``calculate_total_score`` functions unchanged, and additionally exposes:
+
+    - dense integer category ids (``category_id`` / ``category_name``)
+    - the reverse ``category -> issues`` mapping (``category_to_issues``)
+
+    Parameters:
+    -----------
+    issue_categories : dict
+        Dictionary mapping issues to their categories
+    """
+    __slots__ = (
+        '_issue_to_category',
+        '_issue_to_category_id',
+        '_categories',
+        '_category_ids',
+        '_category_to_issues',
+    )
+
+    def __init__(self, issue_categories: dict):
+        issue_to_category = dict(issue_categories)
+        category_ids = {}
+        category_to_issues = {}
+        issue_to_category_id = {}
+
+        for issue, category in issue_to_category.items():
+            if not category:
+                issue_to_category_id[issue] = NO_CATEGORY
+                continue
+            if category not in category_ids:
+                category_ids[category] = len(category_ids)
+                category_to_issues[category] = []
+            category_to_issues[category].append(issue)
+            issue_to_category_id[issue] = category_ids[category]
+
+        # Everything is stored behind read-only proxies / tuples so one index
+        # can be shared freely between threads without copying.
+        self._issue_to_category = MappingProxyType(issue_to_category)
+        self._issue_to_category_id = MappingProxyType(issue_to_category_id)
+        self._categories = tuple(category_ids)
+        self._category_ids = MappingProxyType(category_ids)
+        self._category_to_issues = MappingProxyType({
+            category: tuple(issues)
+            for category, issues in category_to_issues.items()
+        })
+
+    @classmethod
+    def coerce(cls, issue_categories) -> 'CategoryIndex':
+        """Return ``issue_categories`` as a CategoryIndex, building one only if needed."""
+        if isinstance(issue_categories, cls):
+            return issue_categories
+        return cls(issue_categories)
+
+##_______________________________________________________________
+    # Mapping interface (issue -> category), same as the raw dict
+
+    def __getitem__(self, issue):
+        return self._issue_to_category[issue]
+
+    def __iter__(self):
+        return iter(self._issue_to_category)
+
+    def __len__(self):
+        return len(self._issue_to_category)
+
+    def __reduce__(self):
+        # The read-only proxies do not pickle; rebuilding from the raw dict gives the same ids
+        return (self.__class__, (dict(self._issue_to_category),))
+
+    def __repr__(self):
+        return (f"CategoryIndex({len(self._issue_to_category)} issues, "
+                f"{len(self._categories)} categories)")
+
+##_______________________________________________________________
+    # Precompiled lookups
+
+    @property
+    def categories(self) -> tuple:
+        """Category names, in category id order"""
+        return self._categories
+
+    @property
+    def num_categories(self) -> int:
+        return len(self._categories)
+
+    @property
+    def category_to_issues(self) -> Mapping:
+        """Read-only ``{category: (issue, ...)}`` mapping"""
+        return self._category_to_issues
+
+    def category_id(self, issue) -> int:
+        """Integer id of the issue's category, or NO_CATEGORY if it has none"""
+        return self._issue_to_category_id.get(issue, NO_CATEGORY)
+
+    def category_id_of(self, category) -> int:
+        """Integer id of a category name, or NO_CATEGORY if it is unknown"""
+        return self._category_ids.get(category, NO_CATEGORY)
+
+    def category_name(self, category_id: int):
+        """Category name for an id returned by ``category_id``"""
+        if category_id == NO_CATEGORY:
+            return None
+        return self._categories[category_id]
+
+    def issues_in(self, category) -> tuple:
+        """All issues of a category (empty tuple for unknown categories)"""
+        return self._category_to_issues.get(category, ())
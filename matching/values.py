@@ -0,0 +1,68 @@
+"""
+Value-question distances on dense answer matrices.
+
+A profile's value answers form an issue x question matrix (its
+``flat_values`` in ranking order, one row per issue, one column per
+``Vocabulary.value_questions`` entry), with NaN marking an unanswered
+question. The value component of a pair is the mean absolute difference
+over the questions both sides answered, for the issues both sides ranked, or
+MISSING_VALUE_PENALTY when there is no such question.
+
+The per-pair loop in ``scoring`` walks every question of every shared issue
+in Python; with many questions per issue, ``pair_value_component`` does the
+same work as a handful of NumPy operations on the answer matrices.
+"""
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+
+
+# Value distance used when no question was answered by both sides
+# (middle of the possible value range 0-9)
+MISSING_VALUE_PENALTY = 5
+
+
+def answer_matrix(profile):
+    """Issue x question NumPy view of a profile's ``flat_values`` (NaN = unanswered)"""
+    return np.frombuffer(profile.flat_values, dtype=np.float64).reshape(-1, profile.vocabulary.num_questions)
+
+
+def value_distance(user_answers, org_answers) -> float:
+    """
+    Value component of two answer matrices whose rows are the same issues
+
+    Parameters:
+    -----------
+    user_answers, org_answers : numpy.ndarray
+        issue x question answers, NaN where a question was not answered
+
+    Returns:
+    --------
+    float
+        Mean absolute difference over the mutually answered questions, or
+        MISSING_VALUE_PENALTY when there are none
+    """
+    answered = ~np.isnan(user_answers) & ~np.isnan(org_answers)
+    num_value_questions = int(np.count_nonzero(answered))
+    if not num_value_questions:
+        return MISSING_VALUE_PENALTY
+    value_distances = np.abs(user_answers - org_answers)[answered]
+    # cumsum adds left to right, issue by issue and question by question, so
+    # the total is the same float the scalar loop adds up
+    return float(np.cumsum(value_distances)[-1]) / num_value_questions
+
+
+def pair_value_component(user, org) -> float:
+    """Vector form of ``scoring.value_component`` for a UserProfile and an OrgProfile"""
+    position_of = user.position
+    org_positions = []
+    user_positions = []
+    for org_position, issue_id in enumerate(org.issue_ids):
+        user_position = position_of(issue_id)
+        if user_position is not None:
+            org_positions.append(org_position)
+            user_positions.append(user_position)
+    if not org_positions:
+        return MISSING_VALUE_PENALTY
+    return value_distance(answer_matrix(user)[user_positions], answer_matrix(org)[org_positions])
@@ -0,0 +1,207 @@
+"""
+Dense integer ids for issue, category and action names.
+
+Compiled profiles store ids instead of strings, so every profile built against
+the same ``Vocabulary`` can be compared id to id, and the same ids index the
+columns of NumPy arrays and bitsets.
+
+Orgs are interned when the catalog is loaded. Query-time profiles only *resolve*
+names: a name the vocabulary has never seen gets a negative id local to that
+profile, so the shared vocabulary is never written to while readers use it.
+"""
+import threading
+from array import array
+
+from .taxonomy import NO_CATEGORY, CategoryIndex
+
+
+# Value questions asked per issue unless a Vocabulary is given others, as in
+# ``calculate_total_score``
+VALUE_QUESTIONS = ('q1', 'q2')
+
+class Vocabulary:
+    """
+    Append-only ``name <-> id`` tables for issues and actions, plus the taxonomy
+    and the value questions
+
+    Issue ids start with the issues of the taxonomy, in taxonomy order; issues
+    and actions first seen in an interned profile are appended. Category ids
+    are the dense ids of the ``CategoryIndex``, and ``issue_category_ids``
+    maps every issue id to its category id. Interning takes a lock, lookups
+    and ``resolve_*`` do not, so one vocabulary can be shared by threads
+    building and scoring profiles.
+
+    ``value_questions`` fixes which answers profiles keep for each issue, and
+    in which order; answers to any other question are ignored.
+
+    Parameters:
+    -----------
+    issue_categories : dict or CategoryIndex
+        Dictionary mapping issues to their categories
+    actions : iterable, optional
+        Actions to intern up front
+    value_questions : sequence, optional
+        Names of the value questions asked per issue
+    """
+    __slots__ = (
+        'category_index',
+        'value_questions',
+        '_issue_ids',
+        '_issues',
+        '_issue_category_ids',
+        '_action_ids',
+        '_actions',
+        '_lock',
+    )
+
+    def __init__(self, issue_categories, actions=(), value_questions=VALUE_QUESTIONS):
+        self.category_index = CategoryIndex.coerce(issue_categories)
+        self.value_questions = tuple(value_questions)
+        if len(set(self.value_questions)) != len(self.value_questions):
+            raise ValueError("value_questions must be distinct")
+        self._issue_ids = {}
+        self._issues = []
+        self._issue_category_ids = array('i')
+        self._action_ids = {}
+        self._actions = []
+        self._lock = threading.Lock()
+
+        for issue in self.category_index:
+            self.intern_issue(issue)
+        for action in actions:
+            self.intern_action(action)
+
+    @classmethod
+    def coerce(cls, vocabulary_or_categories) -> 'Vocabulary':
+        """Return the argument as a Vocabulary, building one from a taxonomy only if needed"""
+        if isinstance(vocabulary_or_categories, cls):
+            return vocabulary_or_categories
+        return cls(vocabulary_or_categories)
+
+    def __reduce__(self):
+        # Re-interning the names in id order reproduces every id; the lock is not pickled
+        return (_restore_vocabulary, (self.category_index, tuple(self._issues), tuple(self._actions),
+                                      self.value_questions))
+
+    def __repr__(self):
+        return (f"Vocabulary({len(self._issues)} issues, {self.num_categories} categories, "
+                f"{len(self._actions)} actions)")
+
+    def _intern(self, name, ids, names, on_new=None):
+        name_id = ids.get(name)
+        if name_id is None:
+            with self._lock:
+                name_id = ids.get(name)
+                if name_id is None:
+                    name_id = len(names)
+                    # Fill every table before publishing the id, so a reader
+                    # that finds the id can always look it up
+                    if on_new is not None:
+                        on_new(name)
+                    names.append(name)
+                    ids[name] = name_id
+        return name_id
+
+    @staticmethod
+    def _resolve(names, ids) -> list:
+        resolved = []
+        next_unknown_id = -1
+        for name in names:
+            name_id = ids.get(name)
+            if name_id is None:
+                name_id = next_unknown_id
+                next_unknown_id -= 1
+            resolved.append(name_id)
+        return resolved
+
+##_______________________________________________________________
+    # Issues
+
+    @property
+    def num_issues(self) -> int:
+        return len(self._issues)
+
+    def intern_issue(self, issue) -> int:
+        """Id of an issue, assigning the next free id if it is new"""
+        return self._intern(issue, self._issue_ids, self._issues, self._add_issue_category)
+
+    def _add_issue_category(self, issue):
+        self._issue_category_ids.append(self.category_index.category_id(issue))
+
+    def resolve_issues(self, issues) -> list:
+        """
+        Ids of ``issues`` without interning: unknown issues get distinct
+        negative ids (-1, -2, ...) that never match any interned issue
+        """
+        return self._resolve(issues, self._issue_ids)
+
+    def issue_id(self, issue, default=None):
+        """Id of an issue, or ``default`` if it was never interned"""
+        return self._issue_ids.get(issue, default)
+
+    def issue(self, issue_id: int):
+        """Issue name for an id"""
+        return self._issues[issue_id]
+
+    @property
+    def issue_category_ids(self) -> array:
+        """Category id of every issue id (NO_CATEGORY if it has none); do not modify"""
+        return self._issue_category_ids
+
+    def issue_category_id(self, issue_id: int) -> int:
+        """Category id of an issue id; NO_CATEGORY for issues without one and for unknown (negative) ids"""
+        if issue_id < 0:
+            return NO_CATEGORY
+        return self._issue_category_ids[issue_id]
+
+##_______________________________________________________________
+    # Categories (ids from the CategoryIndex)
+
+    @property
+    def num_categories(self) -> int:
+        return self.category_index.num_categories
+
+    def category_id(self, category) -> int:
+        """Id of a category name, or NO_CATEGORY if it is unknown"""
+        return self.category_index.category_id_of(category)
+
+    def category(self, category_id: int):
+        """Category name for an id (None for NO_CATEGORY)"""
+        return self.category_index.category_name(category_id)
+
+##_______________________________________________________________
+    # Actions
+
+    @property
+    def num_actions(self) -> int:
+        return len(self._actions)
+
+    def intern_action(self, action) -> int:
+        """Id of an action, assigning the next free id if it is new"""
+        return self._intern(action, self._action_ids, self._actions)
+
+    def resolve_actions(self, actions) -> list:
+        """Ids of ``actions`` without interning, with negative ids for unknown ones"""
+        return self._resolve(actions, self._action_ids)
+
+    def action_id(self, action, default=None):
+        """Id of an action, or ``default`` if it was never interned"""
+        return self._action_ids.get(action, default)
+
+    def action(self, action_id: int):
+        """Action name for an id"""
+        return self._actions[action_id]
+
+##_______________________________________________________________
+    # Value questions
+
+    @property
+    def num_questions(self) -> int:
+        return len(self.value_questions)
+
+
+def _restore_vocabulary(category_index, issues, actions, value_questions=VALUE_QUESTIONS):
+    vocabulary = Vocabulary(category_index, actions, value_questions)
+    for issue in issues:
+        vocabulary.intern_issue(issue)
+    return vocabulary
@@ -0,0 +1,32 @@
+"""
+The benchmark harness: measure must release what a variant holds (worker
+processes, mappings) once it is done timing it, even when a run fails.
+"""
+import multiprocessing
+
+import pytest
+
+from matching import DEFAULT_WEIGHTS
+from matching.benchmark import VARIANTS, generate_dataset, measure
+
+OPTIONS = {'top': 5, 'workers': 2, 'weights': DEFAULT_WEIGHTS}
+
+
+def test_measure_closes_sharded_workers():
+    dataset = generate_dataset(0, num_users=3, num_orgs=20)
+    result = measure(VARIANTS['sharded'], dataset, OPTIONS, repeat=2)
+    assert result['pairs'] == 3 * 20
+    assert multiprocessing.active_children() == []
+
+
+def test_measure_tears_down_after_a_failed_run():
+    torn_down = []
+
+    def setup(dataset, options):
+        def run():
+            raise RuntimeError("run failed")
+        return run, lambda: torn_down.append(True)
+
+    with pytest.raises(RuntimeError, match="run failed"):
+        measure(setup, generate_dataset(0, num_users=1, num_orgs=1), OPTIONS)
+    assert torn_down == [True]
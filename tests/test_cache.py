@@ -0,0 +1,96 @@
+"""
+ScoreCache and CachedMatcher: LRU order, counters, per-org invalidation and
+the fingerprints entries are keyed on.
+"""
+import pytest
+
+from matching import CachedMatcher, OrgProfile, UserProfile, score_pair
+from matching.benchmark import generate_dataset
+from matching.cache import ScoreCache, profile_fingerprint
+
+
+def make_matcher(num_orgs: int = 8):
+    dataset = generate_dataset(4, num_users=3, num_orgs=num_orgs)
+    return dataset, CachedMatcher(dataset['orgs'], dataset['taxonomy'])
+
+
+def test_lru_eviction():
+    cache = ScoreCache(maxsize=2)
+    cache.put('a', 'org-a', {'total_score': 1.0})
+    cache.put('b', 'org-b', {'total_score': 2.0})
+    assert cache.get('a') == {'total_score': 1.0}
+    # 'b' is now the least recently used entry
+    cache.put('c', 'org-c', {'total_score': 3.0})
+
+    assert len(cache) == 2
+    assert cache.get('b') is None
+    assert cache.get('a') == {'total_score': 1.0}
+    assert cache.get('c') == {'total_score': 3.0}
+    assert cache.evictions == 1
+    # The evicted key is forgotten by its org too
+    assert 'org-b' not in cache._keys_by_org
+    assert cache.invalidate_org('org-b') == 0
+
+
+def test_counters():
+    cache = ScoreCache(maxsize=1)
+    assert cache.get('a') is None
+    cache.put('a', 'org-a', {})
+    cache.put('a', 'org-a', {})
+    assert cache.get('a') == {}
+    cache.put('b', 'org-b', {})
+    assert cache.invalidate_org('org-b') == 1
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'size': 0, 'maxsize': 1,
+                             'evictions': 1, 'invalidations': 1}
+    with pytest.raises(ValueError):
+        ScoreCache(maxsize=0)
+
+
+def test_update_org_invalidates_only_that_org():
+    dataset, matcher = make_matcher()
+    users = dataset['users']
+    for user in users:
+        matcher.score_all(user)
+    num_orgs = len(dataset['orgs'])
+    assert len(matcher.cache) == len(users) * num_orgs
+    assert all(len(keys) == len(users) for keys in matcher.cache._keys_by_org.values())
+
+    # Content no other org has, so it cannot share their entries
+    replacement = dict(dataset['orgs']['org-0'], actions=['action-0'])
+    assert matcher.update_org('org-1', replacement) == len(users)
+    assert 'org-1' not in matcher.cache._keys_by_org
+    assert len(matcher.cache) == len(users) * (num_orgs - 1)
+    assert matcher.cache.invalidations == len(users)
+
+    hits, misses = matcher.cache.hits, matcher.cache.misses
+    for user in users:
+        scores = matcher.score_all(user)
+        profile = UserProfile(user['rankings'], matcher.vocabulary, user['actions'], user['values'])
+        assert scores['org-1'] == score_pair(profile, OrgProfile.from_dict(replacement, matcher.vocabulary))
+    # Every other org's entries survived; only org-1 was scored again
+    assert matcher.cache.hits - hits == len(users) * (num_orgs - 1)
+    assert matcher.cache.misses - misses == len(users)
+
+    assert matcher.remove_org('org-2') == len(users)
+    assert 'org-2' not in matcher.score_all(users[0])
+    assert len(matcher.cache) == len(users) * (num_orgs - 1)
+
+
+def test_fingerprints_ignore_user_order_but_not_org_order():
+    dataset, matcher = make_matcher()
+    user = dataset['users'][0]
+    matcher.score_all(user)
+    shuffled = {
+        'rankings': dict(reversed(user['rankings'].items())),
+        'actions': list(reversed(user['actions'])),
+        'values': dict(reversed(user['values'].items())),
+    }
+    misses = matcher.cache.misses
+    assert matcher.score_all(shuffled) == matcher.score_all(user)
+    assert matcher.cache.misses == misses
+
+    rankings = dataset['orgs']['org-0']['rankings']
+    reordered = dict(reversed(rankings.items()))
+    assert profile_fingerprint(rankings) != profile_fingerprint(reordered)
+    assert profile_fingerprint(rankings, ordered=False) == profile_fingerprint(reordered, ordered=False)
+    assert profile_fingerprint(rankings, ['a', 'b']) == profile_fingerprint(rankings, ['b', 'a', 'a'])
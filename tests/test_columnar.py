@@ -0,0 +1,101 @@
+"""
+Round trips of the columnar match results format: rows come back in the
+order they were written, with every id as it was, however the writer had to
+spool them.
+"""
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from matching import columnar, read_match_results, write_match_results
+from matching.benchmark import REPOSITORY_ROOT
+
+JS_CLIENT = os.path.join(REPOSITORY_ROOT, 'excludes value questions _. algorithm_in_javascript.js')
+
+# Loads a file with the JS client and prints its rows as JSON
+JS_ROUND_TRIP = """
+const client = require(process.argv[1]);
+const data = require('fs').readFileSync(process.argv[2]);
+try {
+    const results = client.loadMatchResults(data.buffer.slice(data.byteOffset, data.byteOffset + data.byteLength));
+    process.stdout.write(JSON.stringify(results.userIds.map((userId, row) => [userId, client.userMatches(results, row)])));
+} catch (error) {
+    process.stdout.write(JSON.stringify({error: error.message}));
+}
+"""
+
+
+def scores(total_score: float) -> dict:
+    return {'issue_score': 0.5, 'action_score': 0.25, 'value_score': 0.0, 'total_score': total_score}
+
+
+RESULTS = [
+    ('u1', [('o1', scores(1.5)), ('o2', scores(2.0))]),
+    (None, []),
+    ('u1', [(3, scores(0.75))]),
+    (7, [('o2', scores(1.0))]),
+    ('7', []),
+]
+
+
+@pytest.mark.parametrize('top', [None, 1, 5])
+@pytest.mark.parametrize('components', [False, True])
+def test_round_trip_keeps_rows_and_ids(tmp_path, top, components):
+    path = tmp_path / 'matches.mres'
+    size = write_match_results(path, iter(RESULTS), top, ['o9'], components)
+    assert size == path.stat().st_size
+    keys = {'total_score', 'issue_score', 'action_score', 'value_score'} if components else {'total_score'}
+    assert read_match_results(path) == [
+        (user_id, [(org_id, {key: value for key, value in match_scores.items() if key in keys})
+                   for org_id, match_scores in matches[:top]])
+        for user_id, matches in RESULTS
+    ]
+
+
+def test_spooled_sections_give_the_same_file(tmp_path, monkeypatch):
+    buffered = tmp_path / 'buffered.mres'
+    write_match_results(buffered, RESULTS * 50, None, components=True)
+    monkeypatch.setattr(columnar, 'SPOOL_SIZE', 8)
+    spooled = tmp_path / 'spooled.mres'
+    write_match_results(spooled, (result for result in RESULTS * 50), None, components=True)
+    assert spooled.read_bytes() == buffered.read_bytes()
+
+
+def test_empty_results(tmp_path):
+    path = tmp_path / 'empty.mres'
+    write_match_results(path, [])
+    assert read_match_results(path) == []
+
+
+def load_with_js(path):
+    node = shutil.which('node')
+    if node is None:
+        pytest.skip("needs node")
+    output = subprocess.run([node, '-e', JS_ROUND_TRIP, JS_CLIENT, str(path)],
+                            capture_output=True, check=True, text=True).stdout
+    return json.loads(output)
+
+
+@pytest.mark.parametrize('components', [False, True])
+def test_js_client_reads_what_python_wrote(tmp_path, components):
+    path = tmp_path / 'matches.mres'
+    write_match_results(path, RESULTS, 2, ['o9'], components)
+    js_keys = {'total_score': 'totalScore', 'issue_score': 'issueScore',
+               'action_score': 'actionScore', 'value_score': 'valueScore'}
+    assert load_with_js(path) == [
+        [user_id, [{'org': org_id, **{js_keys[key]: value for key, value in match_scores.items()}}
+                   for org_id, match_scores in matches]]
+        for user_id, matches in read_match_results(path)
+    ]
+
+
+def test_js_client_checks_the_format_version(tmp_path):
+    path = tmp_path / 'matches.mres'
+    write_match_results(path, RESULTS)
+    data = bytearray(path.read_bytes())
+    data[4:8] = (1).to_bytes(4, 'little')
+    path.write_bytes(data)
+    assert load_with_js(path) == {'error': 'unsupported columnar match results version 1'}
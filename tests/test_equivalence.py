@@ -0,0 +1,389 @@
+"""
+Seeded equivalence of every scoring engine with the reference scorers.
+
+Each engine promises the exact floats of ``calculate_total_score`` in
+``20250108 version_issue_value_action_algorithm.py`` (or, for the grouped
+layout, of ``calculate_match_score`` in the 20241223 script), so scores are
+compared with ``==``, never approximately. The datasets cover the edge cases
+the compiled forms handle specially: issues and actions the vocabulary does
+not know, more than 64 actions, falsy categories, float ranks and many value
+questions.
+
+Run from the repository root:
+
+    python -m pytest -q tests
+"""
+import ast
+import itertools
+import multiprocessing
+import os
+import random
+
+import pytest
+
+from matching import (
+    DEFAULT_WEIGHTS,
+    CachedMatcher,
+    CategoryIndex,
+    FusedScorer,
+    GroupedOrg,
+    GroupedUser,
+    MatchSession,
+    OrgProfile,
+    ShardedMatcher,
+    UserProfile,
+    Vocabulary,
+    group_by_category,
+    grouped_match_score,
+    score_pair,
+    score_users,
+    top_k_matches,
+)
+from matching.benchmark import REFERENCE_SCRIPTS, REPOSITORY_ROOT, generate_dataset, load_reference
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+
+requires_numpy = pytest.mark.skipif(np is None, reason="needs numpy")
+
+ALTERNATE_WEIGHTS = {
+    'exact_match': 0.55,
+    'category_match': 0.45,
+    'issue_weight': 0.5,
+    'action_weight': 0.3,
+    'value_weight': 0.2,
+}
+WEIGHTS = [DEFAULT_WEIGHTS, ALTERNATE_WEIGHTS]
+
+##_______________________________________________________________
+# Reference and data
+
+def reference_scorer(value_questions):
+    """
+    ``calculate_total_score`` of the 20250108 script; with other questions
+    than q1 and q2, its question loop is pointed at them and nothing else changes
+    """
+    if tuple(value_questions) == ('q1', 'q2'):
+        return load_reference('20250108')['calculate_total_score']
+    path = os.path.join(REPOSITORY_ROOT, REFERENCE_SCRIPTS['20250108'])
+    with open(path, encoding='utf-8') as script:
+        source = script.read()
+    question_loop = "for q in ['q1', 'q2']:"
+    assert question_loop in source
+    tree = ast.parse(source.replace(question_loop, f"for q in {list(value_questions)!r}:"), filename=path)
+    tree.body = [node for node in tree.body if isinstance(node, ast.FunctionDef)]
+    namespace = {}
+    exec(compile(tree, path, 'exec'), namespace)
+    return namespace['calculate_total_score']
+
+
+def make_dataset(seed, num_questions: int = 2) -> dict:
+    """Synthetic dataset with every edge case mixed in"""
+    dataset = generate_dataset(seed, num_issues=60, num_categories=6, rank_length=10, num_actions=80,
+                               value_coverage=0.7, num_questions=num_questions, num_users=10,
+                               num_orgs=60)
+    rng = random.Random(seed)
+    taxonomy = dataset['taxonomy']
+    questions = dataset['value_questions']
+    # Falsy categories compare like no category at all
+    for issue in rng.sample(sorted(taxonomy), 4):
+        taxonomy[issue] = ''
+    all_actions = [f'action-{number}' for number in range(80)]
+
+    users, orgs = dataset['users'], list(dataset['orgs'].values())
+    for index, user in enumerate(users):
+        if index % 3 == 0:
+            # Unknown to the taxonomy and to every org, with answers that must be ignored
+            user['rankings']['unknown-issue'] = len(user['rankings']) + 1
+            user['values']['unknown-issue'] = {question: 4 for question in questions}
+            user['actions'].append('unknown-action')
+        if index % 4 == 1:
+            user['rankings'] = {issue: rank * 1.5 - 0.25 for issue, rank in user['rankings'].items()}
+        if index % 5 == 2:
+            # Spans several 64-bit action words
+            user['actions'] = rng.sample(all_actions, 70)
+    for index, org in enumerate(orgs):
+        if index % 7 == 0:
+            # Interned by the org, outside the taxonomy
+            org['rankings']['org-only-issue'] = len(org['rankings']) + 1
+        if index % 5 == 0:
+            org['rankings'] = {issue: rank * 0.75 for issue, rank in org['rankings'].items()}
+        if index % 6 == 3:
+            org['actions'] = rng.sample(all_actions, 66)
+        if index % 11 == 0:
+            org['values'] = {}
+    return dataset
+
+
+@pytest.fixture(scope='module', params=[(0, 2), (1, 2), (2, 60)], ids=['seed0', 'seed1', '60-questions'])
+def dataset(request):
+    seed, num_questions = request.param
+    dataset = make_dataset(seed, num_questions)
+    calculate_total_score = reference_scorer(dataset['value_questions'])
+    taxonomy = dataset['taxonomy']
+    dataset['expected'] = {
+        id(weights): [
+            [calculate_total_score(user['rankings'], org['rankings'], taxonomy, user['actions'],
+                                   org['actions'], user['values'], org['values'], weights)
+             for org in dataset['orgs'].values()]
+            for user in dataset['users']
+        ]
+        for weights in WEIGHTS
+    }
+    vocabulary = Vocabulary(taxonomy, value_questions=dataset['value_questions'])
+    dataset['vocabulary'] = vocabulary
+    dataset['org_profiles'] = {org_id: OrgProfile.from_dict(org, vocabulary)
+                               for org_id, org in dataset['orgs'].items()}
+    dataset['user_profiles'] = [UserProfile(user['rankings'], vocabulary, user['actions'], user['values'])
+                                for user in dataset['users']]
+    return dataset
+
+
+def expected_top(dataset, user_index: int, k: int, weights=DEFAULT_WEIGHTS) -> list:
+    """Reference scores of one user, stable-sorted by total_score, first k"""
+    scores = list(zip(dataset['orgs'], dataset['expected'][id(weights)][user_index]))
+    return sorted(scores, key=lambda match: match[1]['total_score'])[:k]
+
+
+def array_scores(arrays: dict) -> list:
+    """Per-org score dicts of a dict of score arrays"""
+    keys = list(arrays)
+    return [dict(zip(keys, map(float, row))) for row in zip(*(arrays[key] for key in keys))]
+
+##_______________________________________________________________
+# Pair scorers
+
+@pytest.mark.parametrize('weights', WEIGHTS, ids=['default', 'alternate'])
+def test_score_pair_dict_orgs(dataset, weights):
+    for user, expected in zip(dataset['user_profiles'], dataset['expected'][id(weights)]):
+        assert [score_pair(user, org['rankings'], org['actions'], org['values'], weights)
+                for org in dataset['orgs'].values()] == expected
+
+
+@pytest.mark.parametrize('weights', WEIGHTS, ids=['default', 'alternate'])
+def test_score_pair_org_profiles(dataset, weights):
+    for user, expected in zip(dataset['user_profiles'], dataset['expected'][id(weights)]):
+        assert [score_pair(user, org, weights=weights)
+                for org in dataset['org_profiles'].values()] == expected
+
+
+def test_fused_scorer(dataset):
+    scorer = FusedScorer(weights=ALTERNATE_WEIGHTS)
+    for user, expected in zip(dataset['user_profiles'], dataset['expected'][id(ALTERNATE_WEIGHTS)]):
+        assert [scorer.score(user, org) for org in dataset['org_profiles'].values()] == expected
+
+
+def test_batch_score_users(dataset):
+    assert score_users(dataset['user_profiles'], dataset['org_profiles'].values()) == \
+        dataset['expected'][id(DEFAULT_WEIGHTS)]
+
+
+def test_batch_score_users_checks_vocabularies(dataset):
+    users, orgs = dataset['user_profiles'], list(dataset['org_profiles'].values())
+    other = Vocabulary(dataset['taxonomy'], value_questions=dataset['value_questions'])
+    stranger = OrgProfile.from_dict(dataset['orgs']['org-0'], other)
+    with pytest.raises(ValueError, match="different vocabularies"):
+        score_users(users, orgs + [stranger])
+    with pytest.raises(ValueError, match="different vocabularies"):
+        score_users(users + [UserProfile({'issue-0': 1}, other)], orgs)
+    assert score_users(users, []) == [[] for _ in users]
+
+
+def test_grouped_layout():
+    dataset = make_dataset(3)
+    calculate_match_score = load_reference('20241223')['calculate_match_score']
+    index = CategoryIndex(dataset['taxonomy'])
+    for user in dataset['users']:
+        grouped_user = group_by_category(user, index)
+        for org in dataset['orgs'].values():
+            grouped_org = group_by_category(org, index)
+            assert grouped_match_score(GroupedUser(grouped_user), GroupedOrg(grouped_org, index)) == \
+                calculate_match_score(grouped_user, grouped_org, index)
+
+##_______________________________________________________________
+# Catalog scorers
+
+@requires_numpy
+@pytest.mark.parametrize('weights', WEIGHTS, ids=['default', 'alternate'])
+def test_org_catalog(dataset, weights):
+    from matching import OrgCatalog, score_user_against_catalog, score_users_against_catalog
+
+    catalog = OrgCatalog(dataset['orgs'], dataset['vocabulary'])
+    expected = dataset['expected'][id(weights)]
+    for user, user_expected in zip(dataset['user_profiles'], expected):
+        assert array_scores(score_user_against_catalog(user, catalog, weights)) == user_expected
+    batched = score_users_against_catalog(dataset['user_profiles'], catalog, weights)
+    assert [array_scores(scores) for scores in batched] == expected
+
+
+@requires_numpy
+def test_org_catalog_is_as_wide_as_the_longest_ranking(dataset):
+    from matching import OrgCatalog
+
+    catalog = OrgCatalog(dataset['orgs'], dataset['vocabulary'])
+    longest = max(len(org['rankings']) for org in dataset['orgs'].values())
+    assert catalog.ranks.shape == (len(catalog), longest)
+    assert catalog.value_matrix.shape == (len(catalog), longest, len(dataset['value_questions']))
+
+
+@requires_numpy
+def test_score_matrix(dataset):
+    from matching import OrgCatalog, score_matrix
+
+    catalog = OrgCatalog(dataset['orgs'], dataset['vocabulary'])
+    expected = [[scores['total_score'] for scores in user_expected]
+                for user_expected in dataset['expected'][id(DEFAULT_WEIGHTS)]]
+    for workers in (1, 2):
+        matrix = score_matrix(dataset['users'], catalog, workers=workers, chunk_size=4)
+        assert matrix.tolist() == expected
+
+
+@requires_numpy
+def test_sweep_weights(dataset):
+    from matching import raw_components, sweep_weights
+
+    raw = raw_components(itertools.product(dataset['user_profiles'], dataset['org_profiles'].values()))
+    swept = sweep_weights(raw, WEIGHTS)
+    for grid_index, weights in enumerate(WEIGHTS):
+        flat_expected = [scores for user_expected in dataset['expected'][id(weights)]
+                         for scores in user_expected]
+        assert array_scores({key: values[grid_index] for key, values in swept.items()}) == flat_expected
+
+
+def test_overlap_index(dataset):
+    from matching import OverlapIndex
+
+    index = OverlapIndex(dataset['org_profiles'], dataset['vocabulary'])
+    for user_index, user in enumerate(dataset['user_profiles']):
+        expected = dataset['expected'][id(DEFAULT_WEIGHTS)][user_index]
+        assert [scores for _, scores in index.score_user(user)['scores']] == expected
+        assert index.top_k(user, 7)['matches'] == expected_top(dataset, user_index, 7)
+
+
+@requires_numpy
+def test_user_store(dataset):
+    from matching import UserStore
+
+    store = UserStore(dict(enumerate(dataset['users'])), dataset['vocabulary'])
+    for org_index, org in enumerate(dataset['org_profiles'].values()):
+        scores = [(user_index, user_expected[org_index])
+                  for user_index, user_expected in enumerate(dataset['expected'][id(DEFAULT_WEIGHTS)])]
+        expected = sorted(scores, key=lambda match: match[1]['total_score'])[:4]
+        assert store.top_k_users(org, 4)['matches'] == expected
+
+##_______________________________________________________________
+# Top-K, caches and incremental scoring
+
+@pytest.mark.parametrize('k', [1, 5, 100])
+def test_top_k_matches(dataset, k):
+    for user_index, user in enumerate(dataset['user_profiles']):
+        expected = expected_top(dataset, user_index, k)
+        assert top_k_matches(user, dataset['orgs'], k)['matches'] == expected
+        assert top_k_matches(user, dataset['org_profiles'], k)['matches'] == expected
+
+
+@pytest.mark.parametrize('use_numpy', [True, False], ids=['catalog', 'score_users'])
+def test_service_batch_scorer(dataset, use_numpy, monkeypatch):
+    from matching import service
+
+    if use_numpy and np is None:
+        pytest.skip("needs numpy")
+    if not use_numpy:
+        monkeypatch.setattr(service, 'np', None)
+    catalog = dataset['org_profiles']
+    tops = [1, 5, 100, 0]
+    requests = [{**user, 'top': tops[index % len(tops)]} for index, user in enumerate(dataset['users'])]
+    requests.append({'rankings': {}, 'top': 5})
+    results = service.make_batch_scorer(catalog, dataset['vocabulary'])(requests)
+    for index, result in enumerate(results[:-1]):
+        expected = expected_top(dataset, index, tops[index % len(tops)])
+        assert result == [{'org': org_id, **scores} for org_id, scores in expected]
+    assert isinstance(results[-1], ValueError)
+
+
+def test_top_k_matches_mapped_catalog(dataset, tmp_path):
+    from matching import MappedCatalog, write_mapped_catalog
+
+    path = tmp_path / 'orgs.mcat'
+    write_mapped_catalog(path, dataset['orgs'], dataset['vocabulary'])
+    with MappedCatalog(path) as catalog:
+        for user_index, user in enumerate(dataset['users']):
+            profile = UserProfile(user['rankings'], catalog.vocabulary, user['actions'], user['values'])
+            matches = top_k_matches(profile, catalog, 5)['matches']
+            del profile
+            assert matches == expected_top(dataset, user_index, 5)
+
+
+@pytest.mark.parametrize('num_shards', [2, 3])
+def test_sharded_matcher(dataset, num_shards):
+    with ShardedMatcher(dataset['orgs'], dataset['vocabulary'], num_shards=num_shards) as matcher:
+        assert len(matcher.shard_sizes) == num_shards
+        for k in (0, 1, len(dataset['orgs'])):
+            for user, profile in zip(dataset['users'], dataset['user_profiles']):
+                assert (matcher.top_k(user, k)['matches']
+                        == top_k_matches(profile, dataset['org_profiles'], k)['matches'])
+
+
+def test_sharded_matcher_worker_errors_and_close(dataset):
+    user = dataset['users'][0]
+    with ShardedMatcher(dataset['orgs'], dataset['vocabulary'], num_shards=2) as matcher:
+        processes = list(matcher._processes)
+        with pytest.raises(ValueError, match="at least one ranked issue"):
+            matcher.top_k({'rankings': {}}, 5)
+        # Every shard answered the failed query, so the next one lines up
+        assert matcher.top_k(user, 5)['matches'] == expected_top(dataset, 0, 5)
+    assert not any(process.is_alive() for process in processes)
+    assert multiprocessing.active_children() == []
+    # Closing twice is harmless
+    matcher.close()
+
+
+def test_cached_matcher(dataset):
+    matcher = CachedMatcher(dataset['orgs'], dataset['vocabulary'])
+    for _ in range(2):
+        # Misses, then hits
+        for user, expected in zip(dataset['users'], dataset['expected'][id(DEFAULT_WEIGHTS)]):
+            assert list(matcher.score_all(user).values()) == expected
+
+
+def test_match_session_edits(dataset):
+    calculate_total_score = reference_scorer(dataset['value_questions'])
+    taxonomy = dataset['taxonomy']
+    user = dataset['users'][0]
+    session = MatchSession(user['rankings'], dataset['org_profiles'], dataset['vocabulary'],
+                           user['actions'], user['values'])
+    rankings = dict(user['rankings'])
+    issues = list(rankings)
+    actions = ['action-1', 'action-70', 'unknown-action']
+    values = {issue: {question: 3 for question in dataset['value_questions']} for issue in issues[:2]}
+
+    session.set_rank(issues[0], rankings[issues[1]])
+    rankings[issues[0]] = rankings[issues[1]]
+    session.set_actions(actions)
+    session.set_values(values)
+    session.set_rank('issue-7', len(rankings) + 0.5)
+    rankings['issue-7'] = len(rankings) + 0.5
+
+    assert list(session.scores().values()) == [
+        calculate_total_score(rankings, org['rankings'], taxonomy, actions, org['actions'], values,
+                              org['values'])
+        for org in dataset['orgs'].values()
+    ]
+
+##_______________________________________________________________
+# Rounding
+
+@requires_numpy
+def test_round_scores_half_way():
+    from matching.catalog import near_half_way, round_scores
+
+    rng = random.Random(0)
+    # Decimal half-way values (most are not exactly representable) and their neighbours
+    half_way = [number / 1000 for number in range(5, 100000, 10)]
+    neighbours = [value + step for value in half_way[:2000] for step in (-1e-12, 1e-12, -5e-16, 5e-16)]
+    scores = np.array(half_way + neighbours + [rng.uniform(0, 50) for _ in range(5000)])
+    assert round_scores(scores).tolist() == [round(score, 2) for score in scores.tolist()]
+    assert near_half_way(np.array(half_way)).all()
+    assert not near_half_way(np.array([0.1, 1.231, 7.0])).any()
@@ -0,0 +1,84 @@
+"""
+Profiling of the production paths: every scorer a profiler is meant to
+measure must report phases and pairs, without changing any score.
+"""
+from collections import Counter
+
+import pytest
+
+from matching import MatchSession, OrgProfile, UserProfile, Vocabulary, profiling, top_k_matches
+from matching.benchmark import generate_dataset
+from matching.scoring import pair_counts
+
+
+def make_catalog():
+    dataset = generate_dataset(5, num_users=3, num_orgs=200)
+    vocabulary = Vocabulary(dataset['taxonomy'], value_questions=dataset['value_questions'])
+    org_profiles = {org_id: OrgProfile.from_dict(org, vocabulary) for org_id, org in dataset['orgs'].items()}
+    return dataset, vocabulary, org_profiles
+
+
+def test_profiled_top_k_matches_reports_pairs():
+    dataset, vocabulary, org_profiles = make_catalog()
+    user = dataset['users'][0]
+    profile = UserProfile(user['rankings'], vocabulary, user['actions'], user['values'])
+    for catalog in (org_profiles, dataset['orgs']):
+        unprofiled = top_k_matches(profile, catalog, 10)
+        with profiling() as profiler:
+            profiled = top_k_matches(profile, catalog, 10)
+        assert profiled == unprofiled
+
+        snapshot = profiler.snapshot()
+        counters = snapshot['counters']
+        # Every org is either fully scored or pruned
+        assert counters['pairs'] > 0
+        assert counters['pairs'] + counters['topk_pruned'] == len(catalog)
+        assert counters['issue_comparisons'] > 0
+        for phase in ('issues', 'actions', 'values', 'rounding'):
+            assert snapshot['phases'][phase]['calls'] == counters['pairs']
+            assert snapshot['phases'][phase]['seconds'] > 0
+
+
+def test_profiled_match_session_reports_pairs():
+    dataset, vocabulary, org_profiles = make_catalog()
+    user = dataset['users'][1]
+    with profiling() as profiler:
+        session = MatchSession(user['rankings'], org_profiles, vocabulary, user['actions'], user['values'])
+        counters = profiler.snapshot()['counters']
+        assert counters['pairs'] == len(org_profiles)
+        profile = UserProfile(user['rankings'], vocabulary, user['actions'], user['values'])
+        assert counters['issue_comparisons'] == sum(
+            pair_counts(profile, org)['issue_comparisons'] for org in org_profiles.values())
+
+        recomputed = session.set_actions(['action-1'])
+        assert profiler.snapshot()['counters']['pairs'] == len(org_profiles) + recomputed
+    assert profiler.snapshot()['phases']['issues']['seconds'] > 0
+
+
+def test_catalog_counts_sum_pair_counts():
+    pytest.importorskip('numpy')
+    from matching import OrgCatalog
+    from matching.catalog import catalog_counts
+
+    dataset, vocabulary, org_profiles = make_catalog()
+    catalog = OrgCatalog(org_profiles, vocabulary)
+    for user in dataset['users']:
+        profile = UserProfile(user['rankings'], vocabulary, user['actions'], user['values'])
+        expected = Counter()
+        for org in org_profiles.values():
+            expected.update(pair_counts(profile, org))
+        counts = catalog_counts(profile, catalog)
+        assert counts == {counter: expected[counter] for counter in counts}
+
+
+def test_issue_comparisons_count_same_category_user_ranks():
+    dataset, vocabulary, org_profiles = make_catalog()
+    user = dataset['users'][2]
+    profile = UserProfile(user['rankings'], vocabulary, user['actions'], user['values'])
+    user_categories = Counter(vocabulary.issue_category_id(issue_id) for issue_id in profile.issue_ids)
+    for org_id, org in org_profiles.items():
+        expected = sum(user_categories[category_id] for category_id in org.category_ids
+                       if category_id in profile.category_ranks)
+        assert pair_counts(profile, org)['issue_comparisons'] == expected
+        assert pair_counts(profile, dataset['orgs'][org_id]['rankings'],
+                           dataset['orgs'][org_id].get('values'))['issue_comparisons'] == expected
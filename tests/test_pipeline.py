@@ -0,0 +1,57 @@
+"""
+The pipeline command line: JSONL and columnar output of the same run agree,
+whatever the buffer sizes.
+"""
+import json
+import struct
+
+from matching import UserProfile, Vocabulary, read_match_results, top_k_matches
+from matching.benchmark import generate_dataset
+from matching.pipeline import load_catalog, main
+
+
+def float32(value: float) -> float:
+    return struct.unpack('<f', struct.pack('<f', value))[0]
+
+
+def write_inputs(tmp_path, dataset):
+    paths = {name: tmp_path / name for name in ('taxonomy.json', 'orgs.jsonl', 'users.jsonl')}
+    paths['taxonomy.json'].write_text(json.dumps(dataset['taxonomy']), encoding='utf-8')
+    paths['orgs.jsonl'].write_text(
+        ''.join(json.dumps({'id': org_id, **org}) + '\n' for org_id, org in dataset['orgs'].items()),
+        encoding='utf-8')
+    # Blank lines are skipped, and users without an id keep their place
+    paths['users.jsonl'].write_text(
+        '\n'.join(json.dumps({'id': f'user-{index}', **user} if index % 4 else user)
+                  for index, user in enumerate(dataset['users'])) + '\n\n',
+        encoding='utf-8')
+    return paths
+
+
+def test_jsonl_and_columnar_outputs_agree(tmp_path):
+    dataset = generate_dataset(6, num_questions=3, num_users=9, num_orgs=40)
+    paths = write_inputs(tmp_path, dataset)
+    common = ['--taxonomy', str(paths['taxonomy.json']), '--orgs', str(paths['orgs.jsonl']),
+              '--users', str(paths['users.jsonl']), '--value-questions', 'q1,q2,q3', '--top', '5',
+              '--read-buffer', '64', '--write-buffer', '64']
+    jsonl_path, columnar_path = tmp_path / 'matches.jsonl', tmp_path / 'matches.mres'
+    assert main(common + ['--output', str(jsonl_path)]) == 0
+    assert main(common + ['--output', str(columnar_path), '--format', 'columnar', '--components']) == 0
+
+    records = [json.loads(line) for line in jsonl_path.read_text(encoding='utf-8').splitlines()]
+    assert [record['id'] for record in records] == [
+        f'user-{index}' if index % 4 else None for index in range(len(dataset['users']))]
+    assert read_match_results(columnar_path) == [
+        (record['id'], [(match['org'], {key: float32(value) for key, value in match.items() if key != 'org'})
+                        for match in record['matches']])
+        for record in records
+    ]
+
+    # All three value questions were scored
+    vocabulary = Vocabulary(dataset['taxonomy'], value_questions=['q1', 'q2', 'q3'])
+    catalog = load_catalog(({'id': org_id, **org} for org_id, org in dataset['orgs'].items()), vocabulary)
+    for user, record in zip(dataset['users'], records):
+        profile = UserProfile(user['rankings'], vocabulary, user['actions'], user['values'])
+        expected = top_k_matches(profile, catalog, 5)['matches']
+        assert [(match['org'], match['total_score']) for match in record['matches']] == [
+            (org_id, scores['total_score']) for org_id, scores in expected]
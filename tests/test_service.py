@@ -0,0 +1,39 @@
+"""
+Request validation of the matching service: malformed /match payloads are
+answered with 400 before anything is queued for scoring.
+"""
+import asyncio
+
+import pytest
+
+from matching.service import MatchService, MicroBatcher
+
+
+def match(payload: dict) -> tuple:
+    def score_batch(requests):
+        return [[] for _ in requests]
+
+    async def run():
+        service = MatchService(MicroBatcher(score_batch, window=0))
+        await service.batcher.start()
+        try:
+            return await service.match(payload)
+        finally:
+            await service.close()
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize('timeout_ms', ['500', [500], {}, True, float('nan'), float('inf'), -1])
+def test_invalid_timeout_is_a_bad_request(timeout_ms):
+    status, response = match({'id': 'u1', 'rankings': {'issue-1': 1}, 'timeout_ms': timeout_ms})
+    assert status == 400
+    assert response['id'] == 'u1'
+    assert 'timeout_ms' in response['error']
+
+
+@pytest.mark.parametrize('timeout_ms', [None, 250, 250.5])
+def test_valid_timeout(timeout_ms):
+    payload = {'rankings': {'issue-1': 1}}
+    if timeout_ms is not None:
+        payload['timeout_ms'] = timeout_ms
+    assert match(payload) == (200, {'id': None, 'matches': []})
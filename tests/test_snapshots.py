@@ -0,0 +1,94 @@
+"""
+CatalogStore versions: readers keep the version they took, versions are
+freed with their last reader, and the overlay tables always read like the
+plain dict they stand for.
+"""
+import gc
+import random
+
+import pytest
+
+from matching import CatalogStore, OrgProfile, UserProfile, Vocabulary, top_k_matches
+from matching.benchmark import generate_dataset
+
+
+def make_store(num_orgs: int = 50):
+    dataset = generate_dataset(3, num_users=2, num_orgs=num_orgs)
+    vocabulary = Vocabulary(dataset['taxonomy'], value_questions=dataset['value_questions'])
+    return dataset, CatalogStore(dataset['orgs'], vocabulary)
+
+
+def test_readers_keep_their_version():
+    dataset, store = make_store()
+    old = store.current
+    original = old['org-1']
+    profile = OrgProfile.from_dict(dataset['orgs']['org-2'], store.vocabulary)
+    replaced = store.update_org('org-1', profile)
+
+    assert old['org-1'] is original
+    assert replaced['org-1'] is profile
+    # Unchanged profiles are shared, not copied
+    assert all(replaced[org_id] is old[org_id] for org_id in old if org_id != 'org-1')
+
+
+def test_live_versions_follow_the_readers():
+    dataset, store = make_store()
+    org = dataset['orgs']['org-3']
+    with store.pin() as pinned:
+        store.update_org('org-4', org)
+        store.update_org('org-5', org)
+        gc.collect()
+        assert store.live_versions() == [pinned.version, store.version]
+    del pinned
+    gc.collect()
+    assert store.live_versions() == [store.version]
+
+
+def test_one_version_per_update():
+    dataset, store = make_store()
+    org = dataset['orgs']['org-0']
+    snapshot = store.update({'org-6': org, 'new-org': org}, removals=['org-7', 'org-8'])
+    gc.collect()
+    assert snapshot.version == 1
+    assert store.live_versions() == [1]
+    assert len(snapshot) == 50 + 1 - 2
+    assert 'org-7' not in snapshot and 'new-org' in snapshot
+    with pytest.raises(KeyError):
+        snapshot['org-8']
+
+
+def test_snapshots_read_like_dicts():
+    dataset, store = make_store(num_orgs=40)
+    rng = random.Random(0)
+    orgs = [OrgProfile.from_dict(org, store.vocabulary) for org in dataset['orgs'].values()]
+    expected = dict(store.current)
+    for step in range(300):
+        removals = rng.sample(sorted(expected), min(len(expected), rng.randrange(3)))
+        for org_id in removals:
+            del expected[org_id]
+        # Replace existing orgs, bring removed ones back and add new ones
+        changes = {rng.choice([*expected, f'org-{rng.randrange(60)}']): rng.choice(orgs)
+                   for _ in range(rng.randrange(1, 4))}
+        expected.update(changes)
+        snapshot = store.update(changes, removals)
+
+        assert snapshot.version == step + 1
+        assert len(snapshot) == len(expected)
+        assert list(snapshot) == list(expected)
+        assert all(snapshot[org_id] is org for org_id, org in expected.items())
+        assert 'org-60' not in snapshot
+
+    user = dataset['users'][0]
+    user = UserProfile(user['rankings'], store.vocabulary, user['actions'], user['values'])
+    assert top_k_matches(user, store.current, 10) == top_k_matches(user, expected, 10)
+
+
+def test_removing_a_missing_org_publishes_nothing():
+    _, store = make_store()
+    store.remove_org('org-9')
+    with pytest.raises(KeyError):
+        store.remove_org('org-9')
+    with pytest.raises(KeyError):
+        store.update(removals=['org-10', 'org-10'])
+    assert store.version == 1
+    assert 'org-10' in store.current